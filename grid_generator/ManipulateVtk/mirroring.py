@@ -1,97 +1,180 @@
 # -- coding: utf-8 --
+import os
+import sys
 import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mesh_writer import write_vtk, legacy_vtk_stream, VTK_TRIANGLE, VTK_QUAD
+from mesh_reader import read_vtk, scan_sections, iter_section_blocks, VTK_DTYPE
+
+# centerを通りline_vector方向の直線の単位方向ベクトル(xy平面)
+def axis_direction(line_vector):
+    direction = np.asarray(line_vector, dtype=float)[:2]
+    return direction / np.linalg.norm(direction)
+
+
+# 直線からの距離がthreshold未満の点(反転しても元の点と重なるので複製しない)
+def on_axis_points(p_coord, center, line_vector, threshold):
+    direction = axis_direction(line_vector)
+    r = p_coord[:, :2] - np.asarray(center, dtype=float)[:2]
+    return np.abs(direction[0] * r[:, 1] - direction[1] * r[:, 0]) < threshold
+
+
+# 点をcenterを通りline_vector方向の直線について反転する(z座標はそのまま)
+def reflect_points(p_coord, center, line_vector):
+    direction = axis_direction(line_vector)
+    center = np.asarray(center, dtype=float)[:2]
+    r = p_coord[:, :2] - center
+    new_p_coord = np.array(p_coord, dtype=float)
+    new_p_coord[:, :2] = 2.0 * np.dot(r, direction).reshape(-1, 1) * direction - r + center
+    return new_p_coord
+
+
+# mirror_streamで扱えるセル形状と頂点数(頂点の並びを逆にしても同じ形状のセルになるもの)
+MIRROR_CELL_TYPE = {VTK_TRIANGLE: 3, VTK_QUAD: 4}
+
+
+# number_map1:旧番号→反転後の点の番号(軸上の点は元の番号，それ以外は点数 + 軸上でない点の通し番号)
+def mirror_point_map(on_axis):
+    p_num = on_axis.shape[0]
+    return np.where(on_axis, np.arange(p_num), p_num + np.cumsum(~on_axis) - 1)
+
+
+# number_map1と，number_map2:新番号→旧番号
+def mirror_number_map(on_axis):
+    p_num = on_axis.shape[0]
+    number_map2 = np.concatenate([np.arange(p_num), np.where(~on_axis)[0]])
+    return mirror_point_map(on_axis), number_map2
+
+
+# 反転後のセル構造(頂点番号を置き換え，並び順を逆にして反時計回りを保つ)
+def mirror_cells(c_strct, number_map1):
+    return number_map1[c_strct][:, ::-1]
+
 
 class tri_grid(object):
-    def __init__(self, fname, center, line_vector, threshold = 10.0**(-9), easy_mode=0):
+    def __init__(self, fname, center, line_vector, threshold = 10.0**(-9), easy_mode=0, output_format="ascii"):
         self.fname = fname
         self.new_name = "mirror_" + fname
 
         self.center = center    # 反転の中心点
         self.line_vector = line_vector  # 反転の基準方向
         self.threshold = threshold
+        self.output_format = output_format  # "ascii", "binary", "vtu"(mesh_writer.write_vtkを参照)
 
         self.header = ""
         self.read_data()
 
         if easy_mode == 0  :    # 直線x=0にて反転処理
             self.mirror_x0()
+        elif easy_mode == 1:    # centerとline_vectorで決まる直線にて反転処理
+            self.mirror()
+        else:
+            print("easy_mode error")
+            exit()
 
         self.output_vtk()
 
+    # 座標とセル構造はセクションごとにまとめて読む(legacy VTKのASCII/BINARYどちらも可)
     def read_data(self):
-        with open(self.fname, "r") as f:
-            phase = 0
-            p_count = 0
-            c_count = 0
-            for line in f:
-                if ((phase == 2) and (c_count < self.c_num)):
-                    self.c_strct[c_count] = np.array(line.split()[1:], dtype=int)
-                    c_count += 1
-
-                if ((phase == 1) and (p_count == self.p_num)):
-                    self.c_num = int(line.split()[1])
-                    self.c_strct = np.zeros((self.c_num, 3), dtype=int)
-                    phase = 2
-
-                if ((phase == 1) and (p_count < self.p_num)):
-                    self.p_coord[p_count] = np.array(line.split(), dtype=float)
-                    p_count += 1
-
-                if (phase == 0):
-                    if line.find("POINTS") == 0:
-                        self.p_num = int(line.split()[1])
-                        self.p_coord = np.zeros((self.p_num, 3), dtype=float)
-                        phase = 1
-                    else:
-                        self.header += line
+        self.p_coord, self.c_strct, self.c_type, self.header = read_vtk(self.fname)
+        self.p_num = self.p_coord.shape[0]
+        self.c_num = len(self.c_strct)
 
+    # 直線x=0にて反転
     def mirror_x0(self):
-        # 新旧番号対応表作成
-        self.number_map1 = np.arange(self.p_num)    # 旧番号から新番号を検索する
-        self.add_p_num = 0
-        # 除外要素の特定
-        for i in range(self.p_num):
-            if abs(self.p_coord[i, 0]) < self.threshold:
-                self.number_map1[i] = i
-            else:
-                self.number_map1[i] = self.p_num + self.add_p_num
-                self.add_p_num += 1
-
-        # 反転後座標の作成
-        self.add_p_coord = np.zeros((self.add_p_num, 3), dtype=float)
-        p_count = 0
-        self.number_map2 = np.arange(self.p_num + self.add_p_num)   # 新番号から旧番号を検索する
-        for i in range(self.p_num):
-            if (self.number_map1[i] >= self.p_num):
-                self.number_map2[self.p_num + p_count] = i
-                self.add_p_coord[p_count] = np.array([-self.p_coord[i, 0], self.p_coord[i, 1], self.p_coord[i, 2]])
-                p_count += 1
-
+        self.center = [0.0, 0.0]
+        self.line_vector = [0.0, 1.0]
+        self.mirror()
+
+    # centerを通りline_vector方向の直線について反転した格子を元の格子に付け足す
+    def mirror(self):
+        self.on_axis = on_axis_points(self.p_coord, self.center, self.line_vector, self.threshold)
+        self.number_map1, self.number_map2 = mirror_number_map(self.on_axis)
+        self.add_p_num = self.number_map2.shape[0] - self.p_num
+
+        # 反転後座標の作成(軸上の点は元の点を共有する)
+        self.add_p_coord = reflect_points(self.p_coord[self.number_map2[self.p_num:]], self.center, self.line_vector)
         self.new_p_coord = np.concatenate([self.p_coord, self.add_p_coord])
         self.new_p_num = self.new_p_coord.shape[0]
 
         # 反転後セル構造の作成
-        self.add_c_strct = np.zeros((self.c_num, 3), dtype=int)
-        for i in range(self.c_num):
-            self.add_c_strct[i] = np.array([self.number_map1[self.c_strct[i,0]], self.number_map1[self.c_strct[i,1]], self.number_map1[self.c_strct[i,2]]])
-
+        self.add_c_strct = mirror_cells(self.c_strct, self.number_map1)
         self.new_c_strct = np.concatenate([self.c_strct, self.add_c_strct])
         self.new_c_num = self.new_c_strct.shape[0]
 
     def output_vtk(self):
-        with open(self.new_name, "w") as mf:
-            mf.write(self.header)
-
-            mf.write("POINTS " + str(self.new_p_num) + " double\n")
-            [mf.write(str(self.new_p_coord[i, 0]) + " " + str(self.new_p_coord[i, 1]) + " " + str(self.new_p_coord[i, 2]) + " "  + "\n") for i in range(self.new_p_num)]
-
-            mf.write("CELLS " + str(self.new_c_num) + " " + str(4*self.new_c_num) + "\n")
-            [mf.write("3 " + str(self.new_c_strct[i, 0]) + " " + str(self.new_c_strct[i, 1]) + " " + str(self.new_c_strct[i, 2]) + " " + "\n") for i in range(self.new_c_num)]
-
-            mf.write("CELL_TYPES " + str(self.new_c_num) + "\n")
-            [mf.write("5\n") for i in range(self.new_c_num)]
-
-
+        # 元ファイルのタイトル行をそのまま引き継ぐ
+        title = self.header.split("\n")[1]
+        if self.output_format == "vtu":
+            self.new_name = os.path.splitext(self.new_name)[0] + ".vtu"
+        # セル形状は入力と同じもの(CELL_TYPESがなければ三角形)
+        cell_type = VTK_TRIANGLE if self.c_type is None else int(self.c_type[0])
+        write_vtk(self.new_name, self.new_p_coord, self.new_c_strct, cell_type=cell_type, format=self.output_format, title=title)
+
+
+
+
+# tri_gridと同じ反転をブロックごとに行う(メモリに載らない大きさの格子用)
+# 1回目の読み込みで軸上の点の対応表(number_map1)だけを作り，2回目に点とセルをblock行ずつ読みながら
+# 元のブロックと反転したブロックを書き出す(元の格子と反転した格子を同時にメモリに持たない)
+# 出力はlegacy VTK(output_formatは"ascii"または"binary")
+def mirror_stream(fname, center, line_vector, threshold=10.0**(-9), new_name=None, output_format="ascii", block=1 << 20):
+    if new_name == None:
+        new_name = os.path.join(os.path.dirname(fname), "mirror_" + os.path.basename(fname))
+    section = {s["key"]: s for s in scan_sections(fname)}
+    with open(fname, "rb") as f:
+        head = f.read(section["POINTS"]["line"]).decode("ascii", errors="replace").split("\n")
+    binary = head[2].strip().upper() == "BINARY"
+    p_num = int(section["POINTS"]["word"][1])
+    c_num = int(section["CELLS"]["word"][1])
+    width = int(section["CELLS"]["word"][2]) // c_num
+    if width * c_num != int(section["CELLS"]["word"][2]):
+        print("mixed cell type is not supported in mirror_stream")
+        exit()
+    p_dtype = VTK_DTYPE[section["POINTS"]["word"][2]] if binary else float
+    c_dtype = ">i4" if binary else np.int64
+    points = lambda: iter_section_blocks(fname, section["POINTS"], p_num, 3, p_dtype, block, binary)
+    cells = lambda: iter_section_blocks(fname, section["CELLS"], c_num, width, c_dtype, block, binary)
+
+    # セル形状は入力のCELL_TYPESから読み，全セルで同じ形状のときだけそのまま書き出す(CELL_TYPESがなければ三角形とみなす)
+    cell_type = VTK_TRIANGLE
+    if "CELL_TYPES" in section:
+        found = set()
+        for c_type in iter_section_blocks(fname, section["CELL_TYPES"], c_num, 1, c_dtype, block, binary):
+            found.update(np.unique(c_type).tolist())
+        if len(found) != 1:
+            print("mixed cell type is not supported in mirror_stream")
+            exit()
+        cell_type = int(found.pop())
+    if MIRROR_CELL_TYPE.get(cell_type) != width - 1:
+        print("cell type " + str(cell_type) + " with " + str(width - 1) + " vertices is not supported in mirror_stream")
+        exit()
+
+    # 1回目:軸上の点の判定
+    on_axis = np.zeros(p_num, dtype=bool)
+    start = 0
+    for p_coord in points():
+        on_axis[start:start + p_coord.shape[0]] = on_axis_points(p_coord, center, line_vector, threshold)
+        start += p_coord.shape[0]
+    number_map1 = mirror_point_map(on_axis)
+
+    # 2回目:元の点→反転した点→元のセル→反転したセルの順に書き出す
+    out = legacy_vtk_stream(new_name, title=head[1], format=output_format)
+    out.begin_points(p_num + int(np.sum(~on_axis)))
+    for p_coord in points():
+        out.write_points(p_coord)
+    start = 0
+    for p_coord in points():
+        out.write_points(reflect_points(p_coord[~on_axis[start:start + p_coord.shape[0]]], center, line_vector))
+        start += p_coord.shape[0]
+    out.begin_cells(2 * c_num, width - 1)
+    for c_strct in cells():
+        out.write_cells(c_strct[:, 1:])
+    for c_strct in cells():
+        out.write_cells(mirror_cells(c_strct[:, 1:].astype(np.int64), number_map1))
+    out.write_cell_types(cell_type, block)
+    out.close()
+    return new_name
 
 
 def set_path():
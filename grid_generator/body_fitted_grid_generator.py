@@ -4,10 +4,26 @@ from scipy import interpolate
 from scipy.spatial import Delaunay
 import numpy as np
 from numpy.linalg import norm
-from naca_4digit_test import Naca_4_digit, Naca_5_digit
+from naca_4digit_test import Naca_4_digit, Naca_5_digit, Naca_family
 from joukowski_wing import joukowski_wing_complex, karman_trefftz_wing_complex
+from edge_conflict import candidate_edges, resolve_crossing_edges
+from segment_index import segment_index, segments_intersect
+from mesh_writer import write_vtk, VTK_TRIANGLE
+from mayu_exporter import tri2mayu
+from shape_archive import write_shape_archive
+from layer_store import layer_store, complex_xy
+from cell_budget import plan_cell_budget, cell_budget_control
+from grid_cache import cache_key, cached_arrays, pack_layers, unpack_layers
+from curve_geometry import dot_product_c, central_delta, length_rate, turning_angle, bisector_normal, central_normal_angle, outside, edge_length, interior_keep_mask, merge_short_edges
 import matplotlib.pyplot as plt
 import os
+from multiprocessing import Pool, cpu_count, current_process
+
+
+# 極端に距離の近い制御点を除去する(短い辺の始点を一括で除去)
+def adjust_length(z):
+    len = edge_length(z)
+    return z[interior_keep_mask(len < 0.1 * np.average(len))]
 
 
 # 物体表面の複素座標を取得する
@@ -18,21 +34,6 @@ def get_complex_coords(type, size, center_x=-0.08, center_y=0.08, naca4="0012"):
         else:
             return z, z.shape[0]
 
-    # 極端に距離の近い制御点を除去する
-    def adjust_length(z):
-        len = np.zeros_like(z, dtype=float)
-        len[:z.shape[0] - 1] = np.abs(z[1:] - z[:z.shape[0] - 1])
-        len[z.shape[0] - 1] = np.abs(z[0] - z[z.shape[0] - 1])
-        average_len = np.average(len)
-
-        put_out = lambda x, count: np.hstack((x[:count], x[count + 1]))
-        count = z.shape[0] - 2
-        while count > 0:
-            if len[count] < 0.1 * average_len:
-                z = put_out(z, count)
-            count -= 1
-        return z
-
     if type == 0:
         t = np.linspace(start=0, stop=2.0 * np.pi, num=size + 1)
         z = np.exp(1j * t)[:size]
@@ -83,9 +84,7 @@ def get_outer_boundary(z1, magnification=5, equidistant=False):
     radius = model_length * magnification
     if equidistant == False:
         # 法線の角度
-        delta2 = get_delta2(z1)
-        theta1 = np.angle(delta2 / (np.abs(delta2) * 1j))
-        theta1 = np.where(theta1 > 0, theta1, theta1 + 2.0 * np.pi)
+        theta1 = central_normal_angle(z1)
 
         # 物体を円に変換したときの換算角度
         theta2 = get_length_rate(z1) * 2.0 * np.pi
@@ -99,32 +98,12 @@ def get_outer_boundary(z1, magnification=5, equidistant=False):
 
 # そこまでの累積長さが全体の長さに占める割合を返す
 def get_length_rate(z1, output_total_length=False):
-    size = z1.shape[0]
-    delta1 = np.zeros_like(z1, dtype=complex)
-    delta1[:size - 1] = z1[1:] - z1[:size - 1]
-    delta1[size - 1] = z1[0] - z1[size - 1]
-    len = np.abs(delta1)
-    total_len = np.sum(len)
-    len_rate = np.zeros_like(z1, dtype=float)
-    accumulated_len = 0.0
-    for i in range(size):
-        len_rate[i] = accumulated_len / total_len
-        accumulated_len += len[i]
-    if output_total_length:
-        return len_rate, total_len
-    else:
-        return len_rate
+    return length_rate(z1, output_total_length)
 
 
 # 1点飛ばしでの座標の差分を返す
 def get_delta2(z1):
-    size = z1.shape[0]
-    delta2 = np.zeros_like(z1, dtype=complex)
-    delta2[0] = z1[1] - z1[size - 1]
-    for i in range(1, size - 1):
-        delta2[i] = z1[i + 1] - z1[i - 1]
-    delta2[size - 1] = z1[0] - z1[size - 2]
-    return delta2
+    return central_delta(z1)
 
 
 # 物体と外周を結ぶ線分を返す
@@ -153,9 +132,6 @@ def get_connect_z1_to_z3(z1, z3, resolution=None, magnification=10):
 
 
 def deduplication(z, array_list=None):
-    def put_out(x, count):
-        return np.hstack((x[:count], x[count + 1]))
-
     def put_out_bound(x):
         return x[:x.shape[0] - 1]
 
@@ -168,43 +144,28 @@ def deduplication(z, array_list=None):
             for i in range(len(array_list)):
                 array_list[i] = put_out_bound(array_list[i])
 
-    count = size - 2
-    while count > 0:
-        if z[count] == z[count + 1]:
-            z = put_out(z, count)
-            if array_list != None:
-                for i in range(len(array_list)):
-                    array_list[i] = put_out(array_list[i], count)
-        count -= 1
+    # 次の点と同じ座標の点を一括で除去する
+    keep = interior_keep_mask(z == np.roll(z, -1))
+    z = z[keep]
+    if array_list != None:
+        for i in range(len(array_list)):
+            array_list[i] = array_list[i][keep]
     if array_list == None:
         return z
     else:
         return z, array_list
 
-def Tri2vtk(path, fname, Tri_points, Tri_simplices):
-    fname = path + fname + ".vtk"
-    with open(fname, 'w') as f:
-        point_number = Tri_points.shape[0]
-        cell_number = Tri_simplices.shape[0]
-        cell_vertex_number = 4 * Tri_simplices.shape[0]
-        #cell_vertex_number = str(2 * 4 * (xi_max) * (eta_max - 1))
-
-        f.write("# vtk DataFile Version 3.0\n")
-        f.write("Unstructured Grid tri example\n")
-        f.write("ASCII\nDATASET UNSTRUCTURED_GRID\n")
-        f.write("POINTS " + str(point_number) + " double\n")
-        # point coordinates
-        for i in range(point_number):
-            f.write(str(Tri_points[i, 0]) + " " + str(Tri_points[i, 1]) + " 0.0\n")
-
-        # cell structure
-        f.write("CELLS " + str(cell_number) + " " + str(cell_vertex_number) + "\n")
-        for i in range(cell_number):
-            f.write("3 " + str(Tri_simplices[i, 0]) + " " + str(Tri_simplices[i, 1]) + " " + str(Tri_simplices[i, 2]) + "\n")
-
-        # cell types
-        f.write("CELL_TYPES " + str(cell_number) + "\n")
-        [f.write("5\n") for i in range(cell_number)]
+# format = "ascii"(ソルバー入力用), "binary", "vtu"から選択(mesh_writer.write_vtkを参照)
+def Tri2vtk(path, fname, Tri_points, Tri_simplices, format="ascii"):
+    if format == "vtu":
+        fname = path + fname + ".vtu"
+    else:
+        fname = path + fname + ".vtk"
+    write_vtk(fname, Tri_points, Tri_simplices, cell_type=VTK_TRIANGLE, format=format)
+
+# ソルバー入力用の*.mayuを直接出力する(Preprocessing4UnstructuredGridと同じ内容，boundaryはmayu_exporter.default_boundary_dataを参照)
+def Tri2mayu(path, fname, Tri_points, Tri_simplices, boundary=None):
+    tri2mayu(path + fname + ".mayu", Tri_points, Tri_simplices, boundary)
 
 # p1とp2, p3とp4が線分をなすとして
 def line_intersect(p1, p2, p3, p4):
@@ -279,7 +240,7 @@ def get_equidistant_curve(z2, add=0, rate=0.5, high_dens=True):
                                           np.where(x < 5 / 6, b * (x - 4 / 6) + (3 * a + b) / 6,
                                                    a * (x - 5 / 6) + (3 * a + 2 * b) / 6))))
 
-    t, total_len = get_length_rate(z2, output_total_length=True)
+    t, total_len = length_rate(z2, output_total_length=True)
     fx = interpolate.PchipInterpolator(np.hstack((t, np.array([1.0]))), np.real(np.hstack((z2, z2[0]))))
     fy = interpolate.PchipInterpolator(np.hstack((t, np.array([1.0]))), np.imag(np.hstack((z2, z2[0]))))
     if high_dens:
@@ -288,69 +249,122 @@ def get_equidistant_curve(z2, add=0, rate=0.5, high_dens=True):
         equidistant_t = np.linspace(0, 1, z2.shape[0] + add + 1)[:z2.shape[0] + add]
     return fx(equidistant_t) + 1j * fy(equidistant_t)
 
-def make_grid_seko(z1, path="", fname="sample", mg2=True, vtk=True, bdm=True, trianglation=True):
+# 追加する点の総数が分かった時点で，物体表面→η=1線の格子を先に切る
+# 物体表面のη=0線と物体表面から少し外側のη=1格子線を三角形で繋ぐ(外側の隣り合うη格子線同士も同様)
+def eta_next(z1_eq, z2_eq, cum_p):
+    num0 = z1_eq.shape[0]
+    num1 = z2_eq.shape[0]
+
+    z1_xy = complex_xy(z1_eq)
+    z2_xy = complex_xy(z2_eq)
+
+    # print("0th step")
+    # 0.物体表面における辺の長さの最大値と比較して長すぎるものを除外(kd-treeで短い辺のみを列挙する)
+    ave = np.max(np.abs(z1_eq[1:] - z1_eq[:z1_eq.shape[0] - 1]))
+    edge, length = candidate_edges(z1_xy, z2_xy, 4.0 * ave)
+
+    # print("1st step")
+    # 1.そもそも物体表面と交差してるのを除外(物体表面の辺をバケット格子に登録して一括判定)
+    # 点iを端点に持つ物体表面の辺とは端点を共有するだけなので交差とみなされない
+    surface = segment_index(z1_xy, np.roll(z1_xy, -1, axis=0))
+    cross_surface = surface.crossing_any(z1_xy[edge[:, 0]], z2_xy[edge[:, 1]])
+    edge = edge[~cross_surface]
+    length = length[~cross_surface]
+
+    # print("2nd step")
+    # 2.線分同士で交差してるのを除外(交差する組だけを抽出し，短い辺から順に確定させて長い方を消す)
+    alive = resolve_crossing_edges(z1_xy[edge[:, 0]], z2_xy[edge[:, 1]], length)
+    edge = edge[alive]
+    edge_mask = np.zeros((num0, num1), dtype=int)
+    edge_mask[edge[:, 0], edge[:, 1]] = 1
+
+    # print("3rd step")
+    # 3.残った辺から三角形を構築
+    # 辺p1-p3と辺p1-p3(j+1)が生き残っていたとき
+    tri1 = np.argwhere((edge_mask == 1) & (np.roll(edge_mask, -1, axis=1) == 1))
+    # 辺p1-p2と辺p1(j+1)-p2が生き残っていたとき
+    tri2 = np.argwhere(((edge_mask == 1) & (np.roll(edge_mask, -1, axis=0) == 1)).T)
+    simplices = np.concatenate([np.vstack([tri1[:, 0], tri1[:, 1] + num0, (tri1[:, 1] + 1) % num1 + num0]).T,
+                                np.vstack([tri2[:, 0] + num0, tri2[:, 1], (tri2[:, 1] + 1) % num0]).T])
+    # 4.η格子線の向きによってtri1とtri2の頂点の並びが逆回りになるので，全て反時計回りに揃える
+    pts = np.concatenate([z1_xy, z2_xy])
+    a = pts[simplices[:, 1]] - pts[simplices[:, 0]]
+    b = pts[simplices[:, 2]] - pts[simplices[:, 0]]
+    cw = a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0] < 0
+    simplices[cw, 1], simplices[cw, 2] = simplices[cw, 2], simplices[cw, 1].copy()
+    return simplices + cum_p, edge
+
+
+# 点番号はz1_eqの先頭を0とする(z2_eqの点番号はz1_eqの点数から始まる)
+def stitch_layer_pair(args):
+    z1_eq, z2_eq = args
+    simplices, edge = eta_next(z1_eq, z2_eq, 0)
+    return simplices
+
+
+# funcをargsの各要素に適用する(processesが1のとき，またはデーモンプロセス(grid_farmのワーカー)内では逐次実行)
+def map_layer_pairs(func, args, processes=None):
+    if processes == None:
+        processes = cpu_count()
+    if processes == 1 or len(args) < 2 or current_process().daemon:
+        return [func(arg) for arg in args]
+    with Pool(processes=min(processes, len(args))) as pool:
+        return pool.map(func, args, chunksize=max(1, len(args) // (4 * processes)))
+
+
+# max_incremental:1層あたりのオフセット量の上限，accel_parameter:物体遠方領域でオフセット量を増やす際の割合
+# magnification:外部境界の半径(物体の半長の何倍か)，max_incremental=Noneのときは radius1 * (magnification - 1) / eta_max を上限とする
+# cacheにgrid_cacheを渡すと，同じ物体表面と生成パラメータの格子・η格子線の束を再利用する
+# processesは三角形分割に使うプロセス数(Noneで全コア)
+# far_field:外部境界のx方向の幅(物体の長軸長さの何倍か)
+# target_cellsを指定するとセル数がその±tolerance(割合)に収まるように物体表面の分割数とオフセット倍率を決める(cell_budget)
+# max_layer_points:η格子線1本の点数の上限(Noneで物体表面の点数の16倍)，超えたらそこで押し出しを打ち切る
+# (凹部への点の追加で点数が層ごとに増え続け，外部境界に届く前に計算が終わらなくなるのを防ぐ)
+# 戻り値は格子点の座標と三角形の頂点番号
+def make_grid_seko(z1, path="", fname="sample", mg2=True, vtk=True, bdm=True, trianglation=True, mayu=False,
+                   max_incremental=10.0, accel_parameter=1.3, cache=None, processes=None, far_field=40.0, target_cells=None,
+                   tolerance=0.05, magnification=5.0, max_layer_points=None):
     z1 = renumbering(z1)
     plot_complex(z1)
     plot_complex(z1[:10])
 
+    # magnificationはmax_incremental=Noneのときだけ格子に効くので，そのときだけキーに含める
+    grid_key = cache_key("grid", z1=z1, max_incremental=max_incremental, accel_parameter=accel_parameter, far_field=far_field,
+                         target_cells=target_cells, tolerance=tolerance,
+                         magnification=magnification if max_incremental == None else None, max_layer_points=max_layer_points)
+    if cache != None:
+        grid = cache.load(grid_key)
+        if grid != None:
+            Tri2vtk(path = path, fname = fname, Tri_points = grid["point"], Tri_simplices = grid["simplices"])
+            if mayu:
+                Tri2mayu(path = path, fname = fname, Tri_points = grid["point"], Tri_simplices = grid["simplices"])
+            return grid["point"], grid["simplices"]
+
     xi_max = z1.shape[0]
     eta_max = z1.shape[0]  # int(0.5 * z1.shape[0])
 
     def make_point(z):
-        return np.vstack([np.real(z), np.imag(z)]).T
+        return complex_xy(z)
 
     def convert_complex2real(comp):
         return np.vstack([np.real(comp), np.imag(comp)]).flatten()
     
-    def dot_product_c(z1, z2):
-        return np.real(z1 * np.conjugate(z2))
-    
-    def cross_product_c(z1, z2):
-        return -np.real(z1 * 1j * z2)
-    
     # 物体表面を押し出す(η格子線の複素座標，オフセット方向(外側or内側)，最大のオフセット量，オフセット倍率(遠方領域で1以上の値を与えて計算領域を効率的に広げる))
     def offset_surface(z, outer=False, max_incremental=0.1, accel=1.0, restriction=True, del_wedge=160, min_theta_output=False, long_axis="x"):
-        size = z.shape[0]
-
-        delta = np.zeros(size, dtype=complex)
-        delta[0] = z[1] - z[size - 1]
-        for i in range(1, size - 1):
-            delta[i] = z[i + 1] - z[i - 1]
-        delta[size - 1] = z[0] - z[size - 2]
-        
-        delta1 = np.zeros(size, dtype=complex)
-        delta1[:size - 1] = z[1:] - z[:size - 1]
-        delta1[size - 1] = z[0] - z[size - 1]
-        len1 = np.abs(delta1)
-        
-        theta = np.zeros(size)
-        for i in range(size - 1):
-            ab_ab = dot_product_c(-delta1[i], delta1[i + 1]) / (len1[i] * len1[i + 1])  # arccosのoverflow対策
-            if abs(ab_ab) > 1.0:
-                theta[i + 1] = 0.0
-            else:
-                theta[i + 1] = np.arccos(ab_ab)
-        
-        ab_ab = dot_product_c(-delta1[size - 1], delta1[0]) / (len1[size - 1] * len1[0])
-        if abs(ab_ab) > 1.0:
-            theta[0] = 0.0
-        else:
-            theta[0] = np.arccos(dot_product_c(-delta1[size - 1], delta1[0]) / (len1[size - 1] * len1[0]))
-        
-        outside = np.where(cross_product_c(np.concatenate([z[1:], [z[0]]]), z) > 0, True, False)
+        delta = central_delta(z)
+        theta = turning_angle(z)  # arccosの定義域外(丸め誤差)は0.0
+        is_outside = outside(z)
         # sum(pi - theta) ~ 2.0*piで円に近づいたとみなす
         theta_flag = 0
         if np.min(theta) > 0.95 * np.pi:
             theta_flag = 1
             
-        phai = np.arctan2(np.imag(-delta1), np.real(-delta1))
-        angle = phai + np.pi - 0.5 * theta
         if long_axis == "x":
             coef = 1.3 + 1j
         else:
             coef = 1.0 + 1j * 1.5
             
-        normal = np.exp(1j * angle) * coef
+        normal = bisector_normal(z, theta) * coef
         """
         # 格子の裏返り防止(隣接する格子点から外向きξ方向へ伸びる2つの格子線がなす角度が90°以上開いている場合に，新しいη格子線が既存のη格子線と被らないように角度を修正する)
         def prevent_turn_over_cell(i, imp1, downwind=True):
@@ -398,11 +412,13 @@ def make_grid_seko(z1, path="", fname="sample", mg2=True, vtk=True, bdm=True, tr
                 dmask = np.where(theta == theta, True, False)
                 for id in chk.flatten():
                     if dmask[id]:
-                        if outside[id]:
+                        if is_outside[id]:
                             z = np.concatenate([z[:id], [z[id]], [z[id]], [z[id]], z[id:]])
-                            normal = np.concatenate([normal[:id], [0.5 * (normal[id-1] + normal[id])], [normal[id]], [0.5 * (normal[id] + normal[id+1])], [normal[id+1]], normal[id+1:]])
+                            # 末尾の点の次は先頭の点(閉曲線)
+                            ip1 = (id + 1) % normal.shape[0]
+                            normal = np.concatenate([normal[:id], [0.5 * (normal[id-1] + normal[id])], [normal[id]], [0.5 * (normal[id] + normal[ip1])], [normal[ip1]], normal[id+1:]])
                             dmask = np.concatenate([dmask[:id], [dmask[id]], [dmask[id]], [dmask[id]], dmask[id:]])
-                            outside = np.concatenate([outside[:id], [outside[id]], [outside[id]], [outside[id]], outside[id:]])
+                            is_outside = np.concatenate([is_outside[:id], [is_outside[id]], [is_outside[id]], [is_outside[id]], is_outside[id:]])
     
         if np.min(np.abs(delta)) > 0.1 * np.average(np.abs(delta)):
             incremental = accel * min(min(2.0 / np.pi * np.min(np.abs(delta)), np.average(np.abs(delta))),
@@ -422,21 +438,22 @@ def make_grid_seko(z1, path="", fname="sample", mg2=True, vtk=True, bdm=True, tr
             else:
                 return (z + normal * incremental)[dmask]
 
-    def equidistant_offset(z2, max_incremental, accel, add=0, restriction=True, rate=0.5, min_theta_output=False):
+    # sizeを指定すると，押し出した後の点数によらずsize点で等間隔に並べ直す
+    def equidistant_offset(z2, max_incremental, accel, add=0, restriction=True, rate=0.5, min_theta_output=False, size=None):
         if min_theta_output:
             z2, theta_flag = offset_surface(z2, outer=True, max_incremental=max_incremental, accel=accel, restriction=restriction, min_theta_output=min_theta_output)
+            if size != None:
+                add = size - z2.shape[0]
             return get_equidistant_curve(z2, add, rate), theta_flag
         else:
             z2 = offset_surface(z2, outer = True, max_incremental = max_incremental, accel = accel,
                                             restriction = restriction, min_theta_output = min_theta_output)
+            if size != None:
+                add = size - z2.shape[0]
             return get_equidistant_curve(z2, add, rate)
 
     get_object_center = lambda z2: np.average(np.real(z2)) + 1j * np.average(np.imag(z2))
 
-    magnification = 5.0
-    max_incremental = 10.0  # radius1 * (magnification - 1) / eta_max
-    accel_parameter = 1.3  # 物体遠方領域でオフセット量を増やす際の割合
-
     # accel量の設定
     def set_accel(j, accel_parameter):
         if j < int(eta_max / 2):
@@ -445,15 +462,22 @@ def make_grid_seko(z1, path="", fname="sample", mg2=True, vtk=True, bdm=True, tr
             return accel_parameter
 
     z1_eq = get_equidistant_curve(z1)
-    pts_x = []
-    pts_y = []
-    pts_x.append(np.real(z1_eq))
-    pts_y.append(np.imag(z1_eq))
     xi_max += 2
-    # z2 = equidistant_offset(z1_eq, max_incremental, accel=1.0, add = 2)
-    z2= equidistant_offset(z1_eq, max_incremental, accel=1.0, restriction = False, rate = 0.5)
-    # z2 = offset_surface(z1_eq, True, max_incremental, accel = 1.0, restriction = False)
-    z2_eq = z2
+
+    control = None
+    layer_size = None  # セル数を指定したときのη格子線1本あたりの点数
+    if target_cells != None:
+        plan = plan_cell_budget(target_cells, far_field, get_model_length(z1), np.sum(edge_length(z1)), accel_parameter, tolerance)
+        print("cell budget: " + str(plan["n_surface"]) + " surface points, accel " + "{:.3f}".format(plan["accel"]) +
+              " from layer " + str(plan["switch"]) + ", estimated " + str(int(plan["estimate"])) + " cells")
+        z1_eq = get_equidistant_curve(z1, add=plan["n_surface"] - z1.shape[0])
+        eta_max = int(4 * target_cells / plan["n_surface"]) + 1  # 押し出す層数の上限
+        layer_size = plan["n_surface"]
+        control = cell_budget_control(target_cells, np.pi * far_field * get_model_length(z1), plan["switch"], plan["accel"])
+
+    if max_incremental == None:
+        radius1 = 0.5 * get_model_length(z1)
+        max_incremental = radius1 * (magnification - 1) / eta_max
 
     # z2 = np.hstack((z2[1:], z2[0]))
     def get_im1_im0_ip1_ip2(i, size):
@@ -480,13 +504,15 @@ def make_grid_seko(z1, path="", fname="sample", mg2=True, vtk=True, bdm=True, tr
     def merge_edge(z2):
         size = z2.shape[0]
         z2_xy = make_point(z2)
-        merge = np.zeros(size)
-        
-        for i in range(size):
-            im1, im0, ip1, ip2 = get_im1_im0_ip1_ip2(i, size)
-            if (dot_product_c(z2[ip2] - z2[im1], z2[ip1] - z2[im0]) / (np.abs(z2[ip2] - z2[im1]) * np.abs(z2[ip1] - z2[im0])) < 0.0) or (
-                    line_intersect(z2_xy[im1], z2_xy[ip2], z2_xy[im0], z2_xy[ip1])):
-                merge[i] = 1
+
+        # 点i-1と点i+2を結ぶ線分が辺(i, i+1)と逆向き，または交差する場合に辺(i, i+1)を1点にまとめる
+        im1 = np.roll(np.arange(size), 1)
+        ip1 = np.roll(np.arange(size), -1)
+        ip2 = np.roll(np.arange(size), -2)
+        chord = z2[ip2] - z2[im1]
+        edge = z2[ip1] - z2
+        merge = np.where((dot_product_c(chord, edge) / (np.abs(chord) * np.abs(edge)) < 0.0) |
+                         segments_intersect(z2_xy[im1], z2_xy[ip2], z2_xy, z2_xy[ip1]), 1, 0)
 
         for i in range(size - 1, -1, -1):
             if merge[i] == 1:
@@ -495,69 +521,77 @@ def make_grid_seko(z1, path="", fname="sample", mg2=True, vtk=True, bdm=True, tr
                 size -= 1
         return z2
     
+    # 平均辺長のparam倍より短い辺を中点にまとめる(平均辺長はまとめる前の値)
     def delete_edge(z2, param=0.6):
-        size = z2.shape[0]
-        flag = 1
-        const = 0
-        while flag != 0:
-            flag = 0
-            delta = np.concatenate([z2[1:] - z2[:size - 1], [z2[0] - z2[size - 1]]])
-            len = np.abs(delta)
-            if const == 0:
-                ave_len = np.average(len)
-                const = 1
-            for i in range(size):
-                if len[i] < param * ave_len:
-                    flag = 1
-                    im1, im0, ip1, ip2 = get_im1_im0_ip1_ip2(i, size)
-                    z2 = safe_concatenate(z2, size, im0, ip1, ip2)
-                    size -= 1
-                    break
-        return z2
-
-    # print("calc base grid-line")
-    model_length = get_model_length(z1)
-    theta_j = 0
-    for j in range(1, eta_max):
-        # print(j, z2.shape)
-        pts_x.append(np.real(z2))
-        pts_y.append(np.imag(z2))
-        plot_complex(z2)
-        if theta_j == 0:
-            restrict = False
-        else:
-            restrict = True
+        return merge_short_edges(z2, param * np.average(edge_length(z2)))
+
+    # 物体表面から外部境界までη格子線を押し出していき，η格子線の束(layer_store)を返す
+    def march_layers(z1_eq):
+        layers = layer_store(capacity=16 * z1_eq.shape[0])
+        point_limit = 16 * z1_eq.shape[0] if max_layer_points == None else max_layer_points
+        layers.append(z1_eq)
+        # z2 = equidistant_offset(z1_eq, max_incremental, accel=1.0, add = 2)
+        # セル数を指定したときは，見積もりの前提どおり各η格子線をlayer_size点に並べ直す
+        # (凹部への点の追加(restriction = False)は層ごとに点数を増やし続けるので行わない)
+        z2= equidistant_offset(z1_eq, max_incremental, accel=1.0, restriction = control != None, rate = 0.5, size = layer_size)
+        # z2 = offset_surface(z1_eq, True, max_incremental, accel = 1.0, restriction = False)
+        # print("calc base grid-line")
+        model_length = get_model_length(z1)
+        theta_j = 0
+        cells = 0  # ここまでに押し出したη格子線の間のセル数の見積もり(隣り合う2本の点数の和)
+        for j in range(1, eta_max):
+            # print(j, z2.shape)
+            layers.append(z2)
+            cells += layers.layer(-2).shape[0] + z2.shape[0]
+            plot_complex(z2)
+            if theta_j == 0 and control == None:
+                restrict = False
+            else:
+                restrict = True
             
-        z2_equidistant, theta_flag = equidistant_offset(z2=z2, max_incremental=max_incremental, accel=set_accel(j, accel_parameter), add=0, rate = min(0.05 * j + 0.8, 1.0), restriction=restrict, min_theta_output = True)
-        # z2_orthogonal, m_theta = offset_surface(z2, outer=True, max_incremental=max_incremental, accel=set_accel(j, accel_parameter))
-        if theta_j == 0 and theta_flag == 1:
-            theta_j = j
+            if control == None:
+                accel = set_accel(j, accel_parameter)
+            else:
+                accel = control.accel(j, cells, z2.shape[0], np.sum(edge_length(z2)))
+            z2_equidistant, theta_flag = equidistant_offset(z2=z2, max_incremental=max_incremental, accel=accel, add=0, rate = min(0.05 * j + 0.8, 1.0), restriction=restrict, min_theta_output = True, size=layer_size)
+            # z2_orthogonal, m_theta = offset_surface(z2, outer=True, max_incremental=max_incremental, accel=set_accel(j, accel_parameter))
+            if theta_j == 0 and theta_flag == 1:
+                theta_j = j
         
-        fix_z2 = merge_edge(z2_equidistant) # (1.0 - mix_rate) * z2_orthogonal + mix_rate * z2_equidistant
-        # delta_j__ = np.hstack((z2[1:] - z2[:z2.shape[0] - 1], z2[0] - z2[z2.shape[0] - 1]))
-        # delta_jp1 = np.hstack((fix_z2[1:] - fix_z2[:fix_z2.shape[0] - 1], fix_z2[0] - fix_z2[fix_z2.shape[0] - 1]))
-        """
-        if np.any(np.real(delta_j__ * np.conj(delta_jp1)) < 0):
-            mix_rate = 1.0 - max(-0.18 * np.exp(-float(j - 2)), 0.7 - 0.1 * flag)
-            print(mix_rate)
-            if mix_rate > 0.9:
-                z2 = fix_z2
-                break
-        else:
-            flag = -1
-        """
-        z2 = delete_edge(fix_z2)
-        plot_complex(z2)
+            fix_z2 = merge_edge(z2_equidistant) # (1.0 - mix_rate) * z2_orthogonal + mix_rate * z2_equidistant
+            # delta_j__ = np.hstack((z2[1:] - z2[:z2.shape[0] - 1], z2[0] - z2[z2.shape[0] - 1]))
+            # delta_jp1 = np.hstack((fix_z2[1:] - fix_z2[:fix_z2.shape[0] - 1], fix_z2[0] - fix_z2[fix_z2.shape[0] - 1]))
+            """
+            if np.any(np.real(delta_j__ * np.conj(delta_jp1)) < 0):
+                mix_rate = 1.0 - max(-0.18 * np.exp(-float(j - 2)), 0.7 - 0.1 * flag)
+                print(mix_rate)
+                if mix_rate > 0.9:
+                    z2 = fix_z2
+                    break
+            else:
+                flag = -1
+            """
+            z2 = delete_edge(fix_z2)
+            plot_complex(z2)
+            if z2.shape[0] > point_limit:
+                print("warning: layer " + str(j + 1) + " has " + str(z2.shape[0]) + " points (limit " + str(point_limit) +
+                      "), stop marching before reaching far_field")
+                return layers
         
 
-        if (np.max(np.real(z2)) - np.min(np.real(z2)) > 40.0 * model_length):
-            eta_max = j + 2
-            break
+            if (np.max(np.real(z2)) - np.min(np.real(z2)) > far_field * model_length):
+                break
+
+        z3 = z2
+
+        layers.append(z3)
+        return layers
 
-    z3 = z2
+    # max_incrementalはmagnificationから決めた後の実際の値をキーにする
+    layer_key = cache_key("layer", z1=z1_eq, max_incremental=max_incremental, accel_parameter=accel_parameter, far_field=far_field,
+                          target_cells=target_cells, tolerance=tolerance, max_layer_points=max_layer_points)
+    layers = unpack_layers(cached_arrays(cache, layer_key, lambda: pack_layers(march_layers(z1_eq))))
 
-    pts_x.append(np.real(z3))
-    pts_y.append(np.imag(z3))
     """
     # ここまででおおよその点の追加が終了
     # このまま三角形を形成すると段階では物体を貫通していたり，都合のよくない線が存在している可能性がある
@@ -649,107 +683,28 @@ def make_grid_seko(z1, path="", fname="sample", mg2=True, vtk=True, bdm=True, tr
     plt.ylim(-0.1, 1.1)
     plt.show()
     """
-    # print("genearate eta1")
-    # 追加する点の総数が分かった時点で，物体表面→η=1線の格子を先に切る
-    # 物体表面のη=0線と物体表面から少し外側のη=1格子線を三角形で繋ぐ
-    def eta_next(z1_eq, z2_eq, cum_p):
-        num0 = z1_eq.shape[0]
-        num1 = z2_eq.shape[0]
-        edge_mask = np.ones((num0, num1), dtype=int)
-        length = np.zeros((num0, num1), dtype=float)
-        for i in range(num0):
-            for j in range(num1):
-                length[i, j] = np.abs(z1_eq[i] - z2_eq[j])
-
-        z1_xy = make_point(z1_eq)
-        z2_xy = make_point(z2_eq)
-
-        # print("0th step")
-        # 0.物体表面における辺の長さの最大値と比較して長すぎるものを除外
-        ave = np.max(np.abs(z1_eq[1:] - z1_eq[:z1_eq.shape[0] - 1]))
-        
-        for i in range(num0):
-            for j in range(num1):
-                if length[i, j] > 4.0 * ave:
-                    edge_mask[i, j] = 0
-                
-        # print("1st step")
-        # 1.そもそも物体表面と交差してるのを除外
-        for i in range(num0):
-            for j in range(num1):
-                for k in range(num0):
-                    kp1 = k + 1
-                    if kp1 == num0:
-                        kp1 = 0
-                    if (i != k and i != kp1):
-                        if line_intersect(z1_xy[i], z2_xy[j], z1_xy[k], z1_xy[kp1]):
-                            edge_mask[i, j] = 0
-
-        # print("2nd step")
-        # 2.線分同士で交差してるのを除外(bluteforth)
-        for i in range(num0):    # p1
-            for j in range(num1):    # p2
-                if edge_mask[i, j] != 0:    # まだ除外されてない線分p1-p2のうち
-                    for k in range(num0):    # p3
-                        if k != i:  # p1 = p3は交差してないことにする
-                            for l in range(num1):    # p4
-                                if l != j:  # p2 = p4も交差してないことにする
-                                    if(edge_mask[k, l] != 0):   # p3-p4がまだ除外されていなければ
-                                        if line_intersect(z1_xy[i], z2_xy[j], z1_xy[k], z2_xy[l]):  # 交差してたら長い方を消す
-                                            if length[i, j] > length[k, l]:
-                                                edge_mask[i, j] = 0
-                                            else:
-                                                edge_mask[k, l] = 0
-        # print("3rd step")
-        # 3.残った辺から三角形を構築
-        simplices = []  # 最終的な格子に登録する用
-        for i in range(num0):    # p1
-            for j in range(num1):    # p3
-                if edge_mask[i, j] == 1:    # 辺p1-p3が生き残っていたときに
-                    jp1 = j + 1
-                    if jp1 == num1:
-                        jp1 = 0
-    
-                    if edge_mask[i, jp1] == 1:
-                        simplices.append([i + cum_p, j + cum_p + num0, jp1 + cum_p + num0])
-
-        for i in range(num1):    # p2
-            for j in range(num0):    # p1
-                if edge_mask[j, i] == 1:    # 辺p1-p2が生き残っており
-                    jp1 = j + 1
-                    if jp1 == num0:
-                        jp1 = 0
-                    if edge_mask[jp1, i] == 1:    # 次に生き残っている辺p2-p3について
-                        simplices.append([i + cum_p + num0, j + cum_p, jp1 + cum_p])
-
-        simplices = (np.array(simplices))
-
-        new_edge = []
-        for i in range(num0):
-            for j in range(num1):
-                if edge_mask[i, j] == 1:
-                    new_edge.append([i, j])
-        new_edge = np.array(new_edge)
-        return simplices, new_edge
-    
-    cum_p = 0
-    total_simplices, new_edge = eta_next(z1_eq, z2_eq, cum_p)
-    cum_p = z1_eq.shape[0]
-    total_point = np.vstack([np.real(z1_eq), np.imag(z1_eq)]).T
-    total_point = np.concatenate([total_point, np.vstack([np.real(z2_eq), np.imag(z2_eq)]).T])
-
-    eta_max = len(pts_x)
-    
-    for j in range(1, eta_max-1):
-        print(str(j) + "_line")
-        z1_eq = pts_x[j] + 1j * pts_y[j]
-        z2_eq = pts_x[j+1] + 1j * pts_y[j+1]
-        total_point = np.concatenate([total_point, np.vstack([np.real(z2_eq), np.imag(z2_eq)]).T])
-        simplices, new_edge = eta_next(z1_eq, z2_eq, cum_p)
-        cum_p += z1_eq.shape[0]
-        total_simplices = np.concatenate([total_simplices, simplices])
+    # 隣り合うη格子線の組ごとの三角形分割は互いに独立なので，プロセスプールで並列に行う
+    # 点番号のずれ(各η格子線の先頭の点番号)はlayer_storeの区切り位置をそのまま使い，確保済みの配列に書き込む
+    offset = layers.offsets()
+    total_point = layers.point_xy()
+
+    print("triangulate " + str(len(layers) - 1) + " layer pairs")
+    layer_simplices = map_layer_pairs(stitch_layer_pair, [(layers.layer(j), layers.layer(j + 1)) for j in range(len(layers) - 1)], processes)
+    cell_offset = np.concatenate([[0], np.cumsum([simplices.shape[0] for simplices in layer_simplices])])
+    total_simplices = np.empty((cell_offset[-1], 3), dtype=int)
+    for j, simplices in enumerate(layer_simplices):
+        total_simplices[cell_offset[j]:cell_offset[j + 1]] = simplices + offset[j]
+
+    if target_cells != None:
+        print("cells: " + str(total_simplices.shape[0]) + " (target " + str(target_cells) + ")")
+        if abs(total_simplices.shape[0] / target_cells - 1.0) > tolerance:
+            print("warning: cell count is out of tolerance")
 
     Tri2vtk(path = path, fname = fname, Tri_points = total_point, Tri_simplices = total_simplices)
+    if mayu:
+        Tri2mayu(path = path, fname = fname, Tri_points = total_point, Tri_simplices = total_simplices)
+    if cache != None:
+        cache.save(grid_key, point = total_point, simplices = total_simplices)
     """
     obj_center = np.array([np.real(get_object_center(z2_eq)), np.imag(get_object_center(z2_eq))])
     for j in range(theta_j, eta_max - 1):
@@ -808,42 +763,24 @@ def make_grid_seko(z1, path="", fname="sample", mg2=True, vtk=True, bdm=True, tr
 
     mask = np.where(checK_target == 1, True, False)
 
+    # 物体内部の三角形の辺と新規追加する辺はバケット格子に一度だけ登録しておく
+    pattern = np.array([[0,1], [1,2], [2,0]])
+    obj_edge_index = segment_index(obj_tri_pts[obj_tri_spx[:, pattern[:, 0]]].reshape(-1, 2), obj_tri_pts[obj_tri_spx[:, pattern[:, 1]]].reshape(-1, 2))
+    new_edge_index = segment_index(z1_xy[new_edge[:, 0]], z2_xy[new_edge[:, 1]])
+
     def tri_intersect(pts3, obj_tri_pts, obj_tri_spx):
-        pattern = np.array([[0,1], [1,2], [2,0]])
-        cross = 0
+        if np.any(obj_edge_index.crossing_any(pts3[pattern[:, 0]], pts3[pattern[:, 1]])):
+            return True
+
         i = 0
         for tri in obj_tri_spx:
             obj_pts3 = obj_tri_pts[tri]
-            for out_pat in pattern:
-                for obj_pat in pattern:
-                    chk = line_intersect(pts3[out_pat[0]], pts3[out_pat[1]], obj_pts3[obj_pat[0]], obj_pts3[obj_pat[1]])
-                    if chk:
-                        cross = 1
-                        break
-                    chk2 = point_intersect(pts[i % 3], obj_pts3[0], obj_pts3[1], obj_pts3[2])
-                    i += 1
-                    if chk2:
-                        cross = 1
-                        break
-                if cross == 1:
-                    break
-            if cross == 1:
-                break
-
-
-        if cross == 0:
-            for iEdge in range(new_edge_num):
-                i = new_edge[iEdge, 0]
-                j = new_edge[iEdge, 1]
-                for out_pat in pattern:
-                    chk = line_intersect(pts3[out_pat[0]], pts3[out_pat[1]], z1_xy[i], z2_xy[j])
-                    if chk:
-                        cross = 1
-                        break
-                if cross == 1:
-                    break
+            for k in range(9):
+                if point_intersect(pts[i % 3], obj_pts3[0], obj_pts3[1], obj_pts3[2]):
+                    return True
+                i += 1
 
-        return cross == 1
+        return np.any(new_edge_index.crossing_any(pts3[pattern[:, 0]], pts3[pattern[:, 1]]))
 
     print("judge traiangle intersect")
     # 物体を通過する線分を保有する三角形要素 (&新規追加する辺と接触する三角形要素)の除去(これを行うためのマスク作成)
@@ -861,14 +798,49 @@ def make_grid_seko(z1, path="", fname="sample", mg2=True, vtk=True, bdm=True, tr
     
     Tri2vtk(path=path, fname=fname, Tri_points=grid_pts, Tri_simplices=grid_simplices)
     """
-    return
+    return total_point, total_simplices
+
+
+# NACA翼族(type=3:4桁，type=4:5桁)の物体表面をNaca_familyでまとめて計算する
+# 戻り値はcodesの順に並べたget_complex_coords(type, size, naca4=code)の戻り値(z, 点数)のリスト
+def get_family_coords(type, size, codes, cache=None):
+    if type != 3 and type != 4:
+        print("type error")
+        exit()
+
+    def compute():
+        naca = Naca_family(codes, attack_angle_deg=0.0, resolution=size, quasi_equidistant=False, length_adjust=(type == 4))
+        return {"z": naca.transform2complex()}
+
+    family = cached_arrays(cache, cache_key("family", type=type, size=size, codes=tuple(codes)), compute)
+    coords = []
+    for z in family["z"]:
+        z = adjust_length(z)
+        coords.append((z, z.shape[0]))
+    return coords
+
+
+# get_complex_coordsと同じだが，cacheにgrid_cacheを渡すと同じ形状・分割数の物体表面を再利用する
+def get_surface_coords(type, size, center_x=-0.08, center_y=0.08, naca4="0012", cache=None):
+    def compute():
+        z, size_out = get_complex_coords(type=type, size=size, center_x=center_x, center_y=center_y, naca4=naca4)
+        return {"z": z, "size": np.array(size_out)}
+
+    # 形状の決定に使われないパラメータはキーに含めない
+    code = naca4 if type >= 3 else None
+    center = (center_x, center_y) if type in (1, 2) else None
+    surface = cached_arrays(cache, cache_key("surface", type=type, size=size, code=code, center=center), compute)
+    return surface["z"], int(surface["size"])
 
 
 def make_grid(fname, type, size=100, naca4="0012", center_x=0.08, center_y=0.08, mayugrid2=False, vtk=False, bdm=False,
-              trianglation=True, path=""):
-    z1, size = get_complex_coords(type=type, center_x=center_x, center_y=center_y, naca4=naca4, size=size)
+              trianglation=True, path="", mayu=False, cache=None, processes=None, far_field=40.0, target_cells=None, tolerance=0.05,
+              max_incremental=10.0, magnification=5.0, accel_parameter=1.3, max_layer_points=None):
+    z1, size = get_surface_coords(type=type, center_x=center_x, center_y=center_y, naca4=naca4, size=size, cache=cache)
     z1 = deduplication(z1)[::-1]
-    make_grid_seko(z1, path, fname, mayugrid2, vtk, bdm, trianglation)
+    return make_grid_seko(z1, path, fname, mayugrid2, vtk, bdm, trianglation, mayu, max_incremental=max_incremental, cache=cache,
+                          processes=processes, far_field=far_field, target_cells=target_cells, tolerance=tolerance,
+                          magnification=magnification, accel_parameter=accel_parameter, max_layer_points=max_layer_points)
 
 def main():
     z1, size = get_complex_coords(type=3, naca4="2831", size=100)
@@ -882,53 +854,56 @@ def main():
 
 
 def makeGridLoop():
-    header = "NACA"
+    from grid_farm import make_case_list, run_grid_farm
     path = "G:\\Toyota\\Data\\grid_vtk\\NACA4\\"
-    fin_path = "G:\\Toyota\\Data\\grid_vtk\\NACA4_finish\\"
     i1 = 9
     print(i1)
-    # for i1 in range(start + 1, start+500, 2):
-    for i2 in range(5, 10):
-        for i34 in range(1, 40):
-            naca4 = str(i1) + str(i2) + str(i34).zfill(2)
-            fname = header + naca4
-            if os.path.exists(fin_path + fname + ".vtk") == False:
-                print(fname)
-                make_grid(fname, type=3, naca4=naca4, path = path, size=50)
-        
-def output_coords_csv(fname = "NACA", type = 3, size = 200, naca4 = "0411", center_x = 0.08, center_y = 0.08):
+    naca4_list = [str(i1) + str(i2) + str(i34).zfill(2) for i2 in range(5, 10) for i34 in range(1, 40)]
+    run_grid_farm(make_case_list(type=3, code_list=naca4_list, size=50), path=path)
+
+
+# output_coords_csvで出力するNACA4桁翼の番号一覧
+def naca4_family():
+    return [str(i1) + str(i2) + str(i34).zfill(2) for i1 in range(10) for i2 in range(10) for i34 in range(1, 100)]
+
+
+# output_coords_csvで出力するNACA5桁翼の番号一覧
+def naca5_family():
+    head_int3 = [210, 220, 230, 240, 250, 221, 231, 241, 251]
+    return [str(int3) + str(i45).zfill(2) for int3 in head_int3 for i45 in range(1, 100)]
+
+
+# 翼族の物体表面座標を等間隔に並べ直し，1つの形状アーカイブ(shape_archive)にまとめて出力する
+# n_pointsを省略すると2 * size点(翼ごとに重複点の削除で点数が変わるので，全翼で同じ点数に並べ直す)
+# csv=Trueのときは従来どおり翼ごとの_x.csv, _y.csvも出力する
+def output_coords_csv(fname = "NACA", type = 3, size = 200, naca4 = "0411", center_x = 0.08, center_y = 0.08, cache = None,
+                      n_points = None, csv = False):
     if type == 3:
         path = "G:\\Toyota\\Data\\grid_vtk\\NACA4_csv_HD\\"
-        for i1 in range(10):
-            for i2 in range(10):
-                for i34 in range(1,100):
-                    naca4 = str(i1) + str(i2) + str(i34).zfill(2)
-                    z1, gomi = get_complex_coords(type = type, center_x = center_x, center_y = center_y, naca4 = naca4, size = size)
-                    z_u, z_l = split_surface(deduplication(z1)[::-1])
-                    # z_u, z_l = split_surface(z1[::-1])
-                    new_z_eq = np.concatenate([z_u, z_l[1:z_l.shape[0] - 1]])
-                    z1 = get_equidistant_curve(new_z_eq, high_dens = False)
-                    fname = "NACA" +  naca4
-                    
-                    np.savetxt(path + fname + "_x.csv", np.real(z1), delimiter=",")
-                    np.savetxt(path + fname + "_y.csv", np.imag(z1), delimiter = ",")
-    
+        code_list = naca4_family()
     elif type == 4:
         path = "G:\\Toyota\\Data\\grid_vtk\\NACA5_csv_HD\\"
-        head_int3 = [210, 220, 230, 240, 250, 221, 231, 241, 251]
-        for int3 in head_int3:
-            for i45 in range(1, 100):
-                    naca5 = str(int3) + str(i45).zfill(2)
-                    z1, gomi = get_complex_coords(type = type, center_x = center_x, center_y = center_y, naca4 = naca5,
-                                                  size = size)
-                    z_u, z_l = split_surface(deduplication(z1)[::-1])
-                    new_z_eq = np.concatenate([z_u, z_l[1:z_l.shape[0] - 1]])
-                    z1 = get_equidistant_curve(new_z_eq, high_dens = False)
-                    fname = "NACA" + naca5
-                
-                    np.savetxt(path + fname + "_x.csv", np.real(z1), delimiter = ",")
-                    np.savetxt(path + fname + "_y.csv", np.imag(z1), delimiter = ",")
-                    
+        code_list = naca5_family()
+    else:
+        print("type error")
+        exit()
+    if n_points == None:
+        n_points = 2 * size
+
+    surface = dict(zip(code_list, get_family_coords(type, size, code_list, cache = cache)))
+
+    def compute(code):
+        z1, gomi = surface[code]
+        z_u, z_l = split_surface(deduplication(z1)[::-1])
+        new_z_eq = np.concatenate([z_u, z_l[1:z_l.shape[0] - 1]])
+        z1 = get_equidistant_curve(new_z_eq, add = n_points - new_z_eq.shape[0], high_dens = False)
+        if csv:
+            np.savetxt(path + fname + code + "_x.csv", np.real(z1), delimiter = ",")
+            np.savetxt(path + fname + code + "_y.csv", np.imag(z1), delimiter = ",")
+        return np.vstack([np.real(z1), np.imag(z1)]).T
+
+    write_shape_archive(path + fname + "_shape", code_list, n_points, compute)
+
 if __name__ == '__main__':
     # main()
     # makeGridLoop()
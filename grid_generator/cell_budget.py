@@ -0,0 +1,99 @@
+# coding: utf-8
+# 目標セル数と外部境界までの距離から，物体表面の分割数・set_accelの切り替え位置・遠方でのオフセット倍率を決める
+# 事前の見積もり(plan_cell_budget)はη格子線を円で近似した周長の漸化式で行い，
+# 押し出し中はcell_budget_controlが残りのセル数と残りの距離から1層ごとにオフセット倍率を修正して目標に合わせる
+import numpy as np
+
+# accel=1.0のとき1層あたりの周長の増加率は約1 + GROWTH_COEF / n (n:η格子線の点数)
+# offset_surfaceのオフセット量 2/pi * min|z[i+1] - z[i-1]| ~ 4/pi * 周長/n を半径の増分とみなした値
+GROWTH_COEF = 8.0
+
+
+# 点数nのη格子線を周長perimeterからfar_perimeterまで押し出したときのセル数の見積もり
+# switch層目まではaccel=1.0，それ以降はaccelで押し出す(1層あたりのセル数は約2n)
+def estimate_cells(n, perimeter, far_perimeter, switch, accel):
+    near = 1.0 + GROWTH_COEF / n
+    far = 1.0 + GROWTH_COEF * accel / n
+    p_switch = perimeter * near ** switch
+    if p_switch >= far_perimeter:
+        layers = np.log(far_perimeter / perimeter) / np.log(near)
+    else:
+        layers = switch + np.log(far_perimeter / p_switch) / np.log(far)
+    return 2.0 * n * max(layers, 1.0)
+
+
+# target_cells:目標セル数，far_field:外部境界のx方向の幅(物体の長軸長さの何倍か)
+# model_length:物体の長軸長さ，perimeter:物体表面の周長
+# 元の格子生成と同じくset_accelの切り替えはsurface点数の半分の層とし，
+# accel_parameterで目標に合う点数を選んだ後，許容誤差を外れる分は遠方のオフセット倍率で調整する
+def plan_cell_budget(target_cells, far_field, model_length, perimeter, accel_parameter=1.3, tolerance=0.05,
+                     n_min=32, n_max=4096, accel_min=1.0, accel_max=4.0):
+    far_perimeter = np.pi * far_field * model_length
+    if far_perimeter <= perimeter:
+        print("far field is inside the object")
+        exit()
+
+    cells = lambda n, accel: estimate_cells(n, perimeter, far_perimeter, n // 2, accel)
+
+    # セル数はおおよそnの2乗に比例して増えるので二分法で点数を決める
+    lo = n_min
+    hi = n_max
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if cells(mid, accel_parameter) < target_cells:
+            lo = mid
+        else:
+            hi = mid
+    n = lo if abs(cells(lo, accel_parameter) - target_cells) <= abs(cells(hi, accel_parameter) - target_cells) else hi
+
+    # 点数を整数に丸めた分の誤差はオフセット倍率で吸収する(倍率を上げるほど層数は減る)
+    accel = accel_parameter
+    if abs(cells(n, accel) / target_cells - 1.0) > tolerance:
+        lo_a = accel_min
+        hi_a = accel_max
+        for i in range(50):
+            accel = 0.5 * (lo_a + hi_a)
+            if cells(n, accel) > target_cells:
+                lo_a = accel
+            else:
+                hi_a = accel
+    return {"n_surface": int(n), "switch": int(n // 2), "accel": float(accel), "estimate": float(cells(n, accel))}
+
+
+# 押し出し中のオフセット倍率の制御
+# switch層目以降は，残りのセル数を今のη格子線の点数で割った層数で外部境界(周長far_perimeter)に届くように倍率を決める
+# 物体が細長いとx方向の幅は初めのうちほとんど増えないので，幅ではなく周長の増加率で制御する
+# 倍率あたりの周長の増加率は直前の層の実際の増加から推定し直す
+class cell_budget_control(object):
+    def __init__(self, target_cells, far_perimeter, switch, accel, accel_min=0.5, accel_max=4.0):
+        self.target_cells = target_cells
+        self.far_perimeter = far_perimeter
+        self.switch = switch
+        self.accel_plan = accel
+        self.accel_min = accel_min
+        self.accel_max = accel_max
+        self.growth = None  # accel=1.0あたりの1層の周長の増加率
+        self.last_accel = 1.0
+        self.last_perimeter = None
+
+    # j層目(点数size，周長perimeter，ここまでのセル数cells)から次の層へ押し出すときの倍率
+    # switch層目より前でも，残りのセル数で外部境界に届くのに計画より大きな倍率が必要になったらその層で切り替える
+    # 実際の周長の増加が見積もりより速いときは，switch層目より前でも1.0より小さい倍率(accel_min以上)で押し出す
+    def accel(self, j, cells, size, perimeter):
+        self.observe(perimeter)
+        growth = GROWTH_COEF / size if self.growth == None else self.growth
+        layers = max((self.target_cells - cells) / (2.0 * size), 1.0)
+        ratio = (self.far_perimeter / perimeter) ** (1.0 / layers) - 1.0
+        accel = ratio / growth
+        if j < self.switch and accel <= self.accel_plan:
+            self.last_accel = float(np.clip(accel, self.accel_min, 1.0))
+        else:
+            self.switch = min(self.switch, j)
+            self.last_accel = float(np.clip(accel, self.accel_min, self.accel_max))
+        return self.last_accel
+
+    def observe(self, perimeter):
+        if self.last_perimeter != None and perimeter > self.last_perimeter:
+            growth = (perimeter / self.last_perimeter - 1.0) / self.last_accel
+            self.growth = growth if self.growth == None else 0.5 * (self.growth + growth)
+        self.last_perimeter = perimeter
@@ -0,0 +1,74 @@
+# coding: utf-8
+# mayu_exporter.tri2mayuの出力がManipulateVtk/Preprocessing4UnstructuredGrid(Fortran)の出力とバイト単位で一致するかを確かめる
+# Fortran側はMakefileがifort用なので，gfortranでは次のようにビルドする(UMakeInternalObjectの10**30のために-fno-range-checkが必要)
+#   cd ManipulateVtk/Preprocessing4UnstructuredGrid
+#   gfortran -O2 -ffree-line-length-none -fno-range-check -o Preprocessing4UnstructuredGrid \
+#       ../../../flow_solver/EulerSolver2_2018/source/{LoopVar_Mod,StructVar_Mod,FrequentOperation}.f90 \
+#       source/{UCalcCellVolume,UCalcEdgeArea,UCalcInscribedCircleOfCell,UReSortVirtualCell,UOutputUnStrGrid,UCheckGrid}.f90 \
+#       source/{UMakeEdgeNumber,UMakeInternalObject,UCalcElementCenter,UCalcWidthCell2Edge,UGetDistanceFromSurface_Edge}.f90 \
+#       source/{UReadRegionVTK,UCalcNormalVector,UMarkingVirtualCell,UMakeConvexHull}.f90 main.f90
+# (ソースの並びはMakefileと同じ．Makefileに無いsource/内の他のファイルは古い版なので含めない)
+import os
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+from mesh_writer import write_vtk
+from mayu_exporter import tri2mayu, read_boundary_data, read_vtk_tri
+
+BOUNDARY_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ManipulateVtk", "Preprocessing4UnstructuredGrid",
+                             "BoundaryData.DistanceBasis")
+
+
+# 比較用の小さなO型格子(半径1の物体から半径8の外周まで，周方向nt点×半径方向nr層を三角形に分割)
+def o_grid(nt=24, nr=6):
+    r = np.geomspace(1.0, 8.0, nr)
+    t = np.linspace(0.0, 2.0 * np.pi, nt, endpoint=False)
+    points = np.stack([np.outer(r, np.cos(t)).ravel(), np.outer(r, np.sin(t)).ravel()], axis=1)
+    a = (np.arange(nr - 1)[:, None] * nt + np.arange(nt)[None, :]).ravel()
+    b = (np.arange(nr - 1)[:, None] * nt + (np.arange(nt)[None, :] + 1) % nt).ravel()
+    simplices = np.concatenate([np.stack([a, b, b + nt], axis=1), np.stack([a, b + nt, a + nt], axis=1)])
+    return points, simplices
+
+
+# vtk_fname(legacy ASCII，三角形のみ)をFortranとtri2mayuの両方で*.mayuに変換し，一致すればTrueを返す
+# 一致しないときは最初に食い違う行を表示する
+def compare_mayu(vtk_fname, executable):
+    work = tempfile.mkdtemp()
+    try:
+        shutil.copy(vtk_fname, os.path.join(work, "grid.vtk"))
+        shutil.copy(BOUNDARY_DATA, os.path.join(work, "BoundaryData.DistanceBasis"))
+        subprocess.run([os.path.abspath(executable)], input=b"grid\n", cwd=work, stdout=subprocess.DEVNULL, check=True)
+        points, simplices = read_vtk_tri(os.path.join(work, "grid.vtk"))
+        tri2mayu(os.path.join(work, "grid_py.mayu"), points, simplices, read_boundary_data(BOUNDARY_DATA))
+
+        with open(os.path.join(work, "grid.mayu"), "rb") as f:
+            fortran = f.read()
+        with open(os.path.join(work, "grid_py.mayu"), "rb") as f:
+            python = f.read()
+        if fortran == python:
+            print(vtk_fname + ": identical (" + str(len(fortran)) + " bytes)")
+            return True
+        for i, (line_f, line_p) in enumerate(zip(fortran.split(b"\n"), python.split(b"\n"))):
+            if line_f != line_p:
+                print(vtk_fname + ": differs at line " + str(i + 1))
+                print("  fortran: " + line_f.decode("ascii", errors="replace"))
+                print("  python : " + line_p.decode("ascii", errors="replace"))
+                break
+        else:
+            print(vtk_fname + ": differs in length (" + str(len(fortran)) + " / " + str(len(python)) + " bytes)")
+        return False
+    finally:
+        shutil.rmtree(work)
+
+
+def main():
+    executable = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ManipulateVtk", "Preprocessing4UnstructuredGrid",
+                              "Preprocessing4UnstructuredGrid")
+    points, simplices = o_grid()
+    write_vtk("o_grid.vtk", points, simplices)
+    compare_mayu("o_grid.vtk", executable)
+
+
+if __name__ == '__main__':
+    main()
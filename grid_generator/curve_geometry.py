@@ -0,0 +1,126 @@
+# coding: utf-8
+# 閉曲線(複素座標の点列，最後の点の次は最初の点)の幾何量をまとめて計算する
+# η格子線1本ごとに呼ばれるので，点ごとのループを使わず配列演算だけで求める
+import numpy as np
+
+
+def dot_product_c(z1, z2):
+    return np.real(z1 * np.conjugate(z2))
+
+
+def cross_product_c(z1, z2):
+    return -np.real(z1 * 1j * z2)
+
+
+# 前進差分 z[i+1] - z[i](末尾は z[0] - z[n-1])
+def forward_delta(z):
+    return np.roll(z, -1) - z
+
+
+# 1点飛ばしの中心差分 z[i+1] - z[i-1]
+def central_delta(z):
+    return np.roll(z, -1) - np.roll(z, 1)
+
+
+# 辺(i, i+1)の長さ
+def edge_length(z):
+    return np.abs(forward_delta(z))
+
+
+# 点iまでの累積長さが全周長に占める割合(点0で0.0)
+def length_rate(z, output_total_length=False):
+    length = edge_length(z)
+    total_length = np.sum(length)
+    rate = np.concatenate([[0.0], np.cumsum(length)[:-1]]) / total_length
+    if output_total_length:
+        return rate, total_length
+    else:
+        return rate
+
+
+# 点iにおける辺(i-1, i)と辺(i, i+1)のなす角(直線上でpi，arccosの定義域を外れた場合は0.0)
+def turning_angle(z):
+    delta1 = forward_delta(z)
+    len1 = np.abs(delta1)
+    ab_ab = dot_product_c(-np.roll(delta1, 1), delta1) / (np.roll(len1, 1) * len1)
+    return np.where(np.abs(ab_ab) > 1.0, 0.0, np.arccos(np.clip(ab_ab, -1.0, 1.0)))
+
+
+# 点iにおける2辺の二等分線方向の単位ベクトル(turning_angleと組で使う)
+def bisector_normal(z, theta=None):
+    if theta is None:
+        theta = turning_angle(z)
+    delta1 = forward_delta(z)
+    phai = np.arctan2(np.imag(-delta1), np.real(-delta1))
+    return np.exp(1j * (phai + np.pi - 0.5 * theta))
+
+
+# 中心差分に直交する方向の角度(0～2piの範囲)
+def central_normal_angle(z):
+    delta2 = central_delta(z)
+    theta = np.angle(delta2 / (np.abs(delta2) * 1j))
+    return np.where(theta > 0, theta, theta + 2.0 * np.pi)
+
+
+# 点iと点i+1の位置ベクトルの外積から，点iが外側(凸側)に張り出しているかを判定する
+def outside(z):
+    return cross_product_c(np.roll(z, -1), z) > 0
+
+
+# 辺(i, i+1)が短い(short[i] == True)点iを一括で取り除くためのマスク(Trueが残す点)
+# 辺の長さは取り除く前の値で判定し，閉曲線の最初と最後の点は残す
+def interior_keep_mask(short):
+    keep = np.ones(short.shape[0], dtype=bool)
+    keep[1:short.shape[0] - 1] = ~short[1:short.shape[0] - 1]
+    return keep
+
+
+# 連続する短い辺から，端点を共有しない辺を選ぶ(短い辺の連なりの先頭から1本おき，周期境界をまたぐ連なりにも対応)
+def independent_edges(short):
+    size = short.shape[0]
+    if np.all(short):
+        return np.arange(0, size - size % 2, 2)
+    shift = np.argmin(short)  # 短くない辺から数え始めると連なりが配列の途中で切れない
+    rolled = np.roll(short, -shift)
+    index = np.arange(size)
+    run_start = np.maximum.accumulate(np.where(rolled & ~np.roll(rolled, 1), index, 0))
+    select = rolled & ((index - run_start) % 2 == 0)
+    return (np.nonzero(select)[0] + shift) % size
+
+
+# 長さがmin_length未満の辺を両端点の中点1点にまとめる(safe_concatenateと同じく辺(n-1, 0)の中点は末尾に置く)
+# 端点を共有しない短い辺をまとめて処理し，短い辺が無くなるまで繰り返す
+def merge_short_edges(z, min_length, min_size=3):
+    while z.shape[0] > min_size:
+        short = edge_length(z) < min_length
+        if not np.any(short):
+            break
+        edge = independent_edges(short)
+        edge = edge[:z.shape[0] - min_size]
+        z = z.copy()
+        z[edge] = 0.5 * (z[edge] + z[(edge + 1) % z.shape[0]])
+        keep = np.ones(z.shape[0], dtype=bool)
+        keep[(edge + 1) % z.shape[0]] = False
+        z = z[keep]
+    return z
+
+
+# 各行ごとの線形補間(行ごとのnp.interpを一括で行う)
+# xp, fp:(行数, m)の配列(xpは各行で単調非減少)，x:全行共通の(k,)または行ごとの(行数, k)の配列
+# 範囲外のxは端の値になる(np.interpと同じ)
+def batch_interp(x, xp, fp):
+    n, m = xp.shape
+    x = np.broadcast_to(x, (n, np.shape(x)[-1]))
+    # 行ごとにずらして1本の単調な配列にし，searchsortedを1回で済ませる
+    lo = min(np.min(xp), np.min(x))
+    width = max(np.max(xp), np.max(x)) - lo + 1.0
+    shift = np.arange(n).reshape(-1, 1) * width
+    index = np.searchsorted((xp - lo + shift).ravel(), (x - lo + shift).ravel(), side="right").reshape(n, -1)
+    index = np.clip(index - np.arange(n).reshape(-1, 1) * m, 1, m - 1)
+    x0 = np.take_along_axis(xp, index - 1, axis=1)
+    x1 = np.take_along_axis(xp, index, axis=1)
+    f0 = np.take_along_axis(fp, index - 1, axis=1)
+    f1 = np.take_along_axis(fp, index, axis=1)
+    dx = x1 - x0
+    rate = np.clip(np.where(dx > 0.0, (x - x0) / np.where(dx > 0.0, dx, 1.0), 0.0), 0.0, 1.0)
+    return f0 + rate * (f1 - f0)
@@ -0,0 +1,49 @@
+# coding: utf-8
+import numpy as np
+from scipy.spatial import cKDTree
+from segment_index import segment_index
+
+
+# η格子線z1_xy上の点とz2_xy上の点を結ぶ辺のうち，長さがmax_length以下のものを列挙する
+# 戻り値は辺の端点番号(i, j)の組(i, jの昇順)と辺の長さ
+def candidate_edges(z1_xy, z2_xy, max_length):
+    neighbor = cKDTree(z1_xy).query_ball_tree(cKDTree(z2_xy), r=max_length)
+    count = np.array([len(j_list) for j_list in neighbor], dtype=int)
+    edge = np.zeros((np.sum(count), 2), dtype=int)
+    edge[:, 0] = np.repeat(np.arange(z1_xy.shape[0]), count)
+    edge[:, 1] = np.concatenate([np.sort(j_list) for j_list in neighbor] + [np.zeros(0, dtype=int)])
+    length = np.sqrt(np.sum((z1_xy[edge[:, 0]] - z2_xy[edge[:, 1]]) ** 2, axis=1))
+    return edge, length
+
+
+# 互いに交差する線分の組を列挙する(線分p_start[n]-p_end[n]，戻り値は線分番号の組(a, b))
+def crossing_pairs(p_start, p_end):
+    return segment_index(p_start, p_end).self_crossing_pairs()
+
+
+# 交差する線分同士のうち長い方を消す(短い順に確定させ，確定済みの線分と交差する線分を除外する)
+# 長さが等しい場合は線分番号の小さい方を残す(eta_nextの総当たり版と同じ優先順位)
+def resolve_crossing_edges(p_start, p_end, length):
+    size = p_start.shape[0]
+    alive = np.ones(size, dtype=bool)
+    pair = crossing_pairs(p_start, p_end)
+    if pair.shape[0] == 0:
+        return alive
+
+    priority = np.lexsort((np.arange(size), length))
+    rank = np.empty(size, dtype=int)
+    rank[priority] = np.arange(size)
+
+    # 各組を(優先される線分, 消される候補の線分)の向きに揃えてCSR形式の隣接リストにする
+    swap = rank[pair[:, 0]] > rank[pair[:, 1]]
+    keep = np.where(swap, pair[:, 1], pair[:, 0])
+    lose = np.where(swap, pair[:, 0], pair[:, 1])
+    order = np.argsort(keep, kind="stable")
+    keep = keep[order]
+    lose = lose[order]
+    offset = np.searchsorted(keep, np.arange(size + 1))
+
+    for e in priority:
+        if alive[e]:
+            alive[lose[offset[e]:offset[e + 1]]] = False
+    return alive
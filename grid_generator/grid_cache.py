@@ -0,0 +1,111 @@
+# coding: utf-8
+# 物体表面・η格子線の束・完成した格子をディスクにキャッシュする
+# キーは入力(形状の種類，翼番号やJoukowskiの中心，分割数，生成パラメータ)のハッシュで，中身は圧縮したnpzで保存する
+# 合計サイズがmax_bytesを超えたら最後に使われた時刻の古いものから削除する(LRU)
+import os
+import json
+import hashlib
+import numpy as np
+from layer_store import layer_store
+
+# 格子生成の処理を変更して過去のキャッシュが使えなくなったら値を上げる
+CACHE_VERSION = 4
+
+
+# 種類名とパラメータ(数値，文字列，タプル，配列)からキャッシュのキーを作る
+def cache_key(kind, **params):
+    digest = hashlib.sha1(json.dumps([CACHE_VERSION, kind]).encode("utf-8"))
+    for name in sorted(params):
+        value = params[name]
+        digest.update(name.encode("utf-8"))
+        if isinstance(value, np.ndarray):
+            digest.update((str(value.dtype) + str(value.shape)).encode("utf-8"))
+            digest.update(np.ascontiguousarray(value).tobytes())
+        else:
+            digest.update(repr(value).encode("utf-8"))
+    return kind + "_" + digest.hexdigest()
+
+
+class grid_cache(object):
+    def __init__(self, cache_dir, max_bytes=4 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    # 見つからなければNoneを返す(読み込んだファイルは更新時刻を現在に変えてLRUの順序に反映する)
+    def load(self, key):
+        fname = self.path(key)
+        try:
+            with np.load(fname) as data:
+                arrays = {name: data[name] for name in data.files}
+            os.utime(fname, None)
+            return arrays
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # 書き込み途中で止まった等で壊れているものは捨てる
+            self.remove(fname)
+            return None
+
+    # 他のプロセスが同じキーを読んでも壊れないように一時ファイルに書いてから置き換える
+    def save(self, key, **arrays):
+        fname = self.path(key)
+        tmp_fname = fname + "." + str(os.getpid()) + ".tmp"
+        with open(tmp_fname, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_fname, fname)
+        self.evict()
+
+    def remove(self, fname):
+        try:
+            os.remove(fname)
+        except FileNotFoundError:
+            pass
+
+    # 合計サイズがmax_bytes以下になるまで古いものから削除する
+    def evict(self):
+        entry = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npz"):
+                fname = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(fname)
+                except FileNotFoundError:
+                    continue
+                entry.append((stat.st_mtime, stat.st_size, fname))
+        entry.sort()
+        total = sum([size for mtime, size, fname in entry])
+        for mtime, size, fname in entry[:-1]:
+            if total <= self.max_bytes:
+                break
+            self.remove(fname)
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npz"):
+                self.remove(os.path.join(self.cache_dir, name))
+
+
+# cacheがNoneなら毎回compute()で計算し，そうでなければキャッシュを使う(compute()は配列の辞書を返すこと)
+def cached_arrays(cache, key, compute):
+    if cache == None:
+        return compute()
+    arrays = cache.load(key)
+    if arrays == None:
+        arrays = compute()
+        cache.save(key, **arrays)
+    return arrays
+
+
+# layer_store(η格子線の束)を保存用の配列の辞書にする
+def pack_layers(layers):
+    return {"layer_z": layers.points(), "layer_offset": layers.offsets()}
+
+
+def unpack_layers(arrays):
+    return layer_store.from_arrays(arrays["layer_z"], arrays["layer_offset"])
@@ -0,0 +1,157 @@
+# coding: utf-8
+import os
+import json
+import time
+import traceback
+from multiprocessing import Pool, cpu_count
+import matplotlib.pyplot as plt
+from body_fitted_grid_generator import make_grid, naca4_family, naca5_family
+from grid_cache import grid_cache
+from mesh_quality import check_mesh, format_summary
+
+
+# 格子生成ケースの一覧を作る(type=3:NACA4桁, type=4:NACA5桁，code_listを省略するとoutput_coords_csvと同じ翼族全体)
+# mayu=Trueのときはvtkに加えてソルバー入力用の*.mayuも出力する
+# target_cellsを指定すると全ケースをそのセル数に合わせて生成する(far_fieldは外部境界の幅)
+# max_incremental, magnification, accel_parameterはmake_grid_sekoと同じ
+def make_case_list(type=3, code_list=None, size=50, mayu=False, target_cells=None, far_field=40.0, max_incremental=10.0,
+                   magnification=5.0, accel_parameter=1.3):
+    if code_list == None:
+        if type == 3:
+            code_list = naca4_family()
+        elif type == 4:
+            code_list = naca5_family()
+        else:
+            print("type error")
+            exit()
+    return [{"fname": "NACA" + code, "type": type, "naca4": code, "size": size, "mayu": mayu, "target_cells": target_cells,
+             "far_field": far_field, "max_incremental": max_incremental, "magnification": magnification,
+             "accel_parameter": accel_parameter} for code in code_list]
+
+
+def load_manifest(manifest_fname):
+    if os.path.exists(manifest_fname):
+        with open(manifest_fname, "r") as f:
+            return json.load(f)
+    else:
+        return {"cases": {}}
+
+
+# 途中で止まっても壊れないように一時ファイルに書いてから置き換える
+def save_manifest(manifest_fname, manifest):
+    tmp_fname = manifest_fname + ".tmp"
+    with open(tmp_fname, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_fname, manifest_fname)
+
+
+# ワーカープロセスで1ケース分の格子を生成する
+# cache_dirを指定すると物体表面・η格子線の束・格子をキャッシュし，同じ条件のケースは再計算しない
+# 生成した格子はmesh_qualityで検査し，基準を満たさないものは"rejected"とする(criteria=Falseで検査しない)
+# rejectedの格子の出力ファイルはpathに残さず，path直下のrejectedフォルダに移す
+def run_case(args):
+    case, path, cache_dir, criteria = args
+    start = time.time()
+    record = dict(case)
+    try:
+        cache = None if cache_dir == None else grid_cache(cache_dir)
+        points, simplices = make_grid(case["fname"], type=case["type"], naca4=case["naca4"], path=path, size=case["size"],
+                                      mayu=case.get("mayu", False), cache=cache, target_cells=case.get("target_cells"),
+                                      far_field=case.get("far_field", 40.0), max_incremental=case.get("max_incremental", 10.0),
+                                      magnification=case.get("magnification", 5.0),
+                                      accel_parameter=case.get("accel_parameter", 1.3))
+        record["status"] = "done"
+        record["error"] = None
+        if criteria != False:
+            passed, summary, reason = check_mesh(points, simplices, criteria=criteria)
+            record["quality"] = summary
+            if not passed:
+                record["status"] = "rejected"
+                record["error"] = ", ".join(reason)
+                move_outputs(path, case["fname"], os.path.join(path, "rejected", ""))
+    except (Exception, SystemExit):  # print→exit()で止まったケースもfailedとして記録し，プールを止めない
+        record["status"] = "failed"
+        record["error"] = traceback.format_exc()
+    finally:
+        plt.close("all")
+    record["elapsed"] = time.time() - start
+    record["finished"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    return record
+
+
+# 1ケース分の出力ファイル(*.vtk, *.vtu, *.mayu)をpathからnew_pathに移す
+def move_outputs(path, fname, new_path):
+    os.makedirs(new_path, exist_ok=True)
+    for ext in [".vtk", ".vtu", ".mayu"]:
+        if os.path.exists(path + fname + ext):
+            os.replace(path + fname + ext, new_path + fname + ext)
+
+
+# 格子生成をプロセスプールに振り分ける
+# ケースごとの状態・所要時間・エラーをmanifestに逐次記録し，再実行時は"done"のケースを飛ばして再開する
+# retry_failed=Trueのとき例外で止まった("failed")ケースを再実行する
+# 不合格("rejected")のケースは同じ条件で作り直しても同じ結果になるので，retry_rejected=Trueのときだけ再実行する
+def run_grid_farm(case_list, path, manifest_fname=None, processes=None, retry_failed=True, cache_dir=None, criteria=None,
+                  report_fname=None, retry_rejected=False):
+    if manifest_fname == None:
+        manifest_fname = path + "grid_manifest.json"
+    if processes == None:
+        processes = cpu_count()
+
+    manifest = load_manifest(manifest_fname)
+    skip_status = ["done"]
+    if not retry_failed:
+        skip_status.append("failed")
+    if not retry_rejected:
+        skip_status.append("rejected")
+    todo = [case for case in case_list if manifest["cases"].get(case["fname"], {}).get("status") not in skip_status]
+    print(str(len(case_list) - len(todo)) + " cases skipped, " + str(len(todo)) + " cases to run on " + str(processes) + " processes")
+
+    finished = 0
+    failed = 0
+    rejected = 0
+    with Pool(processes=processes, maxtasksperchild=1) as pool:
+        for record in pool.imap_unordered(run_case, [(case, path, cache_dir, criteria) for case in todo]):
+            manifest["cases"][record["fname"]] = record
+            save_manifest(manifest_fname, manifest)
+            finished += 1
+            if record["status"] == "failed":
+                failed += 1
+            elif record["status"] == "rejected":
+                rejected += 1
+            print(str(finished) + "/" + str(len(todo)) + " " + record["fname"] + " " + record["status"] + " (" + "{:.1f}".format(record["elapsed"]) + " s)")
+
+    print("finished: " + str(finished - failed - rejected) + ", rejected: " + str(rejected) + ", failed: " + str(failed))
+    if report_fname == None:
+        report_fname = path + "grid_quality_report.txt"
+    write_quality_report(report_fname, manifest)
+    return manifest
+
+
+# manifestに記録された全ケースの品質検査の結果をまとめて出力する
+def write_quality_report(report_fname, manifest):
+    count = {}
+    line = []
+    for fname in sorted(manifest["cases"]):
+        record = manifest["cases"][fname]
+        count[record["status"]] = count.get(record["status"], 0) + 1
+        if "quality" in record:
+            line.append(fname + " " + record["status"] + " " + format_summary(record["quality"]))
+        else:
+            line.append(fname + " " + record["status"])
+        if record["status"] != "done":
+            line.append("    " + record["error"].strip().split("\n")[-1])
+    total = ", ".join([status + ": " + str(count[status]) for status in sorted(count)])
+    print("quality gate " + total)
+    with open(report_fname, "w") as f:
+        f.write(total + "\n")
+        f.write("\n".join(line) + "\n")
+
+
+def main():
+    path = "G:\\Toyota\\Data\\grid_vtk\\NACA4\\"
+    run_grid_farm(make_case_list(type=3), path=path)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,13 @@ def re_numbering(z):
     start = np.argmax(np.real(z))
     return np.concatenate([z[start:z.shape[0] - 1], z[:start + 1]])
 
+# re_numberingを最後の軸に沿って一括で行う(z:(..., 点数)の閉曲線，始点と終点は同じ点)
+# 各曲線の後縁(実部が最大の点)を先頭にし，j番目の点には元の(start + j) mod (点数 - 1)番目の点を入れる
+def re_numbering_sweep(z):
+    size = z.shape[-1] - 1
+    start = np.argmax(np.real(z), axis=-1)[..., np.newaxis]
+    return np.take_along_axis(z, (start + np.arange(size + 1)) % size, axis=-1)
+
 def joukowski_tr(z, a):
     return z + a**2/z
 
@@ -18,6 +25,15 @@ def circle_center_a(size, center_x, center_y):
     t = np.linspace(start = 0, stop = 2.0*np.pi, num = size + 1)
     return R * np.exp(1j * t) + b
 
+# circle_center_aの中心を配列で与える版(戻り値は(中心の配列の形, size + 1)の複素配列)
+def circle_center_a_sweep(size, center_x, center_y):
+    center_x = np.asarray(center_x, dtype=float)[..., np.newaxis]
+    center_y = np.asarray(center_y, dtype=float)[..., np.newaxis]
+    R = np.sqrt((1.0 - center_x) ** 2 + center_y ** 2)
+    b = center_x + 1j * center_y
+    t = np.linspace(start = 0, stop = 2.0*np.pi, num = size + 1)
+    return R * np.exp(1j * t) + b
+
 def validation(size, center_x, center_y):
     z1 = circle_center_a(size, center_x, center_y)
     z2 = circle_center_a_mk2(z1.shape[0], center_x, center_y)
@@ -79,16 +95,34 @@ def joukowski_wing(size, center_x, center_y):
     return np.real(z), np.imag(z)
 
 def joukowski_wing_complex(size, center_x, center_y):
+    return joukowski_sweep_complex(size, center_x, center_y)
+
+def karman_trefftz_wing_complex(size, center_x, center_y):
+    return karman_trefftz_sweep_complex(size, center_x, center_y)
+
+# 円の中心(center_x, center_y)を配列で与えて，全ての翼を一度に写像する
+# center_x, center_yはブロードキャストできる形ならよく，戻り値は(ブロードキャスト後の形, size + 1)の複素配列
+# 各翼は後縁を先頭に並べ替え済み(1翼ずつjoukowski_wing_complexを呼んだ結果と同じ)
+def joukowski_sweep_complex(size, center_x, center_y):
     a = 1.0
-    z = circle_center_a(size, center_x, center_y)
+    z = circle_center_a_sweep(size, center_x, center_y)
     z = joukowski_tr(z, a)
-    return re_numbering(z)
+    return re_numbering_sweep(z)
 
-def karman_trefftz_wing_complex(size, center_x, center_y):
+# karman_trefftz_wing_complexの一括版(後縁の角度を決める指数nも配列で与えられる)
+def karman_trefftz_sweep_complex(size, center_x, center_y, n=1.94):
     b = 1.0
-    z = circle_center_a(size, center_x, center_y)
-    z = karman_trefftz_tr(z, b)
-    return re_numbering(z)
+    z = circle_center_a_sweep(size, *np.broadcast_arrays(center_x, center_y, n)[:2])
+    z = karman_trefftz_tr(z, b, np.asarray(n, dtype=float)[..., np.newaxis])
+    return re_numbering_sweep(z)
+
+# center_x, center_y(, n)の全ての組み合わせの格子について一括で写像し，(組み合わせの数, size + 1)の配列と各翼の値を返す
+def wing_sweep_grid(size, center_x, center_y, n=None):
+    if n is None:
+        cx, cy = np.meshgrid(center_x, center_y, indexing="ij")
+        return joukowski_sweep_complex(size, cx.ravel(), cy.ravel()), np.vstack([cx.ravel(), cy.ravel()]).T
+    cx, cy, nn = np.meshgrid(center_x, center_y, n, indexing="ij")
+    return karman_trefftz_sweep_complex(size, cx.ravel(), cy.ravel(), nn.ravel()), np.vstack([cx.ravel(), cy.ravel(), nn.ravel()]).T
 
 def naca_4_complex(size, int4):
     naca = Naca_4_digit(int_4=int4, attack_angle_deg=0, resolution=size)
@@ -0,0 +1,72 @@
+# coding: utf-8
+# η格子線ごとに点数の違う複素座標列を，1本の連続した複素配列と区切り位置(CSR形式)で保持する
+# 容量が足りなくなったら2倍に広げるので，η格子線を1本ずつ追加しても全体のコピーは数回で済む
+# layer(j)やpoints()は内部配列のビューを返す(コピーしない)ので，値を書き換えると格納済みの座標も変わる
+import numpy as np
+
+
+class layer_store(object):
+    def __init__(self, capacity=1024, max_layers=64):
+        self.buffer = np.empty(max(capacity, 1), dtype=complex)
+        self.offset = np.zeros(max(max_layers, 1) + 1, dtype=int)
+        self.n_layers = 0
+
+    # 圧縮保存した配列(pack_layersの出力)から作る
+    @classmethod
+    def from_arrays(cls, z, offset):
+        store = cls(capacity=z.shape[0], max_layers=offset.shape[0] - 1)
+        store.buffer[:z.shape[0]] = z
+        store.offset[:offset.shape[0]] = offset
+        store.n_layers = offset.shape[0] - 1
+        return store
+
+    def __len__(self):
+        return self.n_layers
+
+    # 格納済みの点の総数
+    def size(self):
+        return int(self.offset[self.n_layers])
+
+    def reserve(self, n_points, n_layers):
+        if n_points > self.buffer.shape[0]:
+            buffer = np.empty(max(n_points, 2 * self.buffer.shape[0]), dtype=complex)
+            buffer[:self.size()] = self.buffer[:self.size()]
+            self.buffer = buffer
+        if n_layers + 1 > self.offset.shape[0]:
+            offset = np.zeros(max(n_layers + 1, 2 * self.offset.shape[0]), dtype=int)
+            offset[:self.n_layers + 1] = self.offset[:self.n_layers + 1]
+            self.offset = offset
+
+    # η格子線を末尾に追加する
+    def append(self, z):
+        start = self.size()
+        self.reserve(start + z.shape[0], self.n_layers + 1)
+        self.buffer[start:start + z.shape[0]] = z
+        self.n_layers += 1
+        self.offset[self.n_layers] = start + z.shape[0]
+
+    # j番目のη格子線(複素座標のビュー)
+    def layer(self, j):
+        if j < 0:
+            j += self.n_layers
+        return self.buffer[self.offset[j]:self.offset[j + 1]]
+
+    def layer_size(self):
+        return np.diff(self.offset[:self.n_layers + 1])
+
+    # 各η格子線の先頭の点番号(末尾は点の総数)
+    def offsets(self):
+        return self.offset[:self.n_layers + 1]
+
+    # 全点の複素座標(ビュー)
+    def points(self):
+        return self.buffer[:self.size()]
+
+    # 全点の座標を(点数, 2)の実数配列として返す(複素数の実部・虚部の並びをそのまま見るのでコピーしない)
+    def point_xy(self):
+        return self.points().view(np.float64).reshape(-1, 2)
+
+
+# 複素座標列を(点数, 2)の実数配列として見る(連続した配列ならコピーしない)
+def complex_xy(z):
+    return np.ascontiguousarray(z, dtype=complex).view(np.float64).reshape(-1, 2)
@@ -0,0 +1,354 @@
+# coding: utf-8
+# 三角形格子(点座標と点番号)から非構造格子ソルバー用の*.mayuを直接書き出す
+# ManipulateVtk/Preprocessing4UnstructuredGrid(Fortran)と同じ処理を配列演算で行い，同じ書式で出力する
+# ※点・辺・セル番号はすべてFortran側と同じ1始まりで出力する
+import numpy as np
+from scipy.spatial import cKDTree
+
+# 仮想セルの境界条件番号(0:実セル, 1:流出入境界, 2:壁, 3:反射境界，4:重合格子境界, 999:未定義)
+UNDEFINED_BOUNDARY = 999
+
+# 三角形の局所辺番号lを構成する局所点番号(局所辺1:点2-点3, 局所辺2:点3-点1, 局所辺3:点1-点2)
+LOCAL_EDGE_POINT = np.array([[1, 2], [2, 0], [0, 1]])
+
+
+# BoundaryData.DistanceBasisの既定値
+def default_boundary_data():
+    return {"outer_boundary": 1, "center": np.zeros(3), "min_radius": 4.0,
+            "use_object": 1, "inner_boundary": 2, "object_center": np.zeros(3), "object_radius": 2.0}
+
+
+# BoundaryData.DistanceBasis(1行1項目，"注記 値 !コメント"の形式)を読み込む
+def read_boundary_data(fname):
+    with open(fname, "r", encoding="utf-8-sig") as f:
+        value = [line.split()[1] for line in f if len(line.split()) > 1]
+    boundary = {"outer_boundary": int(value[0]), "center": np.array(value[1:4], dtype=float),
+                "min_radius": float(value[4]), "use_object": int(value[5])}
+    if boundary["use_object"] == 1:
+        boundary["inner_boundary"] = int(value[6])
+        boundary["object_center"] = np.array(value[7:10], dtype=float)
+        boundary["object_radius"] = float(value[10])
+    return boundary
+
+
+# 共有辺の抽出と番号付け(UMakeEdgeNumber)
+# 仮の辺番号t = 3 * セル番号 + 局所辺番号のうち，同じ点の組をもつ辺は番号の小さい方を残し，相方の無い辺には仮想セルを割り当てる
+def make_edge_number(simplices):
+    real_cells = simplices.shape[0]
+    tmp_point = simplices[:, LOCAL_EDGE_POINT].reshape(-1, 2)
+    tmp_cell = np.repeat(np.arange(real_cells), 3)
+    tmp_local = np.tile(np.arange(3), real_cells)
+
+    key = np.sort(tmp_point, axis=1)
+    key = key[:, 0] * (np.max(simplices) + 1) + key[:, 1]
+    order = np.argsort(key, kind="stable")
+    unique_key, first, count = np.unique(key[order], return_index=True, return_counts=True)
+    if np.max(count) > 2:
+        print("non-manifold edge exists")
+        exit()
+
+    # 各辺の組について生き残る仮の辺(小さい方)と相方の仮の辺
+    survivor = order[first]
+    partner = np.where(count == 2, order[np.minimum(first + 1, order.shape[0] - 1)], -1)
+    sort_survivor = np.argsort(survivor)
+    survivor = survivor[sort_survivor]
+    partner = partner[sort_survivor]
+
+    edges = survivor.shape[0]
+    boundary = partner < 0
+    vc_total = np.count_nonzero(boundary)
+    vc_number = real_cells + np.arange(vc_total)
+
+    new_edge = np.zeros(3 * real_cells, dtype=int)
+    new_edge[survivor] = np.arange(edges)
+    new_edge[partner[~boundary]] = np.arange(edges)[~boundary]
+
+    line_point = tmp_point[survivor]
+    line_cell = np.zeros((edges, 4), dtype=int)
+    line_cell[:, 0] = tmp_cell[survivor]
+    line_cell[:, 1] = tmp_local[survivor]
+    line_cell[~boundary, 2] = tmp_cell[partner[~boundary]]
+    line_cell[~boundary, 3] = tmp_local[partner[~boundary]]
+    line_cell[boundary, 2] = vc_number
+    line_cell[boundary, 3] = 0
+
+    tri_cell = np.zeros(3 * real_cells, dtype=int)
+    tri_cell[survivor[~boundary]] = tmp_cell[partner[~boundary]]
+    tri_cell[partner[~boundary]] = tmp_cell[survivor[~boundary]]
+    tri_cell[survivor[boundary]] = vc_number
+
+    return {"tri_edge": new_edge.reshape(-1, 3), "tri_cell": tri_cell.reshape(-1, 3),
+            "line_point": line_point, "line_cell": line_cell,
+            "vc_cell": line_cell[boundary, :2], "vc_edge": np.where(boundary)[0]}
+
+
+# 3成分の内積(Fortranのdot_productと同じ順序で足し合わせる)
+def dot3(a, b):
+    return a[:, 0] * b[:, 0] + a[:, 1] * b[:, 1] + a[:, 2] * b[:, 2]
+
+
+# 幾何量の計算(UCalcElementCenter～UCalcInscribedCircleOfCell, UDataPointOfVirtualCell(2))
+def calc_geometry(point, simplices, grid):
+    tri_edge = grid["tri_edge"]
+    line_point = grid["line_point"]
+    p1 = point[simplices[:, 0]]
+    p2 = point[simplices[:, 1]]
+    p3 = point[simplices[:, 2]]
+
+    cell_center = (p1 + p2 + p3) / 3.0
+    edge_center = 0.5 * (point[line_point[:, 0]] + point[line_point[:, 1]])
+
+    a = p2 - p1
+    b = p3 - p2
+    cross = np.vstack([a[:, 1] * b[:, 2] - a[:, 2] * b[:, 1],
+                       a[:, 2] * b[:, 0] - a[:, 0] * b[:, 2],
+                       a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]]).T
+    volume = 0.5 * np.sqrt(dot3(cross, cross))
+
+    diff = point[line_point[:, 1]] - point[line_point[:, 0]]
+    area = np.sqrt(dot3(diff, diff))
+    average_width = (area[tri_edge[:, 0]] + area[tri_edge[:, 1]] + area[tri_edge[:, 2]]) / 3.0
+
+    width = edge_center[tri_edge] - cell_center[:, np.newaxis, :]
+
+    # 法線は辺の端点の順に(dy, -dx)を取り，辺の表側セルの中心から辺中心へ向かうベクトルと逆向きに揃える
+    normal = np.zeros_like(edge_center)
+    normal[:, 0] = point[line_point[:, 1], 1] - point[line_point[:, 0], 1]
+    normal[:, 1] = -point[line_point[:, 1], 0] + point[line_point[:, 0], 0]
+    normal = (1.0 / np.sqrt(dot3(normal, normal)))[:, np.newaxis] * normal
+    adjacent_width = width[grid["line_cell"][:, 0], grid["line_cell"][:, 1]]
+    normal = np.where((dot3(normal, adjacent_width) >= 0)[:, np.newaxis], -normal, normal)
+
+    inscribed_circle = 2.0 / 3.0 * volume / average_width
+
+    # 仮想セル中心は隣接セル中心と辺中心について点対称な位置に置く
+    vc_edge = grid["vc_edge"]
+    vc_cell = grid["vc_cell"]
+    vc_width = width[vc_cell[:, 0], vc_cell[:, 1]]
+    outer = dot3(edge_center[vc_edge] - cell_center[vc_cell[:, 0]], normal[vc_edge]) < 0.0
+    vc_center = np.where(outer[:, np.newaxis], edge_center[vc_edge] + vc_width, edge_center[vc_edge] - vc_width)
+
+    grid.update({"cell_center": np.concatenate([cell_center, vc_center]), "edge_center": edge_center,
+                 "volume": volume, "area": area, "average_width": average_width, "width": width,
+                 "normal": normal, "inscribed_circle": inscribed_circle})
+    return grid
+
+
+# 仮想セルの属性付け(UMarkingVirtualCellのDistanceBasis)
+# 格子中心から最小半径より外側の仮想セルを外周(VC%Type=1)，それ以外を物体表面(VC%Type=2)とする
+def mark_virtual_cell(grid, boundary):
+    vc_center = grid["cell_center"][grid["volume"].shape[0]:]
+    relative = vc_center - boundary["center"]
+    outline = np.sqrt(dot3(relative, relative)) > boundary["min_radius"]
+    cell_type = np.where(outline, boundary["outer_boundary"], UNDEFINED_BOUNDARY)
+
+    if boundary["use_object"] == 1:
+        relative = vc_center - boundary["object_center"]
+        cell_type = np.where(np.sqrt(dot3(relative, relative)) < boundary["object_radius"], boundary["inner_boundary"], cell_type)
+    elif np.max(cell_type, initial=0) >= UNDEFINED_BOUNDARY:
+        print("undefined virtual cells remain. process will terminated.")
+        exit()
+
+    grid["vc_type"] = np.where(outline, 1, 2)
+    grid["vc_boundary"] = cell_type
+    grid["outline_cells"] = np.count_nonzero(outline)
+    return grid
+
+
+# 物体表面の点列(UMakeInternalObject)
+# 最もyが小さい点から見た角度の降順に並べる(Fortran版の添字と点番号の取り違えも含めて再現している)
+def make_internal_object(point, grid):
+    wall_edge = grid["vc_edge"][grid["vc_type"] == 2]
+    surface_point = np.sort(grid["line_point"][wall_edge].ravel())[1::2]
+
+    y = point[surface_point, 1]
+    check_min = surface_point[np.argmin(y)]
+    relative = point[surface_point] - point[check_min]
+    angle = np.arctan2(relative[:, 1], relative[:, 0])
+    angle[np.arange(surface_point.shape[0]) == check_min] = 0.0
+    return surface_point[np.argsort(-angle, kind="stable")]
+
+
+# 各辺から最も近い物体表面の辺と，辺中心間の距離(UGetDistanceFromSurface_Edge)
+# 戻り値の壁番号は物体表面の辺の通し番号(仮想セルの並び順)
+def get_distance_from_surface(grid):
+    edge_center = grid["edge_center"]
+    wall_edge = grid["vc_edge"][grid["vc_type"] == 2]
+    wall_center = edge_center[wall_edge]
+
+    # kd-treeで最近傍距離を求め，その距離以内の壁を候補として厳密な距離で比較する(等距離なら番号の小さい壁)
+    nearest, _ = cKDTree(wall_center).query(edge_center)
+    candidate = cKDTree(wall_center).query_ball_point(edge_center, r=nearest * (1.0 + 1.0e-12) + 1.0e-300)
+    count = np.array([len(wall_list) for wall_list in candidate], dtype=int)
+    owner = np.repeat(np.arange(edge_center.shape[0]), count)
+    wall = np.concatenate([np.array(wall_list, dtype=int) for wall_list in candidate])
+    relative = wall_center[wall] - edge_center[owner]
+    distance = np.sqrt(dot3(relative, relative))
+    order = np.lexsort((wall, distance, owner))
+    first = np.unique(owner[order], return_index=True)[1]
+    belongs = wall[order[first]]
+    distance = distance[order[first]]
+
+    # 壁ごとの所属辺は距離の近い順(同じ距離なら辺番号順)
+    member = np.lexsort((np.arange(edge_center.shape[0]), distance, belongs))
+    member_count = np.bincount(belongs, minlength=wall_edge.shape[0])
+    return belongs, distance, wall_edge, member, member_count
+
+
+# 点座標と三角形の点番号(0始まり)から*.mayuに書き出す格子データ一式を作る
+def make_mayu_grid(points, simplices, boundary=None):
+    if boundary == None:
+        boundary = default_boundary_data()
+    points = np.asarray(points, dtype=float)
+    if points.shape[1] == 2:
+        points = np.hstack([points, np.zeros((points.shape[0], 1))])
+    simplices = np.asarray(simplices, dtype=int)
+
+    grid = make_edge_number(simplices)
+    grid = calc_geometry(points, simplices, grid)
+    grid = mark_virtual_cell(grid, boundary)
+    grid["points"] = points
+    grid["simplices"] = simplices
+
+    wall = grid["vc_edge"].shape[0] - grid["outline_cells"]
+    if wall != 0:
+        grid["internal_object"] = make_internal_object(points, grid)
+        grid["belongs2wall"], grid["distance"], grid["wall_edge"], grid["wall_member"], grid["wall_member_count"] = get_distance_from_surface(grid)
+    else:
+        grid["internal_object"] = np.zeros(0, dtype=int)
+    return grid
+
+
+# 以下，gfortranのwrite文と同じ文字列を作る
+# 並び指示出力(write(1,*))の文字列と整数
+def list_label(label, value):
+    return " " + label + "%12d" % value + "\n"
+
+
+# 並び指示出力(write(1,*))の倍精度実数
+def list_real(value):
+    mantissa, exponent = ("%.16E" % value).split("E")
+    exponent = int(exponent)
+    if value != 0.0 and not (-1 <= exponent < 17):
+        return " " + ("%sE%+04d" % (mantissa, exponent)).rjust(25) + "\n"
+    sign = "-" if mantissa.startswith("-") else ""
+    digits = mantissa.replace("-", "").replace(".", "")
+    if exponent == -1:
+        text = sign + "0." + digits
+    else:
+        text = sign + digits[:exponent + 1] + "." + digits[exponent + 1:]
+    return " " + text.rjust(20) + " " * 5 + "\n"
+
+
+# 書式付き出力"(n(1x,i7))"(桁あふれは*で埋める)
+def format_int(values, per_line):
+    values = np.asarray(values, dtype=np.int64).ravel()
+    fit = (values < 10 ** 7) & (values > -10 ** 6)
+    return format_fields(values, " %7d", per_line, fit, " " + "*" * 7)
+
+
+# 書式付き出力"(n(mx,fw.d))"(桁あふれは*で埋める)
+def format_real(values, per_line, space, width, decimal):
+    values = np.asarray(values, dtype=float).ravel()
+    fit = (values < 10.0 ** (width - decimal - 1)) & (values > -10.0 ** (width - decimal - 2))
+    return format_fields(values, " " * space + "%" + str(width) + "." + str(decimal) + "f", per_line, fit, " " * space + "*" * width)
+
+
+# 1行にper_line個ずつ並べる(Fortranの書式の繰り返しと同じ改行位置)
+# 桁あふれが無ければ全要素を1回の書式変換で文字列化する
+def format_fields(values, field, per_line, fit, overflow):
+    size = values.shape[0]
+    if size == 0:
+        return ""
+    rest = size % per_line
+    if np.all(fit):
+        line_format = (field * per_line + "\n") * (size // per_line) + (field * rest + "\n" if rest != 0 else "")
+        return line_format % tuple(values.tolist())
+    text = [field % value if ok else overflow for value, ok in zip(values.tolist(), fit.tolist())]
+    lines = ["".join(text[i:i + per_line]) for i in range(0, size, per_line)]
+    return "\n".join(lines) + "\n"
+
+
+# *.mayuの書き出し(UOutputUnStrGrid)
+def write_mayu(fname, grid):
+    points = grid["points"]
+    real_cells = grid["simplices"].shape[0]
+    edges = grid["line_point"].shape[0]
+    vc_total = grid["vc_edge"].shape[0]
+    io_total = grid["internal_object"].shape[0]
+
+    text = [list_label("TotalPoint", points.shape[0]),
+            list_label("TotalEdge", edges),
+            list_label("TotalRealCell", real_cells),
+            list_label("TotalVirtualCell", vc_total),
+            list_label("TotalOutlineCell", grid["outline_cells"]),
+            list_label("TotalTriangle", real_cells),
+            list_label("TotalSquare", 0),
+            list_label("TotalLine", edges),
+            list_label("TotalConvexHullPoint", 0),
+            list_label("InternalObjectPoint", io_total),
+            list_label("TriPoint ", real_cells * 3), format_int(grid["simplices"] + 1, 3),
+            list_label("TriEdge ", real_cells * 3), format_int(grid["tri_edge"] + 1, 3),
+            list_label("TriCell ", real_cells * 3), format_int(grid["tri_cell"] + 1, 3),
+            list_label("LinePoint ", edges * 2), format_int(grid["line_point"] + 1, 2),
+            list_label("LineCell ", edges * 4), format_int(grid["line_cell"] + 1, 4),
+            list_label("VCCell ", vc_total * 2), format_int(grid["vc_cell"] + 1, 2),
+            list_label("VCEdge ", vc_total), format_int(grid["vc_edge"] + 1, 1),
+            list_label("PointC ", points.shape[0] * 3), format_real(points, 3, 1, 22, 17),
+            list_label("EdgeC ", edges * 3), format_real(grid["edge_center"], 3, 1, 22, 17),
+            list_label("CellC ", (real_cells + vc_total) * 3), format_real(grid["cell_center"], 3, 1, 22, 17),
+            list_label("EdgeS ", edges), format_real(grid["area"], 1, 2, 22, 14),
+            list_label("CellV ", real_cells), format_real(grid["volume"], 1, 2, 22, 14),
+            list_label("EdgeNormal ", edges * 3), format_real(grid["normal"], 3, 1, 22, 17),
+            list_label("Width ", real_cells), format_real(grid["width"], 3, 1, 22, 17),
+            list_label("BoudnaryCondition_of_VirtualCell ", vc_total), format_int(grid["vc_boundary"], 1),
+            list_label("InscribedCircleRadius ", real_cells), "".join(map(list_real, grid["inscribed_circle"].tolist())),
+            list_label("InternalObject ", io_total), format_int(grid["internal_object"] + 1, 1),
+            list_label("AverageWid ", real_cells), format_real(grid["average_width"], 1, 2, 22, 14)]
+
+    if vc_total != grid["outline_cells"]:
+        wall_total = grid["wall_edge"].shape[0]
+        text += [list_label("NearestSurfaceBoundaryEdgeNum4Edge ", edges), format_int(grid["belongs2wall"] + 1, 1),
+                 list_label("DistanceFromObjectSurface4Edge ", edges), format_real(grid["distance"], 1, 2, 22, 14),
+                 " \n",
+                 list_label("Wall2Edge_data ", wall_total)]
+        offset = np.append(0, np.cumsum(grid["wall_member_count"]))
+        for i in range(wall_total):
+            text.append("%12d%12d\n" % (grid["wall_edge"][i] + 1, grid["wall_member_count"][i]))
+            text.append(format_int(grid["wall_member"][offset[i]:offset[i + 1]] + 1, 1))
+
+    with open(fname, "w") as f:
+        f.write("".join(text))
+
+
+# 三角形格子を*.mayuとして出力する(Preprocessing4UnstructuredGridを通さずにソルバーへ渡せる)
+def tri2mayu(fname, points, simplices, boundary=None):
+    write_mayu(fname, make_mayu_grid(points, simplices, boundary))
+
+
+# legacy ASCII形式のvtk(三角形要素のみ)を読み込む
+def read_vtk_tri(fname):
+    with open(fname, "r") as f:
+        token = f.read().split()
+    i = token.index("POINTS")
+    point_number = int(token[i + 1])
+    points = np.array(token[i + 3:i + 3 + 3 * point_number], dtype=float).reshape(-1, 3)
+    i = token.index("CELLS")
+    cell_number = int(token[i + 1])
+    cells = np.array(token[i + 3:i + 3 + int(token[i + 2])], dtype=int)
+    i = token.index("CELL_TYPES")
+    cell_types = np.array(token[i + 2:i + 2 + cell_number], dtype=int)
+    cells = cells.reshape(cell_number, -1)[cell_types == 5, 1:]
+    return points, cells
+
+
+def main():
+    print("Please input the name of VTK file that defined region.(***.vtk's ***)")
+    fname = input()
+    points, simplices = read_vtk_tri(fname + ".vtk")
+    tri2mayu(fname + ".mayu", points, simplices, read_boundary_data("BoundaryData.DistanceBasis"))
+    print("Optimized Grid Data Generated!")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# coding: utf-8
+# 三角形格子の品質(面積，アスペクト比，最小・最大内角，歪み度，裏返ったセル)を全セル一括で計算する
+# ソルバーに渡す前に格子の合否を判定するために使う
+import numpy as np
+
+# 合否判定の既定値(物体近傍の境界層格子は細長いのでアスペクト比の上限は大きめにとる)
+DEFAULT_CRITERIA = {"min_angle": 1.0,  # 最小内角の下限[deg]
+                    "max_angle": 178.0,  # 最大内角の上限[deg]
+                    "max_aspect_ratio": 1.0e3,  # 最長辺/最短辺の上限
+                    "max_skewness": 0.98,  # 歪み度の上限
+                    "max_inverted": 0}  # 裏返ったセル数の上限
+
+
+# points:(点数, 2)の座標，simplices:(セル数, 3)の頂点番号
+# orientationは正常なセルの向き(1:反時計回り，-1:時計回り，None:セル数の多い方を正常とみなす)
+def cell_quality(points, simplices, orientation=None):
+    p0 = points[simplices[:, 0]]
+    p1 = points[simplices[:, 1]]
+    p2 = points[simplices[:, 2]]
+    # 頂点iの対辺をedge[:, i]とする
+    edge = np.stack([p2 - p1, p0 - p2, p1 - p0], axis=1)
+    length = np.linalg.norm(edge, axis=2)
+    area = 0.5 * (edge[:, 2, 0] * (-edge[:, 1, 1]) - edge[:, 2, 1] * (-edge[:, 1, 0]))
+
+    # 頂点iの内角は頂点iに接する2辺(対辺以外)のなす角
+    a = -np.roll(edge, -1, axis=1)
+    b = np.roll(edge, 1, axis=1)
+    cos_angle = np.sum(a * b, axis=2) / (np.roll(length, -1, axis=1) * np.roll(length, 1, axis=1))
+    angle = np.degrees(np.arccos(np.clip(cos_angle, -1.0, 1.0)))
+    min_angle = np.min(angle, axis=1)
+    max_angle = np.max(angle, axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        aspect_ratio = np.max(length, axis=1) / np.min(length, axis=1)
+    # 正三角形からのずれ(equiangle skewness，0:正三角形，1:つぶれた三角形)
+    skewness = np.maximum((max_angle - 60.0) / 120.0, (60.0 - min_angle) / 60.0)
+
+    if orientation == None:
+        orientation = 1 if np.sum(area > 0) >= np.sum(area < 0) else -1
+    inverted = orientation * area <= 0.0
+
+    return {"area": np.abs(area), "signed_area": area, "aspect_ratio": aspect_ratio, "min_angle": min_angle,
+            "max_angle": max_angle, "skewness": skewness, "inverted": inverted}
+
+
+# 各品質指標の最小・最大・平均と，判定基準に引っかかったセル数をまとめる
+def quality_summary(quality, criteria=None):
+    if criteria == None:
+        criteria = DEFAULT_CRITERIA
+    summary = {"cells": int(quality["area"].shape[0]), "inverted": int(np.sum(quality["inverted"]))}
+    for name in ["area", "aspect_ratio", "min_angle", "max_angle", "skewness"]:
+        value = quality[name]
+        summary[name] = {"min": float(np.min(value)), "max": float(np.max(value)), "mean": float(np.mean(value))}
+    summary["bad_min_angle"] = int(np.sum(quality["min_angle"] < criteria["min_angle"]))
+    summary["bad_max_angle"] = int(np.sum(quality["max_angle"] > criteria["max_angle"]))
+    summary["bad_aspect_ratio"] = int(np.sum(~(quality["aspect_ratio"] <= criteria["max_aspect_ratio"])))
+    summary["bad_skewness"] = int(np.sum(quality["skewness"] > criteria["max_skewness"]))
+    return summary
+
+
+# 格子の合否を判定し，(合否，品質のまとめ，不合格の理由のリスト)を返す
+def check_mesh(points, simplices, criteria=None, orientation=None):
+    if criteria == None:
+        criteria = DEFAULT_CRITERIA
+    if simplices.shape[0] == 0:
+        return False, {"cells": 0}, ["no cell"]
+    summary = quality_summary(cell_quality(points, simplices, orientation), criteria)
+    reason = []
+    if summary["inverted"] > criteria["max_inverted"]:
+        reason.append(str(summary["inverted"]) + " inverted cells")
+    if summary["bad_min_angle"] > 0:
+        reason.append(str(summary["bad_min_angle"]) + " cells with angle < " + str(criteria["min_angle"]) + " deg")
+    if summary["bad_max_angle"] > 0:
+        reason.append(str(summary["bad_max_angle"]) + " cells with angle > " + str(criteria["max_angle"]) + " deg")
+    if summary["bad_aspect_ratio"] > 0:
+        reason.append(str(summary["bad_aspect_ratio"]) + " cells with aspect ratio > " + str(criteria["max_aspect_ratio"]))
+    if summary["bad_skewness"] > 0:
+        reason.append(str(summary["bad_skewness"]) + " cells with skewness > " + str(criteria["max_skewness"]))
+    return len(reason) == 0, summary, reason
+
+
+# quality_summaryの結果を1行の文字列にする
+def format_summary(summary):
+    if summary["cells"] == 0:
+        return "cells: 0"
+    return ("cells: " + str(summary["cells"]) + ", inverted: " + str(summary["inverted"]) +
+            ", angle: " + "{:.2f}".format(summary["min_angle"]["min"]) + "-" + "{:.2f}".format(summary["max_angle"]["max"]) + " deg" +
+            ", max aspect ratio: " + "{:.3g}".format(summary["aspect_ratio"]["max"]) +
+            ", max skewness: " + "{:.3f}".format(summary["skewness"]["max"]))
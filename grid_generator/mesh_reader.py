@@ -0,0 +1,226 @@
+# coding: utf-8
+# legacy VTK(UNSTRUCTURED_GRID)の座標・セル構造・セル形状を読み込む(mesh_writer.write_vtkの逆)
+# ASCIIはPOINTS/CELLS/CELL_TYPESの各セクションの範囲を探し，セクションごとに1回の変換で配列にする(1行ずつsplitしない)
+# BINARY(big endian)はセクションの先頭から必要なバイト数だけnp.frombufferで読む
+import re
+import numpy as np
+
+# legacy VTKのデータ型名→big endianのdtype
+VTK_DTYPE = {"bit": ">u1", "unsigned_char": ">u1", "char": ">i1", "unsigned_short": ">u2", "short": ">i2",
+             "unsigned_int": ">u4", "int": ">i4", "unsigned_long": ">u8", "long": ">i8",
+             "float": ">f4", "double": ">f8", "vtkIdType": ">i4"}
+
+# 格子の読み込みで区切りとするキーワード(行頭にあるもの)
+SECTION = re.compile(rb"^[ \t]*(POINTS|CELLS|CELL_TYPES|POINT_DATA|CELL_DATA|FIELD|SCALARS|VECTORS|LOOKUP_TABLE)\b[^\n]*", re.M)
+
+
+# CELLSの数値列(各セルの頂点数，頂点番号...の並び)をセル構造にする
+# 全セルの頂点数が同じなら(セル数, 頂点数)の配列，違うときは各セルの頂点番号の配列のリスト
+def split_cells(data, c_num):
+    if data.shape[0] % c_num == 0:
+        width = data.shape[0] // c_num
+        cell = data.reshape(c_num, width)
+        if np.all(cell[:, 0] == width - 1):
+            return cell[:, 1:]
+    cells = []
+    pos = 0
+    for i in range(c_num):
+        cells.append(data[pos + 1:pos + 1 + data[pos]])
+        pos += 1 + data[pos]
+    return cells
+
+
+def read_ascii_sections(data):
+    match = list(SECTION.finditer(data))
+    section = {}
+    for i, m in enumerate(match):
+        key = m.group(1).decode("ascii")
+        if key in section or key not in ("POINTS", "CELLS", "CELL_TYPES"):
+            continue
+        stop = match[i + 1].start() if i + 1 < len(match) else len(data)
+        body = data[m.end():stop].decode("ascii")
+        word = m.group(0).split()
+        dtype = float if key == "POINTS" else np.int64
+        section[key] = (word, np.fromstring(body, dtype=dtype, sep=" "), m.start())
+    return section
+
+
+def read_binary_sections(data):
+    section = {}
+    pos = data.find(b"\n", data.find(b"DATASET")) + 1
+    while pos < len(data) and len(section) < 3:
+        stop = data.find(b"\n", pos)
+        stop = len(data) if stop < 0 else stop
+        word = data[pos:stop].split()
+        pos = stop + 1
+        if len(word) == 0:
+            continue
+        key = word[0].decode("ascii")
+        if key == "POINTS":
+            count = 3 * int(word[1])
+            dtype = np.dtype(VTK_DTYPE[word[2].decode("ascii")])
+        elif key in ("CELLS", "CELL_TYPES"):
+            count = int(word[2]) if key == "CELLS" else int(word[1])
+            dtype = np.dtype(">i4")
+        else:
+            break
+        section[key] = ([w.decode("ascii") for w in word], np.frombuffer(data, dtype=dtype, count=count, offset=pos), stop)
+        pos += count * dtype.itemsize
+    return section
+
+
+# fnameを読み込み，(座標(点数, 3)，セル構造，セル形状，POINTSより前のヘッダー文字列)を返す
+def read_vtk(fname):
+    with open(fname, "rb") as f:
+        data = f.read()
+    head = data[:data.find(b"DATASET")].split(b"\n")
+    if len(head) < 3:
+        print("vtk header error")
+        exit()
+    if head[2].strip().upper() == b"BINARY":
+        section = read_binary_sections(data)
+    else:
+        section = read_ascii_sections(data)
+    if "POINTS" not in section or "CELLS" not in section:
+        print("vtk section error")
+        exit()
+
+    word, points, start = section["POINTS"]
+    header = data[:data.rfind(b"POINTS", 0, start + len(b"POINTS"))].decode("ascii", errors="replace")
+    p_num = int(word[1])
+    points = points.astype(float).reshape(p_num, 3)
+    word, cells, start = section["CELLS"]
+    cells = split_cells(cells.astype(np.int64), int(word[1]))
+    if "CELL_TYPES" in section:
+        cell_types = section["CELL_TYPES"][1].astype(np.int64)
+    else:
+        cell_types = None
+    return points, cells, cell_types, header
+
+
+# ファイル全体を読み込まずに，各セクションの見出し行の位置とデータの範囲を先頭から順に求める
+# 戻り値は{"key":キーワード, "word":見出し行の単語, "line":見出し行の先頭, "start":データの先頭, "stop":データの末尾}のリスト
+# SCALARS/VECTORSには，直前のPOINT_DATA/CELL_DATAから"location"("POINT_DATA"か"CELL_DATA")と"count"(点数かセル数)を付ける
+# SCALARSのデータの先頭はLOOKUP_TABLE行の次の行とする
+def scan_sections(fname, chunk=1 << 24):
+    with open(fname, "rb") as f:
+        head = f.read(1024).split(b"\n")
+        f.seek(0)
+        if len(head) > 2 and head[2].strip().upper() == b"BINARY":
+            return scan_binary_sections(f)
+        return scan_ascii_sections(f, chunk)
+
+
+# ASCIIはchunkバイトずつ読み，行の途中で切れた分は次に回してキーワードを探す
+def scan_ascii_sections(f, chunk):
+    section = []
+    base = 0
+    carry = b""
+    while True:
+        data = f.read(chunk)
+        buf = carry + data
+        cut = len(buf) if len(data) == 0 else buf.rfind(b"\n") + 1
+        for m in SECTION.finditer(buf[:cut]):
+            section.append({"key": m.group(1).decode("ascii"), "word": m.group(0).decode("ascii").split(),
+                            "line": base + m.start(), "start": base + m.end() + 1})
+        base += cut
+        carry = buf[cut:]
+        if len(data) == 0:
+            break
+    for i in range(len(section)):
+        section[i]["stop"] = section[i + 1]["line"] if i + 1 < len(section) else base
+
+    merged = []
+    for sec in section:
+        if sec["key"] == "LOOKUP_TABLE" and len(merged) > 0 and merged[-1]["key"] == "SCALARS":
+            merged[-1]["start"] = sec["start"]
+            merged[-1]["stop"] = sec["stop"]
+        else:
+            merged.append(sec)
+    return attach_location(merged)
+
+
+def attach_location(section):
+    location = None
+    count = 0
+    for sec in section:
+        if sec["key"] in ("POINT_DATA", "CELL_DATA"):
+            location = sec["key"]
+            count = int(sec["word"][1])
+        elif sec["key"] in ("SCALARS", "VECTORS"):
+            sec["location"] = location
+            sec["count"] = count
+    return section
+
+
+# BINARYは見出し行だけを読み，データはバイト数を計算して読み飛ばす
+def scan_binary_sections(f):
+    section = []
+    count = 0
+    f.readline()
+    f.readline()
+    f.readline()
+    while True:
+        line = f.tell()
+        word = f.readline()
+        if len(word) == 0:
+            break
+        word = word.decode("ascii").split()
+        if len(word) == 0 or word[0] == "DATASET":
+            continue
+        key = word[0]
+        if key == "POINTS":
+            nbytes = 3 * int(word[1]) * np.dtype(VTK_DTYPE[word[2]]).itemsize
+        elif key == "CELLS":
+            nbytes = 4 * int(word[2])
+        elif key == "CELL_TYPES":
+            nbytes = 4 * int(word[1])
+        elif key in ("POINT_DATA", "CELL_DATA"):
+            count = int(word[1])
+            nbytes = 0
+        elif key == "SCALARS":
+            f.readline()    # LOOKUP_TABLE
+            n_component = int(word[3]) if len(word) > 3 else 1
+            nbytes = count * n_component * np.dtype(VTK_DTYPE[word[2]]).itemsize
+        elif key == "VECTORS":
+            nbytes = 3 * count * np.dtype(VTK_DTYPE[word[2]]).itemsize
+        else:
+            break
+        section.append({"key": key, "word": word, "line": line, "start": f.tell(), "stop": f.tell() + nbytes})
+        f.seek(nbytes, 1)
+    return attach_location(section)
+
+
+# セクションのデータを(rows, width)ずつの配列として順に返す(ファイル全体をメモリに載せない)
+# countは全体の行数(POINTSなら点数，CELLSならセル数)
+def iter_section_blocks(fname, section, count, width, dtype, rows=1 << 20, binary=False, chunk=1 << 24):
+    if binary:
+        array = np.memmap(fname, dtype=dtype, mode="r", offset=section["start"], shape=(count, width))
+        for start in range(0, count, rows):
+            yield np.array(array[start:start + rows])
+        del array
+        return
+
+    with open(fname, "rb") as f:
+        f.seek(section["start"])
+        remain = section["stop"] - section["start"]
+        carry = b""
+        value = np.zeros(0, dtype=np.dtype(dtype).newbyteorder("="))
+        done = 0
+        while done < count:
+            data = f.read(min(chunk, remain))
+            remain -= len(data)
+            buf = carry + data
+            # 数値の途中で切らないように最後の空白までを変換する
+            cut = len(buf) if remain <= 0 else max(buf.rfind(b"\n"), buf.rfind(b" ")) + 1
+            carry = buf[cut:]
+            value = np.concatenate([value, np.fromstring(buf[:cut].decode("ascii"), dtype=value.dtype, sep=" ")])
+            n_row = min(value.shape[0] // width, count - done)
+            if remain <= 0 and value.shape[0] < width * (count - done):
+                print("vtk section is shorter than " + str(count) + " rows")
+                exit()
+            for start in range(0, n_row, rows):
+                stop = min(start + rows, n_row)
+                yield value[start * width:stop * width].reshape(-1, width)
+            value = value[n_row * width:]
+            done += n_row
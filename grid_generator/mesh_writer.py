@@ -0,0 +1,153 @@
+# coding: utf-8
+import numpy as np
+
+# VTKのセル形状番号
+VTK_TRIANGLE = 5
+VTK_QUAD = 9
+
+
+# 2次元座標はz=0.0を付け足して(n, 3)にそろえる
+def to_point3d(points):
+    points = np.asarray(points, dtype=float)
+    if points.shape[1] == 3:
+        return points
+    return np.hstack([points, np.zeros((points.shape[0], 1))])
+
+
+# 座標・セル構造・セル形状をまとめてVTK形式で書き出す
+# format = "ascii":legacy ASCII(ソルバーの読み込み形式), "binary":legacy binary, "vtu":XML VTU(appended raw)
+def write_vtk(fname, points, cells, cell_type=VTK_TRIANGLE, format="ascii", title="Unstructured Grid tri example"):
+    points = to_point3d(points)
+    cells = np.asarray(cells, dtype=np.int64)
+    if format == "ascii":
+        write_legacy_ascii(fname, points, cells, cell_type, title)
+    elif format == "binary":
+        write_legacy_binary(fname, points, cells, cell_type, title)
+    elif format == "vtu":
+        write_vtu(fname, points, cells, cell_type)
+    else:
+        print("format error")
+        exit()
+
+
+def legacy_header(title, format):
+    return "# vtk DataFile Version 3.0\n" + title + "\n" + format + "\nDATASET UNSTRUCTURED_GRID\n"
+
+
+def write_legacy_ascii(fname, points, cells, cell_type, title):
+    point_number = points.shape[0]
+    cell_number = cells.shape[0]
+    vertex_number = cells.shape[1]
+    # 1行ずつ文字列を作らず，全要素を1回の書式変換で文字列化する(%rは最短の往復可能表現)
+    cell_format = str(vertex_number) + " %d" * vertex_number + "\n"
+    with open(fname, "w") as f:
+        f.write(legacy_header(title, "ASCII"))
+        f.write("POINTS " + str(point_number) + " double\n")
+        f.write(("%r %r %r\n" * point_number) % tuple(points.ravel().tolist()))
+        f.write("CELLS " + str(cell_number) + " " + str((vertex_number + 1) * cell_number) + "\n")
+        f.write((cell_format * cell_number) % tuple(cells.ravel().tolist()))
+        f.write("CELL_TYPES " + str(cell_number) + "\n")
+        f.write((str(cell_type) + "\n") * cell_number)
+
+
+# legacy binaryはbig endian
+def write_legacy_binary(fname, points, cells, cell_type, title):
+    point_number = points.shape[0]
+    cell_number = cells.shape[0]
+    vertex_number = cells.shape[1]
+    cell_strct = np.hstack([np.full((cell_number, 1), vertex_number), cells]).astype(">i4")
+    with open(fname, "wb") as f:
+        f.write(legacy_header(title, "BINARY").encode("ascii"))
+        f.write(("POINTS " + str(point_number) + " double\n").encode("ascii"))
+        f.write(points.astype(">f8").tobytes())
+        f.write(("\nCELLS " + str(cell_number) + " " + str(cell_strct.size) + "\n").encode("ascii"))
+        f.write(cell_strct.tobytes())
+        f.write(("\nCELL_TYPES " + str(cell_number) + "\n").encode("ascii"))
+        f.write(np.full(cell_number, cell_type, dtype=">i4").tobytes())
+        f.write(b"\n")
+
+
+# XML VTU形式(配列本体はAppendedDataにraw bytesで格納，各配列の先頭にUInt64のバイト数を付ける)
+def write_vtu(fname, points, cells, cell_type):
+    point_number = points.shape[0]
+    cell_number = cells.shape[0]
+    vertex_number = cells.shape[1]
+    arrays = [points.astype("<f8"),
+              cells.astype("<i8"),
+              (vertex_number * np.arange(1, cell_number + 1)).astype("<i8"),
+              np.full(cell_number, cell_type, dtype=np.uint8)]
+
+    offset = np.cumsum([0] + [8 + array.nbytes for array in arrays])
+    with open(fname, "wb") as f:
+        f.write(('<?xml version="1.0"?>\n'
+                 '<VTKFile type="UnstructuredGrid" version="1.0" byte_order="LittleEndian" header_type="UInt64">\n'
+                 '  <UnstructuredGrid>\n'
+                 '    <Piece NumberOfPoints="' + str(point_number) + '" NumberOfCells="' + str(cell_number) + '">\n'
+                 '      <Points>\n'
+                 '        <DataArray type="Float64" NumberOfComponents="3" format="appended" offset="' + str(offset[0]) + '"/>\n'
+                 '      </Points>\n'
+                 '      <Cells>\n'
+                 '        <DataArray type="Int64" Name="connectivity" format="appended" offset="' + str(offset[1]) + '"/>\n'
+                 '        <DataArray type="Int64" Name="offsets" format="appended" offset="' + str(offset[2]) + '"/>\n'
+                 '        <DataArray type="UInt8" Name="types" format="appended" offset="' + str(offset[3]) + '"/>\n'
+                 '      </Cells>\n'
+                 '    </Piece>\n'
+                 '  </UnstructuredGrid>\n'
+                 '  <AppendedData encoding="raw">\n'
+                 '   _').encode("ascii"))
+        for array in arrays:
+            f.write(np.array([array.nbytes], dtype="<u8").tobytes())
+            f.write(array.tobytes())
+        f.write(b'\n  </AppendedData>\n</VTKFile>\n')
+
+
+# legacy VTKをセクションごと・ブロックごとに書き出す(全点・全セルをメモリに載せずに書くとき用)
+# begin_points → write_points(何回でも) → begin_cells → write_cells → write_cell_types の順に呼ぶ
+class legacy_vtk_stream(object):
+    def __init__(self, fname, title="Unstructured Grid tri example", format="ascii"):
+        if format != "ascii" and format != "binary":
+            print("format error")
+            exit()
+        self.binary = format == "binary"
+        self.f = open(fname, "wb")
+        self.f.write(legacy_header(title, "BINARY" if self.binary else "ASCII").encode("ascii"))
+
+    def begin_points(self, point_number):
+        self.f.write(("POINTS " + str(point_number) + " double\n").encode("ascii"))
+
+    def write_points(self, points):
+        points = to_point3d(points)
+        if self.binary:
+            self.f.write(points.astype(">f8").tobytes())
+        else:
+            self.f.write((("%r %r %r\n" * points.shape[0]) % tuple(points.ravel().tolist())).encode("ascii"))
+
+    # binaryのときはデータの直後に改行を入れてから次の見出しを書く
+    def begin_cells(self, cell_number, vertex_number):
+        self.cell_number = cell_number
+        self.f.write((("\n" if self.binary else "") + "CELLS " + str(cell_number) + " " +
+                      str((vertex_number + 1) * cell_number) + "\n").encode("ascii"))
+
+    def write_cells(self, cells):
+        cells = np.asarray(cells, dtype=np.int64)
+        cell_number = cells.shape[0]
+        vertex_number = cells.shape[1]
+        if self.binary:
+            self.f.write(np.hstack([np.full((cell_number, 1), vertex_number), cells]).astype(">i4").tobytes())
+        else:
+            cell_format = str(vertex_number) + " %d" * vertex_number + "\n"
+            self.f.write(((cell_format * cell_number) % tuple(cells.ravel().tolist())).encode("ascii"))
+
+    def write_cell_types(self, cell_type=VTK_TRIANGLE, block=1 << 20):
+        self.f.write((("\n" if self.binary else "") + "CELL_TYPES " + str(self.cell_number) + "\n").encode("ascii"))
+        for start in range(0, self.cell_number, block):
+            n = min(block, self.cell_number - start)
+            if self.binary:
+                self.f.write(np.full(n, cell_type, dtype=">i4").tobytes())
+            else:
+                self.f.write(((str(cell_type) + "\n") * n).encode("ascii"))
+        if self.binary:
+            self.f.write(b"\n")
+
+    def close(self):
+        self.f.close()
@@ -1,32 +1,64 @@
 # coding: utf-8
+import copy
 import numpy as np
 import matplotlib.pyplot as plt
+from curve_geometry import batch_interp
+
+
+# 翼弦方向の点の並び(0～1のnum点)
+# uniform:等間隔，cosine:前縁と後縁に集中，clustered:前縁にのみ集中
+def chord_distribution(num, spacing="uniform"):
+    t = np.linspace(start = 0, stop = 1, num = num)
+    if spacing == "uniform":
+        return t
+    elif spacing == "cosine":
+        return 0.5 * (1.0 - np.cos(np.pi * t))
+    elif spacing == "clustered":
+        return 1.0 - np.cos(0.5 * np.pi * t)
+    else:
+        print("spacing error")
+        exit()
+
 
 class Naca_4_digit(object):
-    def __init__(self, int_4, attack_angle_deg, resolution, quasi_equidistant=True, length_adjust=False, from5digit=False):
+    def __init__(self, int_4, attack_angle_deg, resolution, quasi_equidistant=True, length_adjust=False, from5digit=False,
+                 spacing="uniform"):
         if from5digit == False:
             self.m = float(int_4[0]) / 100  # maximum camber
             self.p = float(int_4[1]) / 10  # position of the maximum camber
             self.t = float(int_4[2:4]) / 100    # maximum thickness
-            self.load_setting(attack_angle_deg, resolution, quasi_equidistant, length_adjust)
-            self.__y_c()
-            self.__dyc_dx()
+            self.load_setting(attack_angle_deg, resolution, quasi_equidistant, length_adjust, spacing)
+            self.calc_camber()
         self.__y_t()
         self.theta = np.arctan(self.dyc_dx)
         self.get_surface()
         if quasi_equidistant == True:
             self.get_quasi_equidistant_line()
         
-    def load_setting(self, attack_angle_deg, resolution, quasi_equidistant=True, length_adjust=False):
+    # quasi_equidistantの場合も翼弦上の点はresolution点だけ(表面の式を直接評価するので細かく取り直す必要はない)
+    def load_setting(self, attack_angle_deg, resolution, quasi_equidistant=True, length_adjust=False, spacing="uniform"):
         self.use_quasi_equidistant = quasi_equidistant
         self.reshape = length_adjust
-        if quasi_equidistant == True:
-            self.resolution = 100 * resolution
-        else:
-            self.resolution = resolution
+        self.resolution = resolution
         self.new_resolution = resolution
+        self.spacing = spacing
         self.attack_angle = attack_angle_deg
-        self.x = np.linspace(start = 0, stop = 1, num = self.resolution)
+        self.x = chord_distribution(self.resolution, spacing)
+
+    def calc_camber(self):
+        self.__y_c()
+        self.__dyc_dx()
+
+    # 翼弦上の任意の位置xで表面を計算し直したコピーを返す(迎角とlength_adjustの縮尺は元の翼と同じ)
+    def evaluate(self, x):
+        naca = copy.copy(self)
+        naca.x = x
+        naca.resolution = x.shape[0]
+        naca.calc_camber()
+        naca.__y_t()
+        naca.theta = np.arctan(naca.dyc_dx)
+        naca.get_surface(rate = self.length_rate)
+        return naca
         
         
     def __y_c(self):
@@ -63,7 +95,8 @@ class Naca_4_digit(object):
             self.dyc_dx = 2.0 * m * (1.0 - x)
     
     
-    def get_surface(self):
+    # rateを省略するとlength_adjust時の縮尺を表面の点から求める
+    def get_surface(self, rate=None):
         # original NACA-4digit wings
         # upper
         vec_l = np.full((3, self.resolution), 1.0)
@@ -82,9 +115,10 @@ class Naca_4_digit(object):
         rot_u = rotMat.dot(vec_u)
 
         if self.reshape == True:
-            x_min = min(np.min(rot_l[0]), np.min(rot_u[0]))
-            x_max = max(np.max(rot_l[0]), np.max(rot_u[0]))
-            rate = 1.0 / (x_max - x_min)
+            if rate == None:
+                x_min = min(np.min(rot_l[0]), np.min(rot_u[0]))
+                x_max = max(np.max(rot_l[0]), np.max(rot_u[0]))
+                rate = 1.0 / (x_max - x_min)
 
             if rate != 1.0:
                 expMat = np.array([[rate, 0, 0], [0, rate, 0], [0, 0, 1]])
@@ -95,6 +129,7 @@ class Naca_4_digit(object):
         self.y_l = rot_l[1] + 0.5
         self.x_u = rot_u[0] + 0.5
         self.y_u = rot_u[1] + 0.5
+        self.length_rate = rate
 
     
     def plot(self):
@@ -109,19 +144,35 @@ class Naca_4_digit(object):
         x_min = min(np.min(self.x_u), np.min(self.x_l))
         x_max = max(np.max(self.x_u), np.max(self.x_l))
 
+        # 目標のx座標もspacingの並び(length_adjustのときは表面のxの範囲に合わせて伸縮)
         if self.reshape == False:
-            self.equidistant_x = np.linspace(start = 0, stop = 1, num = new_resolution)
+            self.equidistant_x = chord_distribution(new_resolution, self.spacing)
         else:
-            self.equidistant_x = np.linspace(start=x_min, stop=x_max, num=new_resolution)
-        self.equidistant_y_l = np.zeros(new_resolution)
-        self.equidistant_y_u = np.zeros(new_resolution)
-        for index in range(new_resolution):
-            if ((x_min <= self.equidistant_x[index]) and (x_max >= self.equidistant_x[index])):
-                self.equidistant_y_l[index] = self.y_l[np.argmin(np.abs(self.x_l - self.equidistant_x[index]))]
-                self.equidistant_y_u[index] = self.y_u[np.argmin(np.abs(self.x_u - self.equidistant_x[index]))]
-            else:
-                self.equidistant_y_l[index] = -1.0  # 外れ値
-                self.equidistant_y_u[index] = -1.0
+            self.equidistant_x = x_min + (x_max - x_min) * chord_distribution(new_resolution, self.spacing)
+        inside = (x_min <= self.equidistant_x) & (x_max >= self.equidistant_x)
+        self.equidistant_y_l = np.where(inside, self.__surface_y_at(self.equidistant_x, upper = False), -1.0)  # -1.0は外れ値
+        self.equidistant_y_u = np.where(inside, self.__surface_y_at(self.equidistant_x, upper = True), -1.0)
+
+    # 表面のx座標がtarget_xとなる翼弦上の位置をNewton法で求め，その位置の表面のy座標を返す
+    # 初期値は計算済みの表面の点をx座標で並べ替えて線形補間したもの
+    # 後縁の厚みで表面がtarget_xに届かない点は翼弦の端(0または1)で止める
+    def __surface_y_at(self, target_x, upper=True, iteration=20, eps=1.0e-14):
+        surface_x = lambda naca: naca.x_u if upper else naca.x_l
+        surface_y = lambda naca: naca.y_u if upper else naca.y_l
+        order = np.argsort(surface_x(self))
+        s = np.interp(target_x, surface_x(self)[order], self.x[order])
+        h = 1.0e-7
+        for i in range(iteration):
+            naca = self.evaluate(s)
+            residual = surface_x(naca) - target_x
+            s_h = np.where(s + h <= 1.0, s + h, s - h)
+            dx_ds = (surface_x(self.evaluate(s_h)) - surface_x(naca)) / (s_h - s)
+            new_s = s - np.where(dx_ds != 0.0, residual / np.where(dx_ds != 0.0, dx_ds, 1.0), 0.0)
+            stuck = ((s == 0.0) & (new_s < 0.0)) | ((s == 1.0) & (new_s > 1.0))
+            if not np.any((np.abs(residual) >= eps) & ~stuck):
+                break
+            s = np.clip(new_s, 0.0, 1.0)
+        return surface_y(self.evaluate(s))
 
 
     def plot_quasi_equidistant_shape(self):
@@ -134,17 +185,15 @@ class Naca_4_digit(object):
     def transform2complex(self):
         z_u_reverse = (self.x_u + 1j * self.y_u)[::-1]
         z_l = self.x_l + 1j * self.y_l
-        if self.use_quasi_equidistant == True:
-            return np.concatenate([z_u_reverse[::100], z_l[::100], z_u_reverse[0].reshape(-1)])
+        if z_u_reverse[self.resolution - 1] == z_l[0]:
+            return np.concatenate([z_u_reverse, z_l[1:], z_u_reverse[0].reshape(-1)])
         else:
-            if z_u_reverse[self.resolution - 1] == z_l[0]:
-                return np.concatenate([z_u_reverse, z_l[1:], z_u_reverse[0].reshape(-1)])
-            else:
-                return np.concatenate([z_u_reverse, z_l, z_u_reverse[0].reshape(-1)])
+            return np.concatenate([z_u_reverse, z_l, z_u_reverse[0].reshape(-1)])
 
 
 class Naca_5_digit(Naca_4_digit):
-    def __init__(self, int_5, attack_angle_deg, resolution, quasi_equidistant = True, length_adjust = False, from5digit = True):
+    def __init__(self, int_5, attack_angle_deg, resolution, quasi_equidistant = True, length_adjust = False, from5digit = True,
+                 spacing = "uniform"):
         self.cl = float(int_5[0])*(3.0/2.0) / 10  # designed lift_coefficient
         self.p = float(int_5[1]) / 2.0 / 100  # position of the maximum camber
         self.ref = int_5[2]             # enable / disable reflect
@@ -152,10 +201,13 @@ class Naca_5_digit(Naca_4_digit):
 
         self.camberline_plofile = int(int_5[0:3])
         self.camberline_plofile_table()
-        self.load_setting(attack_angle_deg, resolution, quasi_equidistant, length_adjust)
+        self.load_setting(attack_angle_deg, resolution, quasi_equidistant, length_adjust, spacing)
+        self.calc_camber()
+        super(Naca_5_digit, self).__init__(int_5, attack_angle_deg, resolution, quasi_equidistant = quasi_equidistant, length_adjust = length_adjust, from5digit = True, spacing = spacing)
+
+    def calc_camber(self):
         self.__y_c()
         self.__dyc_dx()
-        super(Naca_5_digit, self).__init__(int_5, attack_angle_deg, resolution, quasi_equidistant = quasi_equidistant, length_adjust = length_adjust, from5digit = True)
 
     def __y_c(self):
         x_lt_m_nr = lambda m, k1, x: k1 / 6.0 * (x ** 3 - 3.0 * m * x ** 2 + m ** 2 * (3.0 - m) * x)
@@ -193,41 +245,231 @@ class Naca_5_digit(Naca_4_digit):
 
 
     def camberline_plofile_table(self):
-        if self.camberline_plofile == 210:
-            self.m = 0.058
-            self.k1 = 361.4
-        elif self.camberline_plofile == 220:
-            self.m = 0.126
-            self.k1 = 51.64
-        elif self.camberline_plofile == 230:
-            self.m = 0.2025
-            self.k1 = 15.957
-        elif self.camberline_plofile == 240:
-            self.m = 0.29
-            self.k1 = 6.643
-        elif self.camberline_plofile == 250:
-            self.m = 0.391
-            self.k1 = 3.230
-
-        elif self.camberline_plofile == 221:
-            self.m = 0.130
-            self.k1 = 51.990
-            self.k2byk1 = 0.000764
-        elif self.camberline_plofile == 231:
-            self.m = 0.217
-            self.k1 = 15.793
-            self.k2byk1 = 0.00677
-        elif self.camberline_plofile == 241:
-            self.m = 0.318
-            self.k1 = 6.520
-            self.k2byk1 = 0.0303
-        elif self.camberline_plofile == 251:
-            self.m = 0.441
-            self.k1 = 3.191
-            self.k2byk1 = 0.1355
-        else:
+        m, k1, k2byk1 = camberline_plofile_table(self.camberline_plofile)
+        self.m = float(m)
+        self.k1 = float(k1)
+        if int(self.camberline_plofile) % 10 == 1:
+            self.k2byk1 = float(k2byk1)
+
+
+# NACA5桁翼の平均キャンバー線の定数(上3桁: m, k1, k2/k1)，反り返り無し(3桁目が0)はk2/k1を使わないので0.0とする
+CAMBERLINE_PROFILE = {210: (0.058, 361.4, 0.0), 220: (0.126, 51.64, 0.0), 230: (0.2025, 15.957, 0.0),
+                      240: (0.29, 6.643, 0.0), 250: (0.391, 3.230, 0.0),
+                      221: (0.130, 51.990, 0.000764), 231: (0.217, 15.793, 0.00677),
+                      241: (0.318, 6.520, 0.0303), 251: (0.441, 3.191, 0.1355)}
+
+
+# 上3桁(整数またはその配列)からm, k1, k2/k1を配列でまとめて引く
+def camberline_plofile_table(camberline_plofile):
+    profile = np.asarray(camberline_plofile, dtype=int)
+    key = np.array(sorted(CAMBERLINE_PROFILE))
+    value = np.array([CAMBERLINE_PROFILE[k] for k in key])
+    index = np.clip(np.searchsorted(key, profile), 0, key.shape[0] - 1)
+    if np.any(key[index] != profile):
+        print("this type wing is not defined")
+        exit()
+    return value[index, 0], value[index, 1], value[index, 2]
+
+
+# 翼番号の配列(4桁と5桁の混在も可)をまとめて計算する
+# y_c, dyc_dx, y_t, theta, x_u, y_u, x_l, y_lは(翼の数, xの点数)の配列で，各行はNaca_4_digit / Naca_5_digitの同名の値と同じ
+# quasi_equidistantのときはequidistant_x, equidistant_y_u, equidistant_y_lも(翼の数, 点数)の配列で求める
+# attack_angle_degは全翼共通の値または翼ごとの配列
+class Naca_family(object):
+    def __init__(self, codes, attack_angle_deg, resolution, quasi_equidistant=True, length_adjust=False, spacing="uniform"):
+        self.codes = [str(code) for code in codes]
+        self.size = len(self.codes)
+        self.load_setting(attack_angle_deg, resolution, quasi_equidistant, length_adjust, spacing)
+        self.t = np.zeros((self.size, 1))
+
+        self.digit4 = np.array([len(code) == 4 for code in self.codes], dtype=bool)
+        self.digit5 = np.array([len(code) == 5 for code in self.codes], dtype=bool)
+        if not np.all(self.digit4 | self.digit5):
             print("this type wing is not defined")
             exit()
+        if np.any(self.digit4):
+            self.__param_4digit(np.array(self.codes)[self.digit4], self.digit4)
+        if np.any(self.digit5):
+            self.__param_5digit(np.array(self.codes)[self.digit5], self.digit5)
+
+        self.calc_shape()
+        self.get_surface()
+        if quasi_equidistant == True:
+            self.get_quasi_equidistant_line()
+
+    def load_setting(self, attack_angle_deg, resolution, quasi_equidistant=True, length_adjust=False, spacing="uniform"):
+        self.use_quasi_equidistant = quasi_equidistant
+        self.reshape = length_adjust
+        self.resolution = resolution
+        self.new_resolution = resolution
+        self.spacing = spacing
+        self.attack_angle = np.broadcast_to(np.asarray(attack_angle_deg, dtype=float), (self.size,)).reshape(-1, 1)
+        self.x = chord_distribution(self.resolution, spacing)
+
+    # self.x(全翼共通の(点数,)または翼ごとの(翼の数, 点数))でキャンバー線と厚みの分布を計算する
+    def calc_shape(self):
+        x = self.x.reshape(1, -1) if self.x.ndim == 1 else self.x
+        self.y_c = np.zeros((self.size, x.shape[1]))
+        self.dyc_dx = np.zeros((self.size, x.shape[1]))
+        if np.any(self.digit4):
+            self.__camber_4digit(x if x.shape[0] == 1 else x[self.digit4], self.digit4)
+        if np.any(self.digit5):
+            self.__camber_5digit(x if x.shape[0] == 1 else x[self.digit5], self.digit5)
+        # 厚みの分布のxの多項式は全翼共通
+        self.y_t = self.t / 0.2 * (0.2969 * np.sqrt(x) - 0.1260 * x - 0.3516 * x**2 + 0.2843 * x**3 - 0.1015 * x**4)
+        self.theta = np.arctan(self.dyc_dx)
+
+    # 翼ごとの翼弦上の位置x(翼の数, 点数)で表面を計算し直したコピーを返す(迎角とlength_adjustの縮尺は元の翼と同じ)
+    def evaluate(self, x):
+        naca = copy.copy(self)
+        naca.x = x
+        naca.resolution = x.shape[1]
+        naca.calc_shape()
+        naca.get_surface(rate = self.length_rate)
+        return naca
+
+    # 翼rowだけを取り出したコピーを返す(表面は計算し直していないのでevaluateと組み合わせて使う)
+    def take(self, row):
+        naca = copy.copy(self)
+        naca.codes = [code for code, use in zip(self.codes, row) if use]
+        naca.size = len(naca.codes)
+        naca.digit4 = self.digit4[row]
+        naca.digit5 = self.digit5[row]
+        naca.t = self.t[row]
+        naca.attack_angle = self.attack_angle[row]
+        if np.any(self.digit4):
+            naca.m4 = self.m4[row[self.digit4]]
+            naca.p4 = self.p4[row[self.digit4]]
+        if np.any(self.digit5):
+            naca.m5 = self.m5[row[self.digit5]]
+            naca.k1 = self.k1[row[self.digit5]]
+            naca.k2_k1 = self.k2_k1[row[self.digit5]]
+            naca.reflect = self.reflect[row[self.digit5]]
+        if self.length_rate is not None:
+            naca.length_rate = self.length_rate[row]
+        return naca
+
+    def __param_4digit(self, codes, row):
+        self.m4 = np.array([float(code[0]) / 100 for code in codes]).reshape(-1, 1)
+        self.p4 = np.array([float(code[1]) / 10 for code in codes]).reshape(-1, 1)
+        self.t[row] = np.array([float(code[2:4]) / 100 for code in codes]).reshape(-1, 1)
+
+    def __param_5digit(self, codes, row):
+        m, k1, k2_k1 = camberline_plofile_table([int(code[0:3]) for code in codes])
+        self.m5 = m.reshape(-1, 1)
+        self.k1 = k1.reshape(-1, 1)
+        self.k2_k1 = k2_k1.reshape(-1, 1)
+        self.reflect = np.array([int(code[2]) != 0 for code in codes]).reshape(-1, 1)
+        self.t[row] = np.array([float(code[3:5]) / 100.0 for code in codes]).reshape(-1, 1)
+
+    def __camber_4digit(self, x, row):
+        m = self.m4
+        p = self.p4
+        # p=0, p=1の翼ではゼロ除算になる側の値は使わない
+        with np.errstate(divide="ignore", invalid="ignore"):
+            y_c = np.where(x < p, m / (p ** 2) * (2.0 * p * x - x ** 2), m / ((1 - p) ** 2) * ((1.0 - 2.0 * p) + 2.0 * p * x - x ** 2))
+            dyc_dx = np.where(x < p, 2.0 * m / (p ** 2) * (p - x), 2.0 * m / ((1.0 - p) ** 2) * (p - x))
+        y_c = np.where(p == 0, m * (1.0 - x**2), np.where(p == 1, m * (2.0 * x - x ** 2), y_c))
+        dyc_dx = np.where(p == 0, - 2.0 * m * x, np.where(p == 1, 2.0 * m * (1.0 - x), dyc_dx))
+        self.y_c[row] = y_c
+        self.dyc_dx[row] = dyc_dx
+
+    def __camber_5digit(self, x, row):
+        m = self.m5
+        k1 = self.k1
+        k2_k1 = self.k2_k1
+        reflect = self.reflect
+
+        y_c_nr = np.where(x < m, k1 / 6.0 * (x ** 3 - 3.0 * m * x ** 2 + m ** 2 * (3.0 - m) * x), k1 / 6.0 * m ** 3 * (1.0 - x))
+        y_c_rf = np.where(x < m, k1 / 6.0 * ((x - m)**3 - k2_k1 * (1.0-m)**3 * x - m**3 * x + m**3),
+                          k1 / 6.0 * (k2_k1 * (x - m)**3 - k2_k1 * (1.0 - m)**3 * x - m**3 * x + m**3))
+        dyc_dx_nr = np.where(x < m, k1 / 6.0 * (3.0 * x ** 2 - 6.0 * m * x + m ** 2 * (3.0 - m)), - k1 / 6.0 * m ** 3)
+        dyc_dx_rf = np.where(x < m, k1 / 6.0 * (3.0 * (x - m) ** 2 - k2_k1 * (1.0 - m) ** 3 - m ** 3),
+                             k1 / 6.0 * (3.0 * k2_k1 * (x - m) ** 2 - k2_k1 * (1.0 - m) ** 3 - m ** 3))
+        self.y_c[row] = np.where(reflect, y_c_rf, y_c_nr)
+        self.dyc_dx[row] = np.where(reflect, dyc_dx_rf, dyc_dx_nr)
+
+    # rateを省略するとlength_adjust時の縮尺を各翼の表面の点から求める
+    def get_surface(self, rate=None):
+        sin_theta = np.sin(self.theta)
+        cos_theta = np.cos(self.theta)
+        u0 = self.x - self.y_t * sin_theta - 0.5
+        u1 = self.y_c + self.y_t * cos_theta
+        l0 = self.x + self.y_t * sin_theta - 0.5
+        l1 = self.y_c - self.y_t * cos_theta
+
+        attack_angle = self.attack_angle / 180 * (np.pi)
+        cos_a = np.cos(attack_angle)
+        sin_a = np.sin(attack_angle)
+        rot_u0 = cos_a * u0 + sin_a * u1
+        rot_u1 = - sin_a * u0 + cos_a * u1
+        rot_l0 = cos_a * l0 + sin_a * l1
+        rot_l1 = - sin_a * l0 + cos_a * l1
+
+        if self.reshape == True:
+            if rate is None:
+                x_min = np.minimum(np.min(rot_l0, axis=1), np.min(rot_u0, axis=1)).reshape(-1, 1)
+                x_max = np.maximum(np.max(rot_l0, axis=1), np.max(rot_u0, axis=1)).reshape(-1, 1)
+                rate = 1.0 / (x_max - x_min)
+            rot_u0 = rate * rot_u0
+            rot_u1 = rate * rot_u1
+            rot_l0 = rate * rot_l0
+            rot_l1 = rate * rot_l1
+
+        self.x_l = rot_l0 + 0.5
+        self.y_l = rot_l1 + 0.5
+        self.x_u = rot_u0 + 0.5
+        self.y_u = rot_u1 + 0.5
+        self.length_rate = rate
+
+    # Naca_4_digit.get_quasi_equidistant_lineを全翼まとめて行う
+    def get_quasi_equidistant_line(self):
+        x_min = np.minimum(np.min(self.x_u, axis=1), np.min(self.x_l, axis=1)).reshape(-1, 1)
+        x_max = np.maximum(np.max(self.x_u, axis=1), np.max(self.x_l, axis=1)).reshape(-1, 1)
+        t = chord_distribution(self.new_resolution, self.spacing).reshape(1, -1)
+        if self.reshape == False:
+            self.equidistant_x = np.repeat(t, self.size, axis=0)
+        else:
+            self.equidistant_x = x_min + (x_max - x_min) * t
+        inside = (x_min <= self.equidistant_x) & (x_max >= self.equidistant_x)
+        self.equidistant_y_l = np.where(inside, self.__surface_y_at(self.equidistant_x, upper = False), -1.0)  # -1.0は外れ値
+        self.equidistant_y_u = np.where(inside, self.__surface_y_at(self.equidistant_x, upper = True), -1.0)
+
+    # Naca_4_digitの同名の関数と同じNewton法を全翼・全点まとめて行う(初期値は翼ごとの線形補間)
+    # 収束の判定は翼ごとに行い，収束した翼はそれ以上更新しない(下面が折り返す翼で別の解に移らないようにNaca_4_digitと揃える)
+    def __surface_y_at(self, target_x, upper=True, iteration=20, eps=1.0e-14):
+        surface_x = lambda naca: naca.x_u if upper else naca.x_l
+        surface_y = lambda naca: naca.y_u if upper else naca.y_l
+        order = np.argsort(surface_x(self), axis=1)
+        chord_x = np.broadcast_to(self.x, (self.size, self.resolution))
+        s = batch_interp(target_x, np.take_along_axis(surface_x(self), order, axis=1), np.take_along_axis(chord_x, order, axis=1))
+        h = 1.0e-7
+        active = np.ones(self.size, dtype=bool)
+        for i in range(iteration):
+            family = self.take(active)
+            s_a = s[active]
+            naca = family.evaluate(s_a)
+            residual = surface_x(naca) - target_x[active]
+            s_h = np.where(s_a + h <= 1.0, s_a + h, s_a - h)
+            dx_ds = (surface_x(family.evaluate(s_h)) - surface_x(naca)) / (s_h - s_a)
+            new_s = s_a - np.where(dx_ds != 0.0, residual / np.where(dx_ds != 0.0, dx_ds, 1.0), 0.0)
+            stuck = ((s_a == 0.0) & (new_s < 0.0)) | ((s_a == 1.0) & (new_s > 1.0))
+            done = ~np.any((np.abs(residual) >= eps) & ~stuck, axis=1)
+            s[active] = np.where(done.reshape(-1, 1), s_a, np.clip(new_s, 0.0, 1.0))
+            active[active] = ~done
+            if not np.any(active):
+                break
+        return surface_y(self.evaluate(s))
+
+    # 各翼の物体表面を(翼の数, 点数)の複素配列で返す(各行はtransform2complexと同じ並び)
+    def transform2complex(self):
+        z_u_reverse = (self.x_u + 1j * self.y_u)[:, ::-1]
+        z_l = self.x_l + 1j * self.y_l
+        # 前縁(x=0)では厚みが0なので上面と下面の点は一致する
+        if np.all(z_u_reverse[:, self.resolution - 1] == z_l[:, 0]):
+            return np.concatenate([z_u_reverse, z_l[:, 1:], z_u_reverse[:, :1]], axis=1)
+        else:
+            return np.concatenate([z_u_reverse, z_l, z_u_reverse[:, :1]], axis=1)
 
 
 def main():
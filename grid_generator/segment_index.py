@@ -0,0 +1,97 @@
+# coding: utf-8
+import numpy as np
+
+
+# 線分p1-p2と線分p3-p4の交差判定(line_intersectの配列版)
+# p1～p4は(n, 2)の座標配列で，端点の共有や同一直線上での重なりは交差としない
+def segments_intersect(p1, p2, p3, p4):
+    c1 = (p3[:, 0] - p4[:, 0]) * (p1[:, 1] - p3[:, 1]) + (p3[:, 1] - p4[:, 1]) * (p3[:, 0] - p1[:, 0])
+    c2 = (p3[:, 0] - p4[:, 0]) * (p2[:, 1] - p3[:, 1]) + (p3[:, 1] - p4[:, 1]) * (p3[:, 0] - p2[:, 0])
+    c3 = (p1[:, 0] - p2[:, 0]) * (p3[:, 1] - p1[:, 1]) + (p1[:, 1] - p2[:, 1]) * (p1[:, 0] - p3[:, 0])
+    c4 = (p1[:, 0] - p2[:, 0]) * (p4[:, 1] - p1[:, 1]) + (p1[:, 1] - p2[:, 1]) * (p1[:, 0] - p4[:, 0])
+    return (c3 * c4 < 0) & (c1 * c2 < 0)
+
+
+# 可変長の区間[start, stop)を一括で展開する(戻り値は区間番号と区間内の通し番号)
+def expand_ranges(start, stop):
+    count = stop - start
+    owner = np.repeat(np.arange(count.shape[0]), count)
+    local = np.arange(np.sum(count)) - np.repeat(np.cumsum(count) - count, count)
+    return owner, start[owner] + local
+
+
+# 2次元線分の一様バケット格子
+# η格子線1本分(または物体表面)の線分を一度だけ登録し，「この線分と交差する登録線分はどれか」をまとめて問い合わせる
+class segment_index(object):
+    def __init__(self, p_start, p_end, cell_size=None):
+        self.p_start = np.asarray(p_start, dtype=float).reshape(-1, 2)
+        self.p_end = np.asarray(p_end, dtype=float).reshape(-1, 2)
+        self.size = self.p_start.shape[0]
+
+        lower = np.minimum(self.p_start, self.p_end)
+        upper = np.maximum(self.p_start, self.p_end)
+        if self.size == 0:
+            lower = np.zeros((1, 2))
+            upper = np.ones((1, 2))
+
+        # バケットの幅は線分のbounding boxの平均的な大きさ程度にする
+        if cell_size == None:
+            cell_size = np.average(np.max(upper - lower, axis=1))
+        span = np.max(upper, axis=0) - np.min(lower, axis=0)
+        self.cell_size = max(cell_size, 1.0e-12 * max(np.max(span), 1.0))
+        self.origin = np.min(lower, axis=0)
+        self.num_cell = (span / self.cell_size).astype(int) + 1
+
+        owner, key = self.__covered_cells(self.p_start, self.p_end)
+        order = np.argsort(key, kind="stable")
+        key = key[order]
+        self.segment = owner[order]
+        self.key, first = np.unique(key, return_index=True)
+        self.offset = np.append(first, key.shape[0])
+
+    # 線分のbounding boxが覆うバケットの番号を列挙する(範囲外はバケット格子の端に寄せる)
+    def __covered_cells(self, p_start, p_end):
+        lower = (np.minimum(p_start, p_end) - self.origin) / self.cell_size
+        upper = (np.maximum(p_start, p_end) - self.origin) / self.cell_size
+        lower = np.clip(np.floor(lower).astype(int), 0, self.num_cell - 1)
+        upper = np.clip(np.floor(upper).astype(int), 0, self.num_cell - 1)
+        width_y = upper[:, 1] - lower[:, 1] + 1
+        count = (upper[:, 0] - lower[:, 0] + 1) * width_y
+        owner, local = expand_ranges(np.zeros_like(count), count)
+        cell_x = lower[owner, 0] + local // width_y[owner]
+        cell_y = lower[owner, 1] + local % width_y[owner]
+        return owner, cell_x * self.num_cell[1] + cell_y
+
+    # 同じバケットに入っている(問い合わせ線分番号, 登録線分番号)の組を重複なく返す
+    def __candidate_pairs(self, q_start, q_end):
+        owner, key = self.__covered_cells(q_start, q_end)
+        position = np.minimum(np.searchsorted(self.key, key), self.key.shape[0] - 1)
+        hit = self.key[position] == key
+        owner = owner[hit]
+        position = position[hit]
+        pick, member = expand_ranges(self.offset[position], self.offset[position + 1])
+        pair = np.unique(owner[pick] * self.size + self.segment[member])
+        return np.vstack([pair // self.size, pair % self.size]).T
+
+    # 問い合わせ線分と交差する登録線分の組(問い合わせ線分番号, 登録線分番号)を返す
+    def query_pairs(self, q_start, q_end):
+        q_start = np.asarray(q_start, dtype=float).reshape(-1, 2)
+        q_end = np.asarray(q_end, dtype=float).reshape(-1, 2)
+        if self.size == 0 or q_start.shape[0] == 0:
+            return np.zeros((0, 2), dtype=int)
+        pair = self.__candidate_pairs(q_start, q_end)
+        q = pair[:, 0]
+        s = pair[:, 1]
+        return pair[segments_intersect(q_start[q], q_end[q], self.p_start[s], self.p_end[s])]
+
+    # 問い合わせ線分ごとに，いずれかの登録線分と交差するかどうかを返す
+    def crossing_any(self, q_start, q_end):
+        q_start = np.asarray(q_start, dtype=float).reshape(-1, 2)
+        cross = np.zeros(q_start.shape[0], dtype=bool)
+        cross[self.query_pairs(q_start, q_end)[:, 0]] = True
+        return cross
+
+    # 登録線分同士で交差する組(a < b)を返す
+    def self_crossing_pairs(self):
+        pair = self.query_pairs(self.p_start, self.p_end)
+        return pair[pair[:, 0] < pair[:, 1]]
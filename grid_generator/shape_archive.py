@@ -0,0 +1,161 @@
+# coding: utf-8
+# 翼形状ライブラリを1つのファイルにまとめて保存・読み込みする
+# 座標は(翼の数, 点数, 成分数)のfloat64配列として fname.npy に，翼番号→行番号の対応は fname_index.json に保存する
+# .npyはメモリマップで開くので，1翼だけ・一部だけ読み出す場合もファイル全体を読み込まない
+import os
+import json
+import numpy as np
+
+
+def archive_fname(fname):
+    return fname + ".npy", fname + "_index.json"
+
+
+# codesの順に翼形状を書き込む(compute(code)は(n_points, n_components)の配列を返すこと)
+# 1翼ずつメモリマップに書き込むので全翼分の座標をメモリに載せる必要はない
+def write_shape_archive(fname, codes, n_points, compute, n_components=2, dtype=np.float64):
+    array_fname, index_fname = archive_fname(fname)
+    tmp_fname = array_fname + ".tmp"
+    codes = [str(code) for code in codes]
+    if len(set(codes)) != len(codes):
+        print("duplicated code in shape archive")
+        exit()
+
+    array = np.lib.format.open_memmap(tmp_fname, mode="w+", dtype=dtype, shape=(len(codes), n_points, n_components))
+    for row, code in enumerate(codes):
+        array[row] = compute(code)
+    array.flush()
+    del array
+    os.replace(tmp_fname, array_fname)
+
+    index = {"codes": codes, "n_points": n_points, "n_components": n_components}
+    with open(index_fname + ".tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(index_fname + ".tmp", index_fname)
+
+
+class shape_archive(object):
+    def __init__(self, fname):
+        array_fname, index_fname = archive_fname(fname)
+        with open(index_fname, "r") as f:
+            index = json.load(f)
+        self.codes = index["codes"]
+        self.row = {code: i for i, code in enumerate(self.codes)}
+        self.array = np.load(array_fname, mmap_mode="r")
+        if self.array.shape[0] != len(self.codes):
+            print("shape archive index does not match " + array_fname)
+            exit()
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return str(code) in self.row
+
+    # 翼番号codeの形状((n_points, n_components)の配列)
+    def get(self, code):
+        return np.array(self.array[self.row[str(code)]])
+
+    # 翼番号codeの形状を複素座標で返す(成分数2のとき)
+    def get_complex(self, code):
+        xy = self.array[self.row[str(code)]]
+        return xy[:, 0] + 1j * xy[:, 1]
+
+    # 行番号start～stopの翼番号と形状
+    def get_slice(self, start=None, stop=None, step=None):
+        return self.codes[start:stop:step], np.array(self.array[start:stop:step])
+
+    # 複数の翼番号の形状をまとめて返す(行番号順に並べ替えて読むので，メモリマップへのアクセスが飛び飛びにならない)
+    def get_many(self, codes):
+        row = np.array([self.row[str(code)] for code in codes], dtype=int)
+        order = np.argsort(row)
+        shape = np.empty((row.shape[0],) + self.array.shape[1:], dtype=self.array.dtype)
+        shape[order] = self.array[row[order]]
+        return shape
+
+    # 全翼番号と全形状
+    def get_all(self):
+        return self.get_slice()
+
+    # 1翼の形状を成分ごとに並べた長さn_points * n_componentsのベクトル(x0, x1, ..., x(n-1), y0, y1, ..., y(n-1))とみなしたときの列数
+    # (翼ごとの_x.csv, _y.csvを順につなげた並びで，column_storeと同じく学習データの列として使う)
+    def n_columns(self):
+        return self.array.shape[1] * self.array.shape[2]
+
+    # 上の並びで列番号columnsの値を全翼分，(翼の数, 列の数)の配列で返す(指定した列の値だけを読み出し，全形状はメモリに載せない)
+    def get_columns(self, columns=None):
+        if columns is None:
+            columns = np.arange(self.n_columns())
+        columns = np.asarray(columns, dtype=int)
+        n_points = self.array.shape[1]
+        return np.array(self.array[:, columns % n_points, columns // n_points])
+
+
+# 形状記述子(フーリエ係数や等間隔点の座標など，1翼あたり長さn_columnsのベクトル)を列ごとにまとめて保存する
+# 配列は(n_columns, 翼の数)の並びなので，1つの列(全翼分のt003など)はファイル上で連続している
+# 前方のk列だけ読む・rate列ごとに読むといった学習データの読み方では，必要な列以外をディスクから読まない
+# metaには記述子の種類や計算条件を入れておく(索引ファイルにそのまま保存される)
+class column_store_writer(object):
+    def __init__(self, fname, codes, n_columns, meta=None, dtype=np.float64):
+        self.array_fname, self.index_fname = archive_fname(fname)
+        self.codes = [str(code) for code in codes]
+        if len(set(self.codes)) != len(self.codes):
+            print("duplicated code in column store")
+            exit()
+        self.index = {"codes": self.codes, "n_columns": n_columns, "layout": "columnar", "meta": {} if meta == None else meta}
+        self.array = np.lib.format.open_memmap(self.array_fname + ".tmp", mode="w+", dtype=dtype,
+                                               shape=(n_columns, len(self.codes)))
+
+    # 行番号start以降の翼の記述子block((翼の数, n_columns)の配列)を書き込む
+    def write(self, start, block):
+        self.array[:, start:start + block.shape[0]] = block.T
+
+    def close(self):
+        self.array.flush()
+        del self.array
+        os.replace(self.array_fname + ".tmp", self.array_fname)
+        with open(self.index_fname + ".tmp", "w") as f:
+            json.dump(self.index, f)
+        os.replace(self.index_fname + ".tmp", self.index_fname)
+
+
+# fnameの索引が列ごとの保存形式(column_store_writerで書いたもの)ならTrue
+def is_column_store(fname):
+    array_fname, index_fname = archive_fname(fname)
+    if not os.path.exists(index_fname):
+        return False
+    with open(index_fname, "r") as f:
+        return json.load(f).get("layout") == "columnar"
+
+
+class column_store(object):
+    def __init__(self, fname):
+        array_fname, index_fname = archive_fname(fname)
+        with open(index_fname, "r") as f:
+            index = json.load(f)
+        self.codes = index["codes"]
+        self.meta = index["meta"]
+        self.row = {code: i for i, code in enumerate(self.codes)}
+        self.array = np.load(array_fname, mmap_mode="r")
+        if self.array.shape[1] != len(self.codes):
+            print("column store index does not match " + array_fname)
+            exit()
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return str(code) in self.row
+
+    def n_columns(self):
+        return self.array.shape[0]
+
+    # 翼番号codeの記述子ベクトル
+    def get(self, code):
+        return np.array(self.array[:, self.row[str(code)]])
+
+    # 列番号columnsの記述子を全翼分，(翼の数, 列の数)の配列で返す(指定した列だけをファイルから読む)
+    def get_columns(self, columns=None):
+        if columns is None:
+            return np.array(self.array).T
+        return np.array(self.array[np.asarray(columns, dtype=int)]).T
@@ -0,0 +1,88 @@
+# coding: utf-8
+# 翼族の形状記述子(学習データの物体形状ベクトル)を翼の数×点数の配列でまとめて計算し，列ごとの保存形式(column_store)に書き出す
+# fourier:表面を周長方向に等間隔に取り直した複素座標列のフーリエ係数(低周波から順に実部・虚部を交互に並べる)
+# equidistant:翼弦方向に等間隔なxでの上面・下面のy座標(後縁→前縁→後縁の順)
+# crowd:前縁付近と後縁付近に点を集めたxでの上面・下面のy座標(shape_crowd_0.1_0.15_30_50_20と同じ区切り方)
+import numpy as np
+from naca_4digit_test import Naca_family
+from shape_archive import column_store_writer
+from curve_geometry import batch_interp
+
+DESCRIPTOR_KIND = ["fourier", "equidistant", "crowd"]
+
+
+# crowdのx座標(前縁側lead未満にn_lead点，後縁側1-trail以上にn_trail点，その間にn_mid点)
+def crowd_distribution(lead=0.1, trail=0.15, n_lead=30, n_mid=50, n_trail=20):
+    return np.concatenate([np.linspace(0.0, lead, n_lead, endpoint=False),
+                           np.linspace(lead, 1.0 - trail, n_mid, endpoint=False),
+                           np.linspace(1.0 - trail, 1.0, n_trail)])
+
+
+# 上面・下面のy座標をx_sampleで取り出し，後縁→前縁(上面)→後縁(下面)の順に並べる
+# 前縁付近では表面のxが翼弦上の位置に対して単調でないので，xの累積最大値で単調にしてから補間する
+def sample_surface_y(naca, x_sample):
+    y_u = batch_interp(x_sample, np.maximum.accumulate(naca.x_u, axis=1), naca.y_u)
+    y_l = batch_interp(x_sample, np.maximum.accumulate(naca.x_l, axis=1), naca.y_l)
+    return np.concatenate([y_u[:, ::-1], y_l], axis=1)
+
+
+# 閉曲線z((行数, 点数)の複素配列，始点と終点は同じ点)を周長方向に等間隔なnum点に取り直す
+def resample_closed_curve(z, num):
+    length = np.concatenate([np.zeros((z.shape[0], 1)), np.cumsum(np.abs(np.diff(z, axis=1)), axis=1)], axis=1)
+    length = length / length[:, -1:]
+    t = np.linspace(0.0, 1.0, num, endpoint=False)
+    return batch_interp(t, length, np.real(z)) + 1j * batch_interp(t, length, np.imag(z))
+
+
+# 周長方向に等間隔なn_sample点の複素座標列のフーリエ係数を，0, 1, -1, 2, -2, ...次の順に実部・虚部を交互に並べたn_terms個の値
+def fourier_descriptor(z, n_terms=200, n_sample=1024):
+    coef = np.fft.fft(resample_closed_curve(z, n_sample), axis=1) / n_sample
+    k = np.arange(n_terms // 2 + 1)
+    order = np.vstack([k, -k]).T.ravel()[1:n_terms // 2 + 1]
+    coef = coef[:, order]
+    return np.stack([np.real(coef), np.imag(coef)], axis=2).reshape(coef.shape[0], -1)[:, :n_terms]
+
+
+# codesの各翼についてkindの記述子を(翼の数, n_terms)の配列で返す
+# 表面はcosine spacingのresolution点で解析式から計算する(前縁・後縁付近の補間誤差を抑えるため)
+def family_descriptor(codes, kind, n_terms=200, resolution=1001, length_adjust=False, crowd=(0.1, 0.15, 30, 50, 20),
+                      naca=None):
+    if naca == None:
+        naca = Naca_family(codes, 0.0, resolution, quasi_equidistant=False, length_adjust=length_adjust, spacing="cosine")
+    if kind == "fourier":
+        return fourier_descriptor(naca.transform2complex(), n_terms)
+    elif kind == "equidistant":
+        return sample_surface_y(naca, np.linspace(0.0, 1.0, n_terms // 2))
+    elif kind == "crowd":
+        lead, trail, n_lead, n_mid, n_trail = crowd
+        if 2 * (n_lead + n_mid + n_trail) != n_terms:
+            print("crowd points do not match n_terms")
+            exit()
+        return sample_surface_y(naca, crowd_distribution(lead, trail, n_lead, n_mid, n_trail))
+    else:
+        print("descriptor kind error")
+        exit()
+
+
+# 翼族の記述子をchunk翼ずつ計算し，kindごとの列ごと保存形式 fname_(kind).npy に書き出す
+# 1チャンクの表面は全kindで使い回し，全翼分の表面座標をメモリに載せることはしない
+def output_family_descriptors(fname, codes, kinds=None, n_terms=200, resolution=1001, length_adjust=False,
+                              crowd=(0.1, 0.15, 30, 50, 20), chunk=500):
+    if kinds == None:
+        kinds = DESCRIPTOR_KIND
+    codes = [str(code) for code in codes]
+    writer = {}
+    for kind in kinds:
+        meta = {"kind": kind, "n_terms": n_terms, "resolution": resolution, "length_adjust": length_adjust}
+        if kind == "crowd":
+            meta["crowd"] = list(crowd)
+        writer[kind] = column_store_writer(fname + "_" + kind, codes, n_terms, meta)
+
+    for start in range(0, len(codes), chunk):
+        naca = Naca_family(codes[start:start + chunk], 0.0, resolution, quasi_equidistant=False,
+                           length_adjust=length_adjust, spacing="cosine")
+        for kind in kinds:
+            writer[kind].write(start, family_descriptor(None, kind, n_terms, crowd=crowd, naca=naca))
+
+    for kind in kinds:
+        writer[kind].close()
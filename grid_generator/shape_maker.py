@@ -1,7 +1,90 @@
 # coding: utf-8
+# 正多角形・星形多角形の物体形状を作る
+# polygon_familyは頂点数・内径の配列から全形状を配列演算で一度に作る(matplotlibは使わないのでバッチ処理でも止まらない)
+# 図を確認したいときだけpolygon.sample_plot()を呼ぶ
 import numpy as np
-from scipy import interpolate
-import matplotlib.pyplot as plt
+from curve_geometry import batch_interp
+
+
+# 中心center，半径radiusの正num_vertex角形の頂点(count個分，(count, num_vertex)の配列)
+# 頂点は反時計回りで，最後の頂点がx方向の最も後方(角度0)
+def regular_polygon_vertex(num_vertex, count=1, radius=0.5, center=0.5 * (1 + 1j)):
+    vertex = radius * np.exp(1j * np.linspace(start = 0, stop = 2.0 * np.pi, num = num_vertex + 1))[1:] + center
+    return np.tile(vertex, (count, 1))
+
+
+# 外側の頂点num_vertex個と内側の頂点(半径radius * inner_diameter)num_vertex個を交互に並べた星形((内径の数, 2 * num_vertex)の配列)
+def star_polygon_vertex(num_vertex, inner_diameter, radius=0.5, center=0.5 * (1 + 1j)):
+    inner_diameter = np.asarray(inner_diameter, dtype=float).reshape(-1, 1)
+    angle = np.linspace(start = 0, stop = 2.0 * np.pi, num = num_vertex + 1)[1:]
+    phase_differnce = 2.0 * np.pi / (2.0 * num_vertex)
+    outer_vertex = np.broadcast_to(radius * np.exp(1j * angle), (inner_diameter.shape[0], num_vertex))
+    inner_vertex = radius * inner_diameter * np.exp(1j * (angle - phase_differnce))
+    return np.stack([inner_vertex, outer_vertex], axis=2).reshape(inner_diameter.shape[0], -1) + center
+
+
+# 反時計回りの頂点列(各行が1つの形状)を前方(xが最小)と後方(xが最大)の頂点で上側と下側に分ける
+# 上側は前方から時計回りに後方まで，下側は前方から反時計回りに後方までの頂点番号(どちらも前方→後方の順)
+# 行ごとに頂点数が違うので，後方に着いた後は後方の頂点番号を繰り返して(行数, 頂点数 + 1)にそろえる
+def split_surface_index(vertex):
+    size = vertex.shape[1]
+    lead = np.argmin(np.real(vertex), axis=1).reshape(-1, 1)
+    trail = np.argmax(np.real(vertex), axis=1).reshape(-1, 1)
+    k = np.arange(size + 1).reshape(1, -1)
+    index_u = (lead - np.minimum(k, (lead - trail) % size)) % size
+    index_l = (lead + np.minimum(k, (trail - lead) % size)) % size
+    return index_u, index_l
+
+
+# 折れ線z((行数, 点数)の複素配列)を各行の周長方向に等間隔なresolution点に取り直す(始点と終点は元の折れ線と同じ)
+# 星形はxについて単調でないので，xではなく周長で取り直す
+def resample_polyline(z, resolution):
+    length = np.concatenate([np.zeros((z.shape[0], 1)), np.cumsum(np.abs(np.diff(z, axis=1)), axis=1)], axis=1)
+    length = length / length[:, -1:]
+    t = np.linspace(0.0, 1.0, resolution)
+    return batch_interp(t, length, np.real(z)) + 1j * batch_interp(t, length, np.imag(z))
+
+
+# num_vertexとinner_diameter(星形のみ)の配列で指定した多角形をまとめて作る
+# z_u, z_l:(形状の数, resolution)の上側・下側(前方→後方)，vertex:形状ごとの頂点列のリスト
+# 頂点数ごとにまとめて計算し，結果は入力の順に並べる
+class polygon_family(object):
+    def __init__(self, num_vertex, inner_diameter=0.5, star=False, resolution=1000):
+        self.num_vertex, self.inner_diameter = np.broadcast_arrays(np.asarray(num_vertex, dtype=int).reshape(-1),
+                                                                   np.asarray(inner_diameter, dtype=float).reshape(-1))
+        self.star = star
+        self.header = "polygon_star_" if star else "polygon_regular_"
+        self.resolution = resolution
+        self.size = self.num_vertex.shape[0]
+        self.z_u = np.zeros((self.size, resolution), dtype=complex)
+        self.z_l = np.zeros((self.size, resolution), dtype=complex)
+        self.vertex = [None] * self.size
+
+        for n in np.unique(self.num_vertex):
+            row = np.where(self.num_vertex == n)[0]
+            if star:
+                vertex = star_polygon_vertex(n, self.inner_diameter[row])
+            else:
+                vertex = regular_polygon_vertex(n, row.shape[0])
+            index_u, index_l = split_surface_index(vertex)
+            self.z_u[row] = resample_polyline(np.take_along_axis(vertex, index_u, axis=1), resolution)
+            self.z_l[row] = resample_polyline(np.take_along_axis(vertex, index_l, axis=1), resolution)
+            for i, r in enumerate(row):
+                self.vertex[r] = vertex[i]
+
+    def __len__(self):
+        return self.size
+
+    # 後方から上側→前方→下側→後方と回る閉曲線((形状の数, 2 * resolution - 1)の複素配列)
+    def transform2complex(self):
+        return np.concatenate([self.z_u[:, ::-1], self.z_l[:, 1:]], axis=1)
+
+    # 形状ごとのファイル名の頭(header + 頂点数 + 星形の場合は内径)
+    def names(self):
+        if self.star:
+            return [self.header + str(n) + "_" + str(d) for n, d in zip(self.num_vertex, self.inner_diameter)]
+        return [self.header + str(n) for n in self.num_vertex]
+
 
 class polygon(object):
     # 初期化
@@ -32,7 +115,7 @@ class polygon(object):
         if len(self.vertex) == self.num_vertex:
             self.vertex.append(self.vertex[0])
             self.get_perimeter()
-    
+
     # 周の長さを求める
     def get_perimeter(self):
         self.perimeter = 0.0
@@ -40,78 +123,36 @@ class polygon(object):
             self.perimeter += np.sqrt(np.sum((self.vertex[i + 1] - self.vertex[i]) ** 2))
 
     def set_regular_polygon(self):
-        self.vertex = self.radius * np.exp(1j * np.linspace(start = 0, stop = 2.0 * np.pi, num = self.num_vertex + 1))[1:] + self.center
-        # self.sample_plot()
+        self.vertex = regular_polygon_vertex(self.num_vertex, radius=self.radius, center=self.center)[0]
 
     def set_star_polygon(self):
-        outer_vertex = self.radius * np.exp(1j * np.linspace(start=0, stop=2.0 * np.pi, num=self.num_vertex + 1)).reshape(1, -1) + self.center
-        phase_differnce = 2.0 * np.pi / (2.0 * self.num_vertex)
-        inner_vertex = self.radius * self.inner_diameter * np.exp(1j * np.linspace(start=0 - phase_differnce, stop=2.0 * np.pi - phase_differnce, num=self.num_vertex + 1)).reshape(1, -1) + self.center
-        self.vertex = np.concatenate((inner_vertex, outer_vertex)).T.reshape(-1)[2:]
+        self.vertex = star_polygon_vertex(self.num_vertex, self.inner_diameter, radius=self.radius, center=self.center)[0]
         self.num_vertex = self.vertex.shape[0]
-        # self.sample_plot()
 
+    # 上側と下側とを分離(頂点は反時計回りに格納されていることに注意)
+    # 点番号を座標が小さい順(前方→後方)に格納する
     def make_edge(self):
-        trail = np.argmax(np.real(self.vertex)) # 後方
-        lead = np.argmin(np.real(self.vertex))  # 前方
-
-        # 上側と下側とを分離(ここまでの処理で反時計回りに格納されていることに注意)
-        vertex_u = []
-        vertex_l = []
-
-        # 点番号を座標が小さい順に格納する
-        tmp_vertex = []
-        if lead < trail:    # upper -> lower -> upperの順
-            for i in range(lead + 1):   # leadまで含める
-                vertex_u.insert(0, i)
-            for i in range(lead, trail+1):  # trailまで含める
-                vertex_l.append(i)
-            for i in range(trail, self.num_vertex):
-                tmp_vertex.insert(0, i)
-            vertex_u.extend(tmp_vertex)
-
-        else:   # lower -> upper -> lowerの順
-            for i in range(trail+1):    # trailまで含める
-                tmp_vertex.append(i)
-            for i in range(trail, lead+1):
-                vertex_u.insert(0, i)
-            for i in range(lead, self.num_vertex):
-                vertex_l.append(i)
-            vertex_l.extend(tmp_vertex)
-
-        self.z_l = np.zeros(len(vertex_l), dtype=complex)
-        self.z_u = np.zeros(len(vertex_l), dtype=complex)
-        i = 0
-        for p_num_u in vertex_u:
-            self.z_u[i] = self.vertex[p_num_u]
-            i += 1
-
-        i = 0
-        for p_num_l in vertex_l:
-            self.z_l[i] = self.vertex[p_num_l]
-            i += 1
-
+        index_u, index_l = split_surface_index(self.vertex.reshape(1, -1))
+        # 後方の頂点番号の繰り返しは除く
+        self.z_u = self.vertex[index_u[0][:np.argmax(index_u[0] == index_u[0, -1]) + 1]]
+        self.z_l = self.vertex[index_l[0][:np.argmax(index_l[0] == index_l[0, -1]) + 1]]
         self.get_equidistant_points()
 
     def get_equidistant_points(self):
-        x_eq = np.linspace(start=0, stop=1, num=self.resolution)
-        f_u = interpolate.interp1d(np.real(self.z_u), np.imag(self.z_u), kind="linear")
-        f_l = interpolate.interp1d(np.real(self.z_l), np.imag(self.z_l), kind="linear")
-
-        plt.plot(x_eq, f_u(x_eq), "x")
-        plt.plot(x_eq, f_l(x_eq), "o")
-        self.sample_plot()
-
-
-
+        self.equidistant_z_u = resample_polyline(self.z_u.reshape(1, -1), self.resolution)[0]
+        self.equidistant_z_l = resample_polyline(self.z_l.reshape(1, -1), self.resolution)[0]
 
     def sample_plot(self):
+        import matplotlib.pyplot as plt
+        plt.plot(np.real(self.equidistant_z_u), np.imag(self.equidistant_z_u), "x")
+        plt.plot(np.real(self.equidistant_z_l), np.imag(self.equidistant_z_l), "o")
         plt.plot(np.real(self.vertex), np.imag(self.vertex))
         plt.show()
 
 
 def main():
     pol = polygon(6, star = True, inner_diameter=0.7)
+    pol.sample_plot()
 
 
 if __name__ == '__main__':
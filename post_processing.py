@@ -5,30 +5,32 @@ import matplotlib.pyplot as plt
 from matplotlib import rc
 import pandas as pd
 import os
+from remote_fetch import fetch_results
+from result_aggregator import aggregate_results, table_dict
+from residual_history import read_residual, downsample
 
 def main(online=False):
-    def main_process(online):
-        count = 0
+    def case_list():
         for i1 in range(1, 10):
             for i2 in range(1, 10):
                 for i34 in range(12, 92, 4):
                     naca4 = str(i1).zfill(1) + str(i2).zfill(1) + str(i34).zfill(2)
                     for deg in range(min_angle, max_angle + delta_angle, delta_angle):
                         if(deg != 24):
-                            save_data[count, 1] = float(naca4)
-                            save_data[count, 3] = float(deg)
-                            
-                            fname = "NACA" + naca4 + "_" + str(deg).zfill(2) + "_AC.dat"
-                            if online:
-                                stdin, stdout, stderr = ssh.exec_command('cat ' + path + fname)
-                                cd_cl = stdout.readlines()[0].split()
-                            else:
-                                with open(path + fname, "r") as f:
-                                    cd_cl = f.readline().split()
-                            
-                            save_data[count, 4] = float(cd_cl[1])  # CL
-                            save_data[count, 5] = -float(cd_cl[0])  # CD
-                            count += 1
+                            yield naca4, deg, "NACA" + naca4 + "_" + str(deg).zfill(2) + "_AC.dat"
+
+    # 新しい・変わったAC.datだけを読んで係数の表を更新し，表から並べ直す
+    def main_process(path):
+        coef = table_dict(aggregate_results(path))
+        count = 0
+        for naca4, deg, fname in case_list():
+            save_data[count, 1] = float(naca4)
+            save_data[count, 3] = float(deg)
+            if (naca4, deg, "") not in coef:
+                print(fname + " is not found")
+                exit()
+            save_data[count, 4], save_data[count, 5] = coef[(naca4, deg, "")]  # CL, CD
+            count += 1
     
     save_path = "G:\\Toyota\\Data\\Compressible_Invicid\\training_data\\NACA4\\"
     number = 6  # data number per wing
@@ -53,12 +55,15 @@ def main(online=False):
     save_data[:, 0] = type
     
     if online:
+        # 1ファイルずつcatせず，1つの接続で未取得のファイルだけをまとめて手元に取ってきてから読む
+        fetch_path = save_path + "ResultC\\"
         with paramiko.SSHClient() as ssh:
             ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
             ssh.connect(hostname = "afifep.ifs.tohoku.ac.jp", port = 22, username = "FMa037", password = password)
-            main_process(online)
+            fetch_results(ssh, path, [fname for naca4, deg, fname in case_list()], fetch_path, mode="sftp", channels=4)
+        main_process(fetch_path)
     else:
-        main_process(online)
+        main_process(path)
         
     
     save_fname = save_path + "s1122_e9988_s4_a" + str(angle_variation).zfill(3) + ".csv"
@@ -169,29 +174,20 @@ def plot_residual_graph():
     path = "G:\\Toyota\\Data\\Compressible_Invicid\\solver_validation\\NACA0012\\M015_15deg_compare\\ResultR\\"
     fname = "RES_NACA0012_15_M015_Roe_LTS_CFL95.csv"
 
-    name = ["TimeStep", "Ave:Density", "Ave:Momentum_X", "Ave:Momentum_Y", "Ave:Momentum_Z", "Ave:Energy", "Ave:Mix",
-            "Max:Density", "Max:Momentum_X","Max:Momentum_Y", "Max:Momentum_Z", "Max:Energy", "Max:Entire"]
-
-    d_type = {"TimeStep":"int8", "Ave:Density":"float16", "Ave:Momentum_X":"float16", "Ave:Momentum_Y":"float16",
-             "Ave:Momentum_Z":"float16", "Ave:Energy":"float16", "Ave:Mix":"float16", "Max:Density":"float16",
-              "Max:Momentum_X":"float16", "Max:Momentum_Y":"float16", "Max:Momentum_Z":"float16",
-              "Max:Energy":"float16", "Max:Entire":"float16"}
-
-    df = pd.read_csv(path + fname, names=name, dtype = d_type)
-
-    data_total = df.shape[0]
-
+    # 全点を描くと重いので，各グラフはn_plot点程度に間引く(最小・最大を残すのでスパイクは消えない)
+    n_plot = 4000
+    timestep, residual, name = read_residual(path + fname)
+    column = {label: i for i, label in enumerate(name)}
 
     angle = 15
     case_name = "Residual History of NACA0012 Fine-Grid\n" + r'$\alpha$' + " = " + str(angle) + " deg, Ma = 0.15 with Roe + LTS"
-    timestep = np.arange(data_total)
     
     def make_subplot(locate=1, data_label="Max:Density"):
         ax = fig.add_subplot(3, 2, locate)
         if(data_label.find("Momentum_Z") == -1):
             ax.set_yscale("log")
         ax.set_title(data_label)
-        ax.plot(timestep, df[data_label], ".", label = data_label)
+        ax.plot(*downsample(timestep, residual[:, column[data_label]], n_plot), ".", label = data_label)
         ax.legend()
         ax.set_xlabel(r"$Time Step$")
         ax.set_ylabel(r"$Error$")
@@ -205,7 +201,7 @@ def plot_residual_graph():
     data_label = "Max:Entire"
     #ax.set_yscale("log")
     ax.set_title(data_label)
-    ax.plot(timestep[75000:], df[data_label][75000:], ".", label = data_label)
+    ax.plot(*downsample(timestep[75000:], residual[75000:, column[data_label]], n_plot), ".", label = data_label)
     ax.legend()
     ax.set_xlabel(r"$Time Step$")
     ax.set_ylabel(r"$Error$")
@@ -0,0 +1,119 @@
+# -- coding: utf-8 --
+# ソルバーの結果ファイル(JPUOutputが出力するlegacy VTK)から，必要な物理量だけを読み出す
+# 初回にファイルを1回だけ走査して各セクション(POINTS/CELLS/SCALARS/VECTORS)のバイト位置を fname.index.json に保存し，
+# 2回目以降はその索引を使って，指定した物理量のセクションだけをメモリマップ経由で読む
+import os
+import json
+import mmap
+import numpy as np
+from grid_generator.mesh_reader import scan_sections, split_cells, VTK_DTYPE
+
+INDEX_VERSION = 1
+
+
+def index_fname(fname):
+    return fname + ".index.json"
+
+
+# 索引を読み込む(結果ファイルの大きさか更新時刻が変わっていたら作り直す)
+def load_index(fname, rebuild=False):
+    stat = os.stat(fname)
+    if not rebuild and os.path.exists(index_fname(fname)):
+        try:
+            with open(index_fname(fname), "r") as f:
+                index = json.load(f)
+            if (index["version"] == INDEX_VERSION and index["size"] == stat.st_size
+                    and index["mtime"] == stat.st_mtime):
+                return index
+        except (ValueError, KeyError):
+            pass
+
+    with open(fname, "rb") as f:
+        head = f.read(1024).split(b"\n")
+    index = {"version": INDEX_VERSION, "size": stat.st_size, "mtime": stat.st_mtime,
+             "binary": len(head) > 2 and head[2].strip().upper() == b"BINARY",
+             "title": head[1].decode("ascii", errors="replace").strip() if len(head) > 1 else "",
+             "sections": scan_sections(fname)}
+    # 索引が書けない場所(読み取り専用のディレクトリなど)では保存せずに使う
+    try:
+        with open(index_fname(fname) + ".tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(index_fname(fname) + ".tmp", index_fname(fname))
+    except OSError:
+        pass
+    return index
+
+
+class result_vtk(object):
+    def __init__(self, fname, rebuild_index=False):
+        self.fname = fname
+        self.index = load_index(fname, rebuild_index)
+        self.binary = self.index["binary"]
+        self.title = self.index["title"]
+        self.section = {}
+        for sec in self.index["sections"]:
+            if sec["key"] in ("SCALARS", "VECTORS"):
+                self.section[sec["word"][1]] = sec
+            elif sec["key"] in ("POINTS", "CELLS", "CELL_TYPES"):
+                self.section[sec["key"]] = sec
+        self.f = open(fname, "rb")
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.mm.close()
+        self.f.close()
+
+    # 物理量の名前の一覧(Density, Velocity, Pressure, ...)
+    def fields(self):
+        return [sec["word"][1] for sec in self.index["sections"] if sec["key"] in ("SCALARS", "VECTORS")]
+
+    def __contains__(self, name):
+        return name in self.section
+
+    # セクションのデータを1次元配列で読む(ASCIIはそのセクションのバイト列だけを変換する)
+    def __read(self, sec, count, dtype, binary_dtype):
+        if self.binary:
+            return np.frombuffer(self.mm, dtype=binary_dtype, count=count, offset=sec["start"]).astype(dtype)
+        return np.fromstring(self.mm[sec["start"]:sec["stop"]].decode("ascii"), dtype=dtype, sep=" ")[:count]
+
+    # 物理量nameの値(SCALARSは(個数,)，成分数のあるSCALARSとVECTORSは(個数, 成分数)の配列)
+    def get(self, name):
+        if name not in self.section:
+            print("field " + name + " is not found in " + self.fname)
+            exit()
+        sec = self.section[name]
+        if sec["key"] == "VECTORS":
+            n_component = 3
+        else:
+            n_component = int(sec["word"][3]) if len(sec["word"]) > 3 else 1
+        value = self.__read(sec, sec["count"] * n_component, float, VTK_DTYPE[sec["word"][2]])
+        if n_component == 1:
+            return value
+        return value.reshape(-1, n_component)
+
+    # 物理量がセルの値かどうか(Falseなら点の値)
+    def is_cell_data(self, name):
+        return self.section[name]["location"] == "CELL_DATA"
+
+    def points(self):
+        sec = self.section["POINTS"]
+        return self.__read(sec, 3 * int(sec["word"][1]), float, VTK_DTYPE[sec["word"][2]]).reshape(-1, 3)
+
+    def cells(self):
+        sec = self.section["CELLS"]
+        return split_cells(self.__read(sec, int(sec["word"][2]), np.int64, ">i4"), int(sec["word"][1]))
+
+
+# 複数の結果ファイルから同じ物理量nameだけを読み出す(ファイルごとの配列のリスト)
+def read_field(fnames, name):
+    value = []
+    for fname in fnames:
+        with result_vtk(fname) as result:
+            value.append(result.get(name))
+    return value
@@ -1,9 +1,10 @@
 # -- coding: utf-8 --
 import pandas as pd
 import numpy as np
+from grid_generator.shape_archive import shape_archive, column_store, is_column_store
 # source:データの置いてあるディレクトリのパス(絶対or相対)
 # fpath_lift:揚力係数の入ったcsvデータのsourceからの相対パス
-# fpath_shape:形状データの入ったcsvデータのsourceからの相対パス
+# fpath_shape:形状データの入ったcsvデータのsourceからの相対パス(.npyで終わる場合は形状アーカイブ(shape_archive)または形状記述子の列ごとの保存形式(column_store)から読む)
 # shape_odd:物体形状ベクトルの次元の奇偶等（読み飛ばしに関する変数）
 # read_rate:物体形状ベクトルの次元をread_rateで割った値に変更する
 # skip_rate:揚力係数データ(教師データ)数をskip_rateで割った数に減らす
@@ -51,11 +52,14 @@ def read_csv_type3(source, fpath_lift, fpath_shape, shape_odd = 0, read_rate = 1
             data_type["t" + str(index).zfill(3)] = float
         return col, name, data_type
 
-    col, name, data_type = make_use_cols_for_shape(data=200, shape_odd=shape_odd, rate=read_rate)
+    if fpath_shape.endswith(".npy"):
+        df_s = read_shape_archive(source + fpath_shape[:-len(".npy")], shape_odd, read_rate, make_use_cols_for_shape)
+    else:
+        col, name, data_type = make_use_cols_for_shape(data=200, shape_odd=shape_odd, rate=read_rate)
 
-    df_s = pd.read_csv(source + fpath_shape, header=None,
-                     usecols=col, names=name, dtype=data_type
-                     )# .set_index("naca4")
+        df_s = pd.read_csv(source + fpath_shape, header=None,
+                         usecols=col, names=name, dtype=data_type
+                         )# .set_index("naca4")
 
     """このままだとクッソ重いので名前を被らせてメモリ節約する
     本当に書きたい処理はこれ
@@ -71,6 +75,21 @@ def read_csv_type3(source, fpath_lift, fpath_shape, shape_odd = 0, read_rate = 1
     X_train = X_train.drop("lift_coef", axis=1).drop("naca4", axis=1).values
     return X_train, y_train
 
+# .npyの形状データから，make_use_cols_for_shapeで選んだ列だけを読んでcsvと同じ列名(naca4, t000, t001, ...)のDataFrameにする
+# 列の選び方はcsvの場合と同じ(csvの0列目が翼番号なので1列ずらす)が，列の中身と数は保存形式で決まる
+#   column_store(形状記述子):t###は記述子の###番目の項で，csvと同じ並び．列数は保存した項数(csvは200固定)
+#   shape_archive(表面座標):t###は x0, x1, ..., x(n-1), y0, y1, ..., y(n-1) の並びの###番目で，列数は点数の2倍
+#   (点数が偶数ならshape_odd=1, 2は1点おきの点のx, y，shape_odd=3, read_rate=2は前半のx座標だけになる)
+def read_shape_archive(fname, shape_odd, read_rate, make_use_cols_for_shape):
+    if is_column_store(fname):
+        store = column_store(fname)
+    else:
+        store = shape_archive(fname)
+    col, name, data_type = make_use_cols_for_shape(data=store.n_columns(), shape_odd=shape_odd, rate=read_rate)
+    df_s = pd.DataFrame(store.get_columns(np.array(col[1:]) - 1), columns=name[1:])
+    df_s.insert(0, "naca4", np.array(store.codes, dtype=int))
+    return df_s
+
 if __name__ == '__main__':
     # 自宅で作成したのでLaboratory用に書き換える
     source = "D:\\Dropbox\\shareTH\\program\\keras_training\\"
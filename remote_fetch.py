@@ -0,0 +1,148 @@
+# -- coding: utf-8 --
+# 計算機サーバー上の結果ファイル(NACA####_##_AC.datなど)を，1つのSSH接続でまとめて手元に取ってくる
+# clientはparamiko.SSHClient(接続済み)と同じopen_sftp() / exec_command()を持つものなら何でもよい
+# (手元のディレクトリをサーバーの代わりにするlocal_sshを使えばSSHなしで動作を確かめられる)
+# mode = "sftp":channels本のSFTPチャンネルで分担し，各ファイルは先読み(prefetch)でまとめて転送する
+# mode = "archive":channels本のチャンネルでそれぞれ tar cf - -T - を実行し，ファイル名の一覧をstdinで渡して流れてくるtarを展開する
+# 取得済みのファイルは手元のfetch_manifest.jsonに大きさと更新時刻を記録し，次回は新しいファイル・変わったファイルだけを取る
+import os
+import json
+import posixpath
+import shlex
+import subprocess
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_NAME = "fetch_manifest.json"
+
+
+def load_manifest(local_path):
+    fname = os.path.join(local_path, MANIFEST_NAME)
+    if not os.path.exists(fname):
+        return {}
+    with open(fname, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(local_path, manifest):
+    fname = os.path.join(local_path, MANIFEST_NAME)
+    with open(fname + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(fname + ".tmp", fname)
+
+
+# 手元への書き込みは一時ファイル経由(途中で止まっても壊れたファイルを取得済みとみなさない)
+def write_local(local_path, name, data):
+    fname = os.path.join(local_path, name)
+    with open(fname + ".part", "wb") as f:
+        f.write(data)
+    os.replace(fname + ".part", fname)
+
+
+# SFTPチャンネル1本でnamesを順に取ってくる
+def fetch_sftp(client, remote_path, names, size, local_path):
+    sftp = client.open_sftp()
+    try:
+        for name in names:
+            with sftp.open(posixpath.join(remote_path, name), "rb") as f:
+                # paramikoのSFTPFileは先読みを指示すると読み出し要求をまとめて送る(1ブロックごとの往復待ちをしない)
+                if hasattr(f, "prefetch"):
+                    f.prefetch(size[name])
+                write_local(local_path, name, f.read())
+    finally:
+        sftp.close()
+    return names
+
+
+# チャンネル1本でnamesをtarにまとめて送らせ，流れてきた順に展開する
+def fetch_archive(client, remote_path, names, size, local_path):
+    stdin, stdout, stderr = client.exec_command("cd " + shlex.quote(remote_path) + " && tar cf - -T -")
+
+    # ファイル名の一覧が長いとtarの出力を読まないうちに書き込みが詰まるので，一覧は別スレッドで書き込む
+    def send_names():
+        stdin.write(("\n".join(names) + "\n").encode("utf-8"))
+        # 入力の終わりを伝える(paramikoはチャンネルの書き込み側を閉じる)
+        if hasattr(stdin, "channel"):
+            stdin.channel.shutdown_write()
+        else:
+            stdin.close()
+
+    sender = threading.Thread(target=send_names)
+    sender.start()
+    fetched = []
+    with tarfile.open(fileobj=stdout, mode="r|") as tar:
+        for member in tar:
+            if member.isfile():
+                write_local(local_path, posixpath.basename(member.name), tar.extractfile(member).read())
+                fetched.append(posixpath.basename(member.name))
+    sender.join()
+    stdout.close()
+    return fetched
+
+
+# remote_pathにあるnamesのうち，手元のlocal_pathにない(または大きさ・更新時刻が変わった)ものを取ってくる
+# 戻り値は{ファイル名:手元のパス}(サーバーにないファイルは含まない)
+def fetch_results(client, remote_path, names, local_path, mode="sftp", channels=4, only_new=True):
+    if mode != "sftp" and mode != "archive":
+        print("fetch mode error")
+        exit()
+    if not os.path.exists(local_path):
+        os.makedirs(local_path)
+
+    # ファイルごとにstatせず，ディレクトリの一覧1回で大きさと更新時刻を得る
+    sftp = client.open_sftp()
+    try:
+        attr = {a.filename: (a.st_size, a.st_mtime) for a in sftp.listdir_attr(remote_path)}
+    finally:
+        sftp.close()
+    names = [name for name in names if name in attr]
+
+    manifest = load_manifest(local_path) if only_new else {}
+    todo = [name for name in names
+            if manifest.get(name) != list(attr[name]) or not os.path.exists(os.path.join(local_path, name))]
+    size = {name: attr[name][0] for name in todo}
+
+    if len(todo) > 0:
+        fetch = fetch_sftp if mode == "sftp" else fetch_archive
+        channels = max(1, min(channels, len(todo)))
+        part = [todo[i::channels] for i in range(channels)]
+        with ThreadPoolExecutor(max_workers=channels) as pool:
+            for fetched in pool.map(lambda p: fetch(client, remote_path, p, size, local_path), part):
+                for name in fetched:
+                    manifest[name] = list(attr[name])
+        save_manifest(local_path, manifest)
+    return {name: os.path.join(local_path, name) for name in names}
+
+
+# 手元のディレクトリをサーバーの代わりにする(paramikoのSSHClient / SFTPClientの必要な部分だけ)
+class local_attr(object):
+    def __init__(self, entry):
+        stat = entry.stat()
+        self.filename = entry.name
+        self.st_size = stat.st_size
+        self.st_mtime = int(stat.st_mtime)
+
+
+class local_sftp(object):
+    def listdir_attr(self, path):
+        return [local_attr(entry) for entry in os.scandir(path) if entry.is_file()]
+
+    def open(self, fname, mode="rb"):
+        return open(fname, mode)
+
+    def close(self):
+        pass
+
+
+class local_ssh(object):
+    def open_sftp(self):
+        return local_sftp()
+
+    def exec_command(self, command):
+        process = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL)
+        return process.stdin, process.stdout, None
+
+    def close(self):
+        pass
@@ -0,0 +1,97 @@
+# -- coding: utf-8 --
+# ソルバーの残差履歴(RES_*.csv)の読み込みと，グラフ描画用の間引き
+# csvはchunksize行ずつ読み，TimeStepはint64，残差はfloat32の配列にする
+# (float16では1e-8程度の残差が0になり，int8のTimeStepは127で桁あふれする)
+# 読み込んだ結果は fname.npz に保存し，csvの大きさと更新時刻が変わっていなければ次回はそちらを読む
+import os
+import numpy as np
+import pandas as pd
+
+RESIDUAL_NAME = ["TimeStep", "Ave:Density", "Ave:Momentum_X", "Ave:Momentum_Y", "Ave:Momentum_Z", "Ave:Energy", "Ave:Mix",
+                 "Max:Density", "Max:Momentum_X", "Max:Momentum_Y", "Max:Momentum_Z", "Max:Energy", "Max:Entire"]
+
+
+def cache_fname(fname):
+    return fname + ".npz"
+
+
+# 戻り値は(TimeStep(履歴の長さ,)，残差(履歴の長さ, 12)，残差の列名)
+def read_residual(fname, chunksize=100000, use_cache=True):
+    stat = os.stat(fname)
+    source = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+    if use_cache and os.path.exists(cache_fname(fname)):
+        with np.load(cache_fname(fname)) as cache:
+            if np.array_equal(cache["source"], source):
+                return cache["timestep"], cache["residual"], RESIDUAL_NAME[1:]
+
+    d_type = {name: np.float64 for name in RESIDUAL_NAME[1:]}
+    d_type["TimeStep"] = np.int64
+    timestep = []
+    residual = []
+    for df in pd.read_csv(fname, names=RESIDUAL_NAME, dtype=d_type, chunksize=chunksize):
+        timestep.append(df["TimeStep"].values)
+        residual.append(df[RESIDUAL_NAME[1:]].values.astype(np.float32))
+    if len(timestep) == 0:
+        timestep = np.zeros(0, dtype=np.int64)
+        residual = np.zeros((0, len(RESIDUAL_NAME) - 1), dtype=np.float32)
+    else:
+        timestep = np.concatenate(timestep)
+        residual = np.concatenate(residual)
+
+    if use_cache:
+        try:
+            with open(cache_fname(fname) + ".tmp", "wb") as f:
+                np.savez(f, timestep=timestep, residual=residual, source=source)
+            os.replace(cache_fname(fname) + ".tmp", cache_fname(fname))
+        except OSError:
+            pass
+    return timestep, residual, RESIDUAL_NAME[1:]
+
+
+# n_bin個の区間に分け，各区間の最小値と最大値の点だけを残す(スパイクを消さずに点数を2 * n_bin + 2以下にする)
+def minmax_downsample(x, y, n_bin=2000):
+    n = y.shape[0]
+    if n <= 2 * n_bin:
+        return x, y
+    width = -(-n // n_bin)
+    pad = width * n_bin - n
+    # 区間の数で割り切れない分は末尾の値で埋める(埋めた値は最小・最大を変えない)
+    block = np.concatenate([y, np.full(pad, y[-1], dtype=y.dtype)]).reshape(n_bin, width)
+    start = np.arange(n_bin) * width
+    # 先頭と末尾の点も残す(np.uniqueで並べ替えと重複の除去を行う)
+    index = np.concatenate([[0, n - 1], start + np.argmin(block, axis=1), start + np.argmax(block, axis=1)])
+    index = np.unique(np.minimum(index, n - 1))
+    return x[index], y[index]
+
+
+# Largest-Triangle-Three-Buckets:先頭と末尾以外をn_out - 2個の区間に分け，
+# 各区間から「直前に選んだ点」と「次の区間の平均」とで作る三角形の面積が最大の点を選ぶ
+def lttb_downsample(x, y, n_out=2000):
+    n = y.shape[0]
+    if n <= n_out or n_out < 3:
+        return x, y
+    xf = x.astype(np.float64)
+    yf = y.astype(np.float64)
+    edge = np.linspace(1, n - 1, n_out - 1).astype(int)
+    index = np.zeros(n_out, dtype=np.int64)
+    index[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edge[i], edge[i + 1]
+        next_stop = edge[i + 2] if i + 2 < n_out - 1 else n
+        next_x = np.mean(xf[stop:next_stop])
+        next_y = np.mean(yf[stop:next_stop])
+        area = np.abs((xf[a] - next_x) * (yf[start:stop] - yf[a]) - (xf[a] - xf[start:stop]) * (next_y - yf[a]))
+        a = start + np.argmax(area)
+        index[i + 1] = a
+    return x[index], y[index]
+
+
+def downsample(x, y, n_out=2000, method="minmax"):
+    if method == "minmax":
+        return minmax_downsample(x, y, n_out // 2)
+    elif method == "lttb":
+        return lttb_downsample(x, y, n_out)
+    else:
+        print("downsample method error")
+        exit()
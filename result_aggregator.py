@@ -0,0 +1,104 @@
+# -- coding: utf-8 --
+# 結果ディレクトリ(ResultC)のNACA####_##(_ケース名)_AC.datから揚力係数・抗力係数を集め，1つの表に保存する
+# 表は(翼番号, 迎角, ケース名)をキーとする構造化配列で table_fname(.npy) に保存し，
+# 読み込んだファイルの大きさと更新時刻は同じ名前の _manifest.json に記録する
+# 2回目以降は新しいファイル・変わったファイルだけを読み，消えたファイルの行は表から除く
+import os
+import re
+import json
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+AC_FILE = re.compile(r"^NACA(\d{4,5})_(-?\d+)(?:_(.+?))?_AC\.dat$")
+TABLE_DTYPE = np.dtype([("airfoil", "U5"), ("angle", "i4"), ("case", "U64"), ("cl", "f8"), ("cd", "f8")])
+
+
+def manifest_fname(table_fname):
+    return os.path.splitext(table_fname)[0] + "_manifest.json"
+
+
+def load_table(table_fname):
+    if not os.path.exists(table_fname) or not os.path.exists(manifest_fname(table_fname)):
+        return np.zeros(0, dtype=TABLE_DTYPE), {}
+    with open(manifest_fname(table_fname), "r") as f:
+        manifest = json.load(f)
+    return np.load(table_fname), manifest
+
+
+def save_table(table_fname, table, manifest):
+    with open(table_fname + ".tmp", "wb") as f:
+        np.save(f, table)
+    os.replace(table_fname + ".tmp", table_fname)
+    with open(manifest_fname(table_fname) + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(manifest_fname(table_fname) + ".tmp", manifest_fname(table_fname))
+
+
+def parse_key(name):
+    match = AC_FILE.match(name)
+    return match.group(1), int(match.group(2)), match.group(3) or ""
+
+
+# AC.datの1行目(抗力方向の力係数，揚力係数)を読み，post_processing.mainと同じく(CL, CD = -1行目の1列目)にする
+# 空のファイル(計算中など)はNoneを返して表に入れない
+def read_ac_file(fname):
+    with open(fname, "r") as f:
+        cd_cl = f.readline().split()
+    if len(cd_cl) < 2:
+        return None
+    return float(cd_cl[1]), -float(cd_cl[0])
+
+
+# pathのAC.datを集計して表を更新し，更新後の表を返す
+def aggregate_results(path, table_fname=None, workers=8):
+    if table_fname == None:
+        table_fname = os.path.join(path, "coefficient_table.npy")
+    table, manifest = load_table(table_fname)
+
+    stat = {}
+    key = {}
+    for entry in os.scandir(path):
+        match = AC_FILE.match(entry.name)
+        if match and entry.is_file():
+            st = entry.stat()
+            stat[entry.name] = [st.st_size, st.st_mtime_ns]
+            key[entry.name] = (match.group(1), int(match.group(2)), match.group(3) or "")
+
+    todo = [name for name in stat if manifest.get(name) != stat[name]]
+    removed = [name for name in manifest if name not in stat]
+    if len(todo) == 0 and len(removed) == 0:
+        return table
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        value = list(pool.map(lambda name: read_ac_file(os.path.join(path, name)), todo))
+
+    # 読み直したファイルと消えたファイルの行を除いてから，読み直した行を足す
+    drop = set(key[name] for name in todo) | set(parse_key(name) for name in removed)
+    if table.shape[0] > 0 and len(drop) > 0:
+        keep = np.array([(a, int(d), c) not in drop for a, d, c in zip(table["airfoil"], table["angle"], table["case"])],
+                        dtype=bool)
+        table = table[keep]
+    new = np.zeros(len(todo), dtype=TABLE_DTYPE)
+    valid = np.zeros(len(todo), dtype=bool)
+    for i, name in enumerate(todo):
+        if value[i] != None:
+            new[i] = key[name] + value[i]
+            valid[i] = True
+    table = np.concatenate([table, new[valid]])
+
+    # 読めなかった(空の)ファイルは次回もう一度読む
+    for i, name in enumerate(todo):
+        if valid[i]:
+            manifest[name] = stat[name]
+        else:
+            manifest.pop(name, None)
+    for name in removed:
+        manifest.pop(name)
+    save_table(table_fname, table, manifest)
+    return table
+
+
+# 表を{(翼番号, 迎角, ケース名):(CL, CD)}の辞書にする
+def table_dict(table):
+    return {(a, int(d), c): (cl, cd) for a, d, c, cl, cd in
+            zip(table["airfoil"], table["angle"], table["case"], table["cl"].tolist(), table["cd"].tolist())}